@@ -3,7 +3,7 @@ from __future__ import annotations
 
 import random
 import re
-from typing import Iterable, Optional, Sequence
+from typing import Any, Awaitable, Callable, Iterable, Optional, Sequence, Tuple
 
 
 # -------------------------
@@ -93,6 +93,75 @@ def is_templated(
     return False
 
 
+class StreamingTemplateDetector:
+    """
+    is_templated 的增量版本：边收流式片段边检查，只扫描“新片段 + 前面一小段重叠窗口”。
+    - LISTY_RE：从窗口起点 search（^ 只匹配真正的开头，不会误判窗口中间）
+    - 套话短语 / Markdown 加粗：窗口长度覆盖最长短语，跨片段也能命中
+    """
+
+    def __init__(
+        self,
+        banned_phrases: Optional[Sequence[str]] = None,
+        extra_banned: Optional[Iterable[str]] = None,
+        ban_bold_markdown: bool = True,
+        window: int = 64,
+    ):
+        self._banned = list(banned_phrases or DEFAULT_BANNED_PHRASES)
+        if extra_banned:
+            self._banned.extend(list(extra_banned))
+        self._ban_bold = ban_bold_markdown
+        self._overlap = max([window, 2] + [len(p) for p in self._banned])
+        self.text = ""
+        self.violation: Optional[str] = None
+
+    def feed(self, chunk: str) -> Optional[str]:
+        """追加一个片段；命中模板特征时返回原因（之后一直返回同一原因）。"""
+        if self.violation or not chunk:
+            return self.violation
+        lo = max(0, len(self.text) - self._overlap)
+        self.text += chunk
+        window = self.text[lo:]
+
+        if LISTY_RE.search(self.text, lo):
+            self.violation = "listy"
+        elif self._ban_bold and "**" in window:
+            self.violation = "bold"
+        else:
+            for p in self._banned:
+                if p in window:
+                    self.violation = f"banned:{p}"
+                    break
+        return self.violation
+
+
+async def guarded_astream(
+    llm: Any,
+    messages: Any,
+    on_chunk: Callable[[str], Awaitable[None]],
+    detector: Optional[StreamingTemplateDetector] = None,
+) -> Tuple[str, Optional[str]]:
+    """
+    带反模板检测的流式生成：
+    - 每个片段先过 detector，正常才交给 on_chunk 推送
+    - 一旦命中立即关闭上游 astream（不再为模板化内容付费），返回 (已生成文本, 原因)
+    - 未命中则完整生成，返回 (全文, None)
+    """
+    detector = detector or StreamingTemplateDetector()
+    agen = llm.astream(messages)
+    try:
+        async for chunk in agen:
+            content = chunk.content if hasattr(chunk, "content") else str(chunk)
+            if not content:
+                continue
+            if detector.feed(content):
+                break
+            await on_chunk(content)
+    finally:
+        await agen.aclose()
+    return detector.text, detector.violation
+
+
 def build_rewrite_context(original: str) -> str:
     """
     生成"改写指令"（给同一个角色链或 rewriter 使用）。
@@ -108,3 +177,20 @@ def build_rewrite_context(original: str) -> str:
         "下面是需要改写的原文：\n"
         f"{original}"
     )
+
+
+def build_interrupted_rewrite_context(context_card: str, partial: str) -> str:
+    """
+    流式生成中途被反模板检测打断时使用：
+    已输出的只是开头，所以要带上原任务卡片，让模型换一种口吻完整地重新说。
+    """
+    partial = clean_text(partial)
+    return (
+        f"{context_card}\n"
+        "【改写要求】你刚才的开头写成了清单/套话腔，已经被打断：\n"
+        f"{partial}\n"
+        "请完成同一个发言任务，但用像真实小组讨论的口语自然段重新说：\n"
+        "- 不要编号列表/项目符号/小标题/加粗(**)\n"
+        "- 避免'以下是/综上/主要包括/首先其次最后'等套话\n"
+        "- 可以保留上面开头里的观点，但不要照抄它的格式"
+    )
@@ -0,0 +1,216 @@
+# agents/chain_cache.py
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+# 各链默认 TTL（秒）：开场只和话题有关，可以缓存久一点；路由/状态更新依赖最近发言，短一些
+# （可用 ORGANIZER_CACHE_TTL_<链名大写> 覆盖，例如 ORGANIZER_CACHE_TTL_UPDATE_ROUTE）
+DEFAULT_TTL_BY_CHAIN: Dict[str, float] = {
+    "opening": 24 * 3600,
+    "route": 600,
+    "update": 600,
+    "update_route": 600,
+}
+DEFAULT_TTL = 3600
+DEFAULT_MAX_ENTRIES = 1024
+
+_PUNCT_RE = re.compile(r"[\s，。！？、；：,.!?;:\"'“”‘’（）()【】\[\]]+")
+
+
+def normalize_text(s: str) -> str:
+    """用于缓存 key 的归一化：去掉空白和标点、统一小写。"""
+    return _PUNCT_RE.sub("", (s or "").lower())
+
+
+def event_hashes(events: Iterable[Any], last_n: int = 4) -> List[str]:
+    """最近 N 条发言的摘要（speaker + 归一化内容）。"""
+    out = []
+    for ev in list(events or [])[-last_n:]:
+        if isinstance(ev, dict):
+            speaker, content = ev.get("speaker", ""), ev.get("content", "")
+        else:
+            speaker, content = getattr(ev, "speaker", ""), getattr(ev, "content", "")
+        raw = f"{speaker}|{normalize_text(str(content))}"
+        out.append(hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16])
+    return out
+
+
+class _ChainCounters:
+    __slots__ = ("hits", "disk_hits", "misses", "stores")
+
+    def __init__(self):
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+class ChainCache:
+    """
+    组织者 JSON 链的响应缓存：
+    - key 由链名 + 归一化后的提示要素（话题、当前议程问题、最近 N 条发言摘要等）组成
+    - 内存中 TTL + LRU 淘汰；可选 sqlite 落盘（重启后开场等结果仍可复用）
+    - 缓存的是 _safe_json_loads 之后的 dict，命中时直接返回副本
+    - 按链统计命中率
+    """
+
+    def __init__(
+        self,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        ttl_by_chain: Optional[Dict[str, float]] = None,
+        default_ttl: float = DEFAULT_TTL,
+        disk_path: Optional[str] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_by_chain = dict(DEFAULT_TTL_BY_CHAIN)
+        if ttl_by_chain:
+            self.ttl_by_chain.update(ttl_by_chain)
+        self.default_ttl = default_ttl
+        self._mem: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters: Dict[str, _ChainCounters] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        if disk_path:
+            self._open_disk(disk_path)
+
+    # ---------- disk ----------
+    def _open_disk(self, path: str):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS chain_cache ("
+                " cache_key TEXT PRIMARY KEY, chain TEXT, value TEXT, expires_at REAL)"
+            )
+            self._db.execute("DELETE FROM chain_cache WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+            print(f"[链缓存] 已启用磁盘缓存: {path}")
+        except Exception as e:
+            print(f"[链缓存] 磁盘缓存不可用，仅使用内存: {e}")
+            self._db = None
+
+    def _disk_get(self, key: str) -> Optional[Tuple[float, dict]]:
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM chain_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+        except Exception as e:
+            print(f"[链缓存] 读取磁盘缓存失败: {e}")
+            return None
+        if not row:
+            return None
+        value, expires_at = row
+        if expires_at < time.time():
+            return None
+        return expires_at, json.loads(value)
+
+    def _disk_put(self, chain: str, key: str, expires_at: float, data: dict):
+        if self._db is None:
+            return
+        try:
+            self._db.execute(
+                "REPLACE INTO chain_cache (cache_key, chain, value, expires_at) VALUES (?, ?, ?, ?)",
+                (key, chain, json.dumps(data, ensure_ascii=False), expires_at),
+            )
+            self._db.commit()
+        except Exception as e:
+            print(f"[链缓存] 写入磁盘缓存失败: {e}")
+
+    # ---------- public ----------
+    @staticmethod
+    def make_key(chain: str, *parts: Any) -> str:
+        raw = json.dumps([chain, *parts], ensure_ascii=False, sort_keys=True, default=str)
+        return f"{chain}:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+    def _count(self, chain: str) -> _ChainCounters:
+        c = self._counters.get(chain)
+        if c is None:
+            c = self._counters[chain] = _ChainCounters()
+        return c
+
+    def get(self, chain: str, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            counters = self._count(chain)
+            hit = self._mem.get(key)
+            if hit is not None and hit[0] < now:
+                del self._mem[key]
+                hit = None
+            if hit is None:
+                hit = self._disk_get(key)
+                if hit is not None:
+                    counters.disk_hits += 1
+                    self._remember(key, hit)
+            if hit is None:
+                counters.misses += 1
+                return None
+            self._mem.move_to_end(key)
+            counters.hits += 1
+            return copy.deepcopy(hit[1])
+
+    def put(self, chain: str, key: str, data: dict):
+        if not data:
+            return
+        expires_at = time.time() + self.ttl_by_chain.get(chain, self.default_ttl)
+        value = copy.deepcopy(data)
+        with self._lock:
+            self._remember(key, (expires_at, value))
+            self._count(chain).stores += 1
+            self._disk_put(chain, key, expires_at, value)
+
+    def _remember(self, key: str, entry: Tuple[float, dict]):
+        self._mem[key] = entry
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM chain_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._mem),
+                "max_entries": self.max_entries,
+                "disk": self._db is not None,
+                "chains": {name: c.as_dict() for name, c in self._counters.items()},
+            }
+
+
+def _ttl_from_env(prefix: str = "ORGANIZER_CACHE_TTL_") -> Dict[str, float]:
+    """按链读取环境变量里的 TTL，未设置的链用 DEFAULT_TTL_BY_CHAIN。"""
+    return {chain: float(os.getenv(prefix + chain.upper(), ttl)) for chain, ttl in DEFAULT_TTL_BY_CHAIN.items()}
+
+
+# 全局缓存：所有会话的 OrganizerAgent 共用（相同话题的开场可以跨会话复用）
+organizer_cache = ChainCache(
+    max_entries=int(os.getenv("ORGANIZER_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+    ttl_by_chain=_ttl_from_env(),
+    disk_path=os.getenv("ORGANIZER_CACHE_PATH") or None,
+)
@@ -0,0 +1,240 @@
+# agents/fast_router.py
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+SPEAKERS = ["理论家", "实践者", "质疑者"]
+
+
+@dataclass
+class RouteContext:
+    """规则打分时可见的信息。"""
+    state: Any
+    transcript_tail: List[dict]
+    last_speaker: Optional[str]
+    last_event: Optional[dict]
+    user_message: Optional[str] = None
+
+
+@dataclass
+class RuleVote:
+    """
+    某条规则对某位发言者的打分：
+    - score > 0 表示推荐，< 0 表示排斥
+    - task_hint 只在该发言者最终胜出时使用（取得分最高那条规则的提示）
+    """
+    speaker: str
+    score: float
+    task_hint: str = ""
+    rule: str = ""
+
+
+Rule = Callable[[RouteContext], Iterable[RuleVote]]
+
+
+def _field(ev: Any, key: str, default: Any = None) -> Any:
+    if isinstance(ev, dict):
+        return ev.get(key, default)
+    return getattr(ev, key, default)
+
+
+# -------------------------
+# 内置规则
+# -------------------------
+# 与原 process_user_message_in_background 里写死的关键词规则一致（按顺序，先命中先得）
+USER_KEYWORD_RULES = [
+    (
+        ["什么是", "如何", "怎么", "为什么", "哪些"],
+        "理论家",
+        "【用户提问】用户刚才问：\"{content}\"\n你的任务：直接回答这个具体问题，不要偏离主题。用简单的例子说明，让用户能理解。",
+    ),
+    (
+        ["技能", "框架", "工具", "方法", "步骤", "怎么做"],
+        "实践者",
+        "【用户需求】用户想了解：\"{content}\"\n你的任务：给出可操作的建议和具体步骤，避免空泛的理论。",
+    ),
+    (
+        ["对吗", "真的", "但是", "不对", "有问题"],
+        "质疑者",
+        "【用户质疑/反馈】用户说：\"{content}\"\n你的任务：认真回应用户的观点，指出可能的问题或盲点，但保持友善。",
+    ),
+]
+
+CASE_MARKERS = ["比如", "例如", "举个例子", "举个身边的例子", "案例", "有个朋友", "我身边", "实际场景"]
+# 发言明显停留在概念层面的信号（没有这些词时不判定为“抽象”，交给其它规则或 LLM）
+ABSTRACT_MARKERS = ["本质", "概念", "定义", "理论上", "原则", "原理", "范式", "框架", "机制", "抽象", "层面", "逻辑上", "从根本上"]
+
+
+def user_keyword_rule(ctx: RouteContext) -> Iterable[RuleVote]:
+    """用户发言命中关键词：直接指定回应者。"""
+    if not ctx.user_message:
+        return []
+    text = ctx.user_message.lower()
+    for keywords, speaker, hint in USER_KEYWORD_RULES:
+        if any(kw in text for kw in keywords):
+            return [RuleVote(speaker, 3.0, hint.format(content=ctx.user_message), "user_keyword")]
+    return []
+
+
+def fresh_case_rule(ctx: RouteContext) -> Iterable[RuleVote]:
+    """学伴刚抛出具体案例：优先叫质疑者检验。"""
+    ev = ctx.last_event
+    if not ev or _field(ev, "speaker") not in ("理论家", "实践者"):
+        return []
+    content = str(_field(ev, "content", ""))
+    if not any(m in content for m in CASE_MARKERS):
+        return []
+    return [RuleVote(
+        "质疑者", 1.5,
+        "刚才有人举了一个具体案例。抓住这个案例追问：它能不能支撑前面的结论？有没有反例或被忽略的前提？",
+        "fresh_case",
+    )]
+
+
+def abstract_theory_rule(ctx: RouteContext) -> Iterable[RuleVote]:
+    """理论家刚讲完、明显停留在概念层面且没有落到具体案例：叫实践者落地。"""
+    ev = ctx.last_event
+    if not ev or _field(ev, "speaker") != "理论家":
+        return []
+    content = str(_field(ev, "content", ""))
+    if any(m in content for m in CASE_MARKERS):
+        return []
+    if not any(m in content for m in ABSTRACT_MARKERS):
+        return []
+    return [RuleVote(
+        "实践者", 1.2,
+        "刚才的分析比较抽象。挑其中最关键的一个观点，落到一个具体场景里说说实际会怎样、第一步能做什么。",
+        "abstract_theory",
+    )]
+
+
+def avoid_last_speaker_rule(ctx: RouteContext) -> Iterable[RuleVote]:
+    """避免连续叫同一人。"""
+    if ctx.last_speaker in SPEAKERS:
+        return [RuleVote(ctx.last_speaker, -10.0, "", "avoid_last_speaker")]
+    return []
+
+
+DEFAULT_RULES: List[Rule] = [
+    user_keyword_rule,
+    fresh_case_rule,
+    abstract_theory_rule,
+    avoid_last_speaker_rule,
+]
+
+
+@dataclass
+class _CallCounters:
+    llm_saved: int = 0
+    llm_calls: int = 0
+    rules: Dict[str, int] = field(default_factory=dict)
+
+    def as_dict(self) -> Dict[str, Any]:
+        total = self.llm_saved + self.llm_calls
+        return {
+            "llm_saved": self.llm_saved,
+            "llm_calls": self.llm_calls,
+            "saved_ratio": round(self.llm_saved / total, 3) if total else 0.0,
+            "rules": dict(self.rules),
+        }
+
+
+class FastRouter:
+    """
+    基于规则打分的本地路由：结果足够确定时不调 LLM。
+
+    - 每条规则返回若干 RuleVote，按发言者累加得分
+    - 最高分 >= min_score 且领先第二名 >= min_margin 时直接给出决策
+    - 否则返回 None，由 OrganizerAgent 回退到 _route_chain
+    - 按 thread 统计省下/实际发生的 LLM 路由调用次数
+    """
+
+    def __init__(
+        self,
+        rules: Optional[List[Rule]] = None,
+        min_score: float = 1.0,
+        min_margin: float = 0.5,
+    ):
+        self.rules: List[Rule] = list(rules) if rules is not None else list(DEFAULT_RULES)
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self._counters: Dict[str, _CallCounters] = {}
+
+    def add_rule(self, rule: Rule):
+        self.rules.append(rule)
+
+    def decide(
+        self,
+        state: Any,
+        transcript_tail: List[dict],
+        user_message: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """返回与 OrganizerAgent.route() 同结构的决策，不确定时返回 None。"""
+        last_speaker = _field(state, "last_speaker", None)
+        ctx = RouteContext(
+            state=state,
+            transcript_tail=list(transcript_tail or []),
+            last_speaker=last_speaker,
+            last_event=transcript_tail[-1] if transcript_tail else None,
+            user_message=user_message,
+        )
+
+        scores: Dict[str, float] = {s: 0.0 for s in SPEAKERS}
+        best_vote: Dict[str, RuleVote] = {}
+        for rule in self.rules:
+            try:
+                votes = list(rule(ctx) or [])
+            except Exception as e:
+                print(f"[快速路由] 规则执行失败: {getattr(rule, '__name__', rule)}, 错误: {e}")
+                continue
+            for v in votes:
+                if v.speaker not in scores:
+                    continue
+                scores[v.speaker] += v.score
+                if v.score > 0 and (v.speaker not in best_vote or v.score > best_vote[v.speaker].score):
+                    best_vote[v.speaker] = v
+
+        ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+        (top, top_score), (_, second_score) = ranked[0], ranked[1]
+        if top_score < self.min_score or top_score - second_score < self.min_margin or top not in best_vote:
+            return None
+
+        vote = best_vote[top]
+        counters = self._count(_field(state, "thread_id", ""))
+        counters.llm_saved += 1
+        counters.rules[vote.rule] = counters.rules.get(vote.rule, 0) + 1
+        return {
+            "next_speaker": top,
+            "task_hint": vote.task_hint,
+            "stance_hint": None,
+            "should_end": False,
+            "source": "fast_path",
+            "rule": vote.rule,
+        }
+
+    def record_llm_call(self, thread_id: str):
+        """路由链真正调用 LLM 时调用（缓存命中、用上预取结果不算）。"""
+        self._count(thread_id).llm_calls += 1
+
+    def _count(self, thread_id: str) -> _CallCounters:
+        c = self._counters.get(thread_id)
+        if c is None:
+            c = self._counters[thread_id] = _CallCounters()
+        return c
+
+    def stats(self, thread_id: Optional[str] = None) -> Dict[str, Any]:
+        if thread_id is not None:
+            c = self._counters.get(thread_id)
+            return c.as_dict() if c else _CallCounters().as_dict()
+        total = _CallCounters()
+        for c in self._counters.values():
+            total.llm_saved += c.llm_saved
+            total.llm_calls += c.llm_calls
+            for k, v in c.rules.items():
+                total.rules[k] = total.rules.get(k, 0) + v
+        return total.as_dict()
+
+    def forget(self, thread_id: str):
+        self._counters.pop(thread_id, None)
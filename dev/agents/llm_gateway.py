@@ -0,0 +1,307 @@
+# agents/llm_gateway.py
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, Optional, Tuple
+
+import httpx
+from langchain_core.runnables import Runnable
+
+
+# 当前 LLM 调用归属的对话（用于跨对话公平排队）；asyncio 任务创建时会自动继承
+_current_chat: contextvars.ContextVar[str] = contextvars.ContextVar("llm_chat_id", default="_global")
+
+
+def bind_chat(chat_id: Optional[str]):
+    """把当前任务上下文中的 LLM 调用归属到某个对话。"""
+    _current_chat.set(chat_id or "_global")
+
+
+def current_chat() -> str:
+    return _current_chat.get()
+
+
+@dataclass
+class ProviderLimits:
+    """单个服务商的限额（同一个 API Key 下所有角色共享）。"""
+    max_concurrency: int = 4
+    rpm: int = 0                 # 每分钟请求数上限，0 表示不限
+    max_connections: int = 20    # HTTP 连接池大小
+    timeout: float = 60.0
+
+    @classmethod
+    def from_env(cls, prefix: str, **defaults) -> "ProviderLimits":
+        """读取 LLM_<PREFIX>_MAX_CONCURRENCY / _RPM / _MAX_CONNECTIONS / _TIMEOUT。"""
+        base = cls(**defaults)
+        return cls(
+            max_concurrency=int(os.getenv(f"LLM_{prefix}_MAX_CONCURRENCY", base.max_concurrency)),
+            rpm=int(os.getenv(f"LLM_{prefix}_RPM", base.rpm)),
+            max_connections=int(os.getenv(f"LLM_{prefix}_MAX_CONNECTIONS", base.max_connections)),
+            timeout=float(os.getenv(f"LLM_{prefix}_TIMEOUT", base.timeout)),
+        )
+
+
+class _FairLimiter:
+    """
+    按对话轮转的并发名额：
+    - 每个对话一条等待队列
+    - 名额空出时轮到下一个有请求在等的对话，而不是最早排队的请求
+      （一个对话连发很多请求也只能轮流拿名额，不会饿死其它对话）
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.active = 0
+        self._queues: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+
+    def queued(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def queued_by_chat(self) -> Dict[str, int]:
+        return {chat_id: len(q) for chat_id, q in self._queues.items()}
+
+    async def acquire(self, chat_id: str):
+        if self.active < self.limit and not self._queues:
+            self.active += 1
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(chat_id, deque()).append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # 名额已经发下来但调用方被取消：归还
+                self.release()
+            else:
+                q = self._queues.get(chat_id)
+                if q is not None and fut in q:
+                    q.remove(fut)
+                    if not q:
+                        del self._queues[chat_id]
+            raise
+
+    def release(self):
+        self.active -= 1
+        while self._queues and self.active < self.limit:
+            chat_id, q = next(iter(self._queues.items()))
+            fut = q.popleft()
+            if q:
+                self._queues.move_to_end(chat_id)
+            else:
+                del self._queues[chat_id]
+            if fut.done():
+                continue
+            self.active += 1
+            fut.set_result(None)
+
+
+class _RateWindow:
+    """滑动窗口限速（每分钟请求数）。"""
+
+    def __init__(self, rpm: int):
+        self.rpm = rpm
+        self._stamps: Deque[float] = deque()
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def wait(self) -> float:
+        """等待直到可以发出下一个请求，返回等待的秒数。"""
+        if self.rpm <= 0:
+            return 0.0
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        waited = 0.0
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._stamps and now - self._stamps[0] >= 60:
+                    self._stamps.popleft()
+                if len(self._stamps) < self.rpm:
+                    self._stamps.append(now)
+                    return waited
+                delay = 60 - (now - self._stamps[0])
+                await asyncio.sleep(delay)
+                waited += delay
+
+
+class _Provider:
+    def __init__(self, name: str, limits: ProviderLimits):
+        self.name = name
+        self.limits = limits
+        self.limiter = _FairLimiter(limits.max_concurrency)
+        self.rate = _RateWindow(limits.rpm)
+        # 没有事件循环时（脚本/命令行）退化为线程信号量
+        self.sync_sem = threading.BoundedSemaphore(limits.max_concurrency)
+        self._http: Optional[Tuple[httpx.Client, httpx.AsyncClient]] = None
+        self.calls = 0
+        self.errors = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def http_clients(self) -> Tuple[httpx.Client, httpx.AsyncClient]:
+        if self._http is None:
+            pool = httpx.Limits(
+                max_connections=self.limits.max_connections,
+                max_keepalive_connections=self.limits.max_connections,
+            )
+            self._http = (
+                httpx.Client(limits=pool, timeout=self.limits.timeout),
+                httpx.AsyncClient(limits=pool, timeout=self.limits.timeout),
+            )
+        return self._http
+
+    def record_wait(self, wait_ms: float):
+        self.calls += 1
+        self.total_wait_ms += wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.limiter.limit,
+            "rpm": self.limits.rpm,
+            "active": self.limiter.active,
+            "queued": self.limiter.queued(),
+            "queued_by_chat": self.limiter.queued_by_chat(),
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_wait_ms": round(self.total_wait_ms / self.calls, 1) if self.calls else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 1),
+        }
+
+
+class LLMGateway:
+    """
+    所有智能体共用的 LLM 网关：
+    - 按服务商（zhipu/kimi/qwen）分别限制并发数与每分钟请求数
+    - 同一服务商下按对话轮转排队，忙碌的对话不会饿死其它对话
+    - ChatOpenAI 类客户端共用每个服务商一份的 HTTP 连接池
+    - 原生异步；同步调用（线程池里的旧代码路径）转交到主事件循环排队，
+      所以 server.py 的线程池不再是全局的 LLM 并发上限
+    """
+
+    def __init__(self):
+        self._providers: Dict[str, _Provider] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def register(self, name: str, limits: Optional[ProviderLimits] = None) -> _Provider:
+        p = self._providers.get(name)
+        if p is None:
+            p = self._providers[name] = _Provider(name, limits or ProviderLimits())
+        return p
+
+    def attach_loop(self, loop: asyncio.AbstractEventLoop):
+        """服务启动时调用：同步调用会被转交到这个事件循环上排队。"""
+        self._loop = loop
+
+    def http_clients(self, name: str) -> Tuple[httpx.Client, httpx.AsyncClient]:
+        return self.register(name).http_clients()
+
+    def wrap(self, name: str, llm: Any) -> "GatedChatModel":
+        self.register(name)
+        return GatedChatModel(self, name, llm)
+
+    @asynccontextmanager
+    async def slot(self, name: str, chat_id: Optional[str] = None):
+        """占用一个调用名额（公平排队 + 限速）。"""
+        p = self._providers[name]
+        started = time.perf_counter()
+        await p.limiter.acquire(chat_id or current_chat())
+        try:
+            await p.rate.wait()
+            p.record_wait((time.perf_counter() - started) * 1000)
+            try:
+                yield
+            except Exception:
+                p.errors += 1
+                raise
+        finally:
+            p.limiter.release()
+
+    def run_sync(self, name: str, make_coro: Callable[[], Any], fallback: Callable[[], Any]) -> Any:
+        """
+        在同步代码里调用：有主事件循环时把协程转交过去排队并阻塞等待结果，
+        否则直接执行 fallback（用线程信号量限制并发）。
+        """
+        loop = self._loop
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        if loop is None or not loop.is_running() or running is loop:
+            if running is loop and loop is not None:
+                print(f"[LLM网关] 警告：在事件循环线程里发起同步调用（{name}），未经排队直接执行")
+            p = self._providers[name]
+            with p.sync_sem:
+                p.record_wait(0.0)
+                try:
+                    return fallback()
+                except Exception:
+                    p.errors += 1
+                    raise
+
+        return asyncio.run_coroutine_threadsafe(make_coro(), loop).result()
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: p.stats() for name, p in self._providers.items()}
+
+
+class GatedChatModel(Runnable):
+    """
+    包一层 LangChain 聊天模型，让所有 invoke/ainvoke/astream 都经过网关。
+    可以直接放进 `prompt | llm | ...` 链里，也可以像原来一样 llm.astream(...)。
+    """
+
+    def __init__(self, gateway: LLMGateway, provider: str, llm: Any):
+        self._gateway = gateway
+        self._provider = provider
+        self.llm = llm
+
+    def invoke(self, input: Any, config: Optional[Dict[str, Any]] = None, **kwargs: Any) -> Any:
+        chat_id = current_chat()
+        return self._gateway.run_sync(
+            self._provider,
+            lambda: self._ainvoke(input, config, chat_id, **kwargs),
+            lambda: self.llm.invoke(input, config, **kwargs),
+        )
+
+    async def ainvoke(self, input: Any, config: Optional[Dict[str, Any]] = None, **kwargs: Any) -> Any:
+        return await self._ainvoke(input, config, current_chat(), **kwargs)
+
+    async def _ainvoke(self, input: Any, config: Optional[Dict[str, Any]], chat_id: str, **kwargs: Any) -> Any:
+        async with self._gateway.slot(self._provider, chat_id):
+            return await self.llm.ainvoke(input, config, **kwargs)
+
+    async def astream(
+        self, input: Any, config: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> AsyncIterator[Any]:
+        # 整个流式输出期间占用名额；调用方提前 aclose() 时同时关闭上游并归还名额
+        async with self._gateway.slot(self._provider):
+            agen = self.llm.astream(input, config, **kwargs)
+            try:
+                async for chunk in agen:
+                    yield chunk
+            finally:
+                await agen.aclose()
+
+    def stream(self, input: Any, config: Optional[Dict[str, Any]] = None, **kwargs: Any) -> Iterator[Any]:
+        p = self._gateway.register(self._provider)
+        with p.sync_sem:
+            p.record_wait(0.0)
+            yield from self.llm.stream(input, config, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "llm":
+            raise AttributeError(name)
+        return getattr(self.llm, name)
+
+
+# 全局网关（model_client.py 注册服务商并包装各角色的模型）
+llm_gateway = LLMGateway()
@@ -5,31 +5,46 @@ from langchain_community.chat_models import ChatZhipuAI
 from langchain_core.prompts import PromptTemplate
 from langchain_openai import ChatOpenAI
 
+from .llm_gateway import ProviderLimits, llm_gateway
+
 
 # 加载环境变量
 load_dotenv()
 
-llm_organizer = ChatZhipuAI(
+# 按服务商注册限额（组织者和理论家共用智谱同一个 Key，所以共享一份限额）
+llm_gateway.register("zhipu", ProviderLimits.from_env("ZHIPU", max_concurrency=8))
+llm_gateway.register("kimi", ProviderLimits.from_env("KIMI", max_concurrency=3))
+llm_gateway.register("qwen", ProviderLimits.from_env("QWEN", max_concurrency=8))
+
+_kimi_http, _kimi_async_http = llm_gateway.http_clients("kimi")
+_qwen_http, _qwen_async_http = llm_gateway.http_clients("qwen")
+
+# 注意：ChatZhipuAI 不支持传入外部 httpx 客户端，这里只做并发/限速/公平排队
+llm_organizer = llm_gateway.wrap("zhipu", ChatZhipuAI(
     model=os.getenv("ZHIPU_MODEL_NAME"),
     api_key=os.getenv("ZHIPU_API_KEY"),
     temperature=0.5,
-)
+))
 # 理论家使用智谱AI（与组织者相同，避免使用失效的代理地址）
-llm_theorist = ChatZhipuAI(
+llm_theorist = llm_gateway.wrap("zhipu", ChatZhipuAI(
     model=os.getenv("ZHIPU_MODEL_NAME"),
     api_key=os.getenv("ZHIPU_API_KEY"),
     temperature=0.5,
-)
+))
 
-llm_practitioner = ChatOpenAI(
+llm_practitioner = llm_gateway.wrap("kimi", ChatOpenAI(
     model=os.getenv("KM_MODEL_NAME"),
     api_key=os.getenv("KM_API_KEY"),
     base_url=os.getenv("KM_BASE_URL"),
     temperature=0.5,
-)
-llm_skeptic = ChatOpenAI(
+    http_client=_kimi_http,
+    http_async_client=_kimi_async_http,
+))
+llm_skeptic = llm_gateway.wrap("qwen", ChatOpenAI(
     model=os.getenv("QWEN_MODEL_NAME"),
     api_key=os.getenv("QWEN_API_KEY"),
     base_url=os.getenv("QWEN_BASE_URL"),
     temperature=0.7,
-)
+    http_client=_qwen_http,
+    http_async_client=_qwen_async_http,
+))
@@ -1,17 +1,25 @@
 # agents/organizer_agent.py
 from __future__ import annotations
 
+import asyncio
 import json
+import os
+import threading
+import time
 import uuid
-from typing import Any, Dict, List, Optional, Tuple
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import BaseMessage
 from langchain_core.runnables import RunnableLambda
 
 from ._shared import clean_text
-from dev.memory.history_store import events_to_messages
+from .fast_router import FastRouter
+from dev.memory.context_builder import context_builder, estimate_tokens
+from dev.memory.summary_memory import SummaryMemory, summary_memory
 from .model_client import llm_organizer
+from .chain_cache import ChainCache, organizer_cache, event_hashes, normalize_text
 
 
 SPEAKERS = ["理论家", "实践者", "质疑者"]
@@ -73,19 +81,84 @@ def _append_list(state: Any, key: str, values: List[str]):
     _set(state, key, cur)
 
 
+@dataclass
+class _PrefetchedRoute:
+    """合并调用（update+route）顺带算出的下一轮路由，只对同一 turn 有效。"""
+    turn_id: int
+    last_speaker: Optional[str]
+    future: "asyncio.Future"
+    started: float
+    finished: Optional[float] = None
+
+
+class _BatchCounters:
+    """合并调用的统计：省下的路由调用、prompt token 与关键路径耗时。"""
+
+    def __init__(self):
+        self.combined_calls = 0
+        self.fallbacks = 0
+        self.route_used = 0
+        self.route_stale = 0
+        self.tokens_saved = 0
+        self.saved_ms = 0.0
+        self.split_route_calls = 0
+        self.split_route_ms = 0.0
+
+    def avg_route_ms(self) -> float:
+        return self.split_route_ms / self.split_route_calls if self.split_route_calls else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "combined_calls": self.combined_calls,
+            "fallbacks": self.fallbacks,
+            "route_used": self.route_used,
+            "route_stale": self.route_stale,
+            "tokens_saved": self.tokens_saved,
+            "saved_ms": round(self.saved_ms, 1),
+            "avg_split_route_ms": round(self.avg_route_ms(), 1),
+            "tokens_saved_per_turn": round(self.tokens_saved / self.route_used, 1) if self.route_used else 0.0,
+            "saved_ms_per_turn": round(self.saved_ms / self.route_used, 1) if self.route_used else 0.0,
+        }
+
+
+def _history_tokens(history: List[BaseMessage]) -> int:
+    return sum(estimate_tokens(str(m.content)) for m in history)
+
+
 class OrganizerAgent:
     """
     组织者：
     - 不直接替学伴输出内容观点（主要负责调度与总结）
     - 通过 JSON 路由决定谁发言、给什么任务提示（避免写死顺序）
+    - 明显的轮次由 FastRouter 本地决定，不确定时才调用 _route_chain
+    - 开场/路由/状态更新三条 JSON 链前面有一层响应缓存（ChainCache）
+    - 长对话里更早的发言由 SummaryMemory 压缩成分层摘要，和近期原文一起进入 prompt
+    - 学伴发言后的状态更新与下一轮路由可以合并成一次 LLM 调用（aupdate_and_route），
+      解析失败时退回两次独立调用
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        fast_router: Optional[FastRouter] = None,
+        cache: Optional[ChainCache] = None,
+        memory: Optional[SummaryMemory] = None,
+        batch_update_route: Optional[bool] = None,
+    ):
+        self.fast_router = fast_router or FastRouter()
+        self.cache = cache or organizer_cache
+        self.memory = memory or summary_memory
+        if batch_update_route is None:
+            batch_update_route = os.getenv("ORGANIZER_BATCH_UPDATE_ROUTE", "true").lower() == "true"
+        self.batch_update_route = batch_update_route
+        self._prefetched: Dict[str, _PrefetchedRoute] = {}
+        self._batch_counters: Dict[str, _BatchCounters] = {}
         self._opening_chain = self._build_opening_chain()
         self._route_chain = self._build_route_chain()
         self._update_chain = self._build_update_chain()
         self._final_chain = self._build_final_chain()
         self._summary_chain = self._build_summary_chain()
+        self._compress_chain = self._build_compress_chain()
+        self._update_route_chain = self._build_update_route_chain()
 
     @staticmethod
     def _build_opening_chain():
@@ -180,6 +253,72 @@ class OrganizerAgent:
         chain = prompt | llm_organizer | RunnableLambda(lambda m: m.content)
         return chain
 
+    @staticmethod
+    def _build_update_route_chain():
+        sys = (
+            "你是【组织者/主持人】，同时兼任记录员。你不讨论内容，只做记录和调度。\n"
+            "每次你要同时完成两件事：从最新公开发言中提炼状态更新，并决定下一位发言者（理论家/实践者/质疑者）。\n"
+            "\n"
+            "角色选择策略：\n"
+            "- 理论家：需要概念澄清、框架构建、机制分析时\n"
+            "- 实践者：需要具体场景、可行性判断、操作建议时\n"
+            "- 质疑者：需要逻辑检验、风险评估、观点平衡时\n"
+            "\n"
+            "输出必须严格为 JSON（不带任何多余文字）。"
+        )
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", sys),
+            MessagesPlaceholder("history"),
+            ("human", "{instruction}"),
+        ])
+        chain = prompt | llm_organizer | RunnableLambda(lambda m: m.content)
+        return chain
+
+    @staticmethod
+    def _build_compress_chain():
+        sys = (
+            "你是【主持人记录员】。你要把较早的一段讨论压缩成简短摘要，供后续调度和总结参考。\n"
+            "只保留：谁提出了哪些关键观点、形成的共识、仍存在的分歧、悬而未决的问题。\n"
+            "用一段连贯的口语化文字，不要清单/小标题，不要加入原讨论中没有的内容。"
+        )
+        prompt = ChatPromptTemplate.from_messages([
+            ("system", sys),
+            ("human", "{instruction}"),
+        ])
+        chain = prompt | llm_organizer | RunnableLambda(lambda m: m.content)
+        return chain
+
+    # ---------- History (summary + recent tail) ----------
+    def _history(self, state: Any, transcript_tail: List[dict], chain: str, fixed_parts: List[str]) -> List[BaseMessage]:
+        """滚动摘要 + 摘要之后的近期原文，整体受该链的 token 预算约束。"""
+        summary, covered_turn = self.memory.render(state)
+        return context_builder.messages(
+            transcript_tail, chain, _get(state, "thread_id"), fixed_parts,
+            summary=summary, covered_turn=covered_turn,
+        )
+
+    # ---------- JSON chain cache ----------
+    def _cached_json(self, name: str, key: str, chain: Any, inputs: Dict[str, Any],
+                     on_invoke: Optional[Callable[[], None]] = None) -> dict:
+        """先查缓存，未命中再调用链并缓存解析后的 dict（解析失败的结果不缓存）；on_invoke 在真正调用链之前触发。"""
+        data = self.cache.get(name, key)
+        if data is None:
+            if on_invoke is not None:
+                on_invoke()
+            data = _safe_json_loads(chain.invoke(inputs)) or {}
+            self.cache.put(name, key, data)
+        return data
+
+    async def _acached_json(self, name: str, key: str, chain: Any, inputs: Dict[str, Any],
+                            on_invoke: Optional[Callable[[], None]] = None) -> dict:
+        data = self.cache.get(name, key)
+        if data is None:
+            if on_invoke is not None:
+                on_invoke()
+            data = _safe_json_loads(await chain.ainvoke(inputs)) or {}
+            self.cache.put(name, key, data)
+        return data
+
     # ---------- Opening ----------
     def open(self, topic: str, transcript_tail: List[dict]) -> Tuple[str, List[dict], Optional[str]]:
         """
@@ -188,8 +327,6 @@ class OrganizerAgent:
           - agenda_items: list[dict]（内部结构化议程）
           - active_item_id: Optional[str]（当前聚焦）
         """
-        history: List[BaseMessage] = events_to_messages(transcript_tail)
-
         instruction = (
             "请为下面话题做主持开场：\n"
             "1) 先抛一个有张力的切口/争议点（80~160字，口语一点）\n"
@@ -207,9 +344,13 @@ class OrganizerAgent:
             "}\n"
             f"话题：{topic}"
         )
+        history: List[BaseMessage] = context_builder.messages(transcript_tail, "opening", fixed_parts=[instruction])
 
-        raw = self._opening_chain.invoke({"history": history, "instruction": instruction})
-        data = _safe_json_loads(raw) or {}
+        # 开场只取决于话题：相同话题直接复用议程（item_id 每次重新生成）
+        key = self.cache.make_key("opening", normalize_text(topic))
+        data = self._cached_json(
+            "opening", key, self._opening_chain, {"history": history, "instruction": instruction}
+        )
 
         opening = clean_text(str(data.get("opening", ""))) or f"我们来聊「{topic}」。你更在意它带来的机会还是代价？"
         agenda_list = data.get("agenda", [])
@@ -254,19 +395,193 @@ class OrganizerAgent:
           - ask_user: bool
           - should_end: bool
         """
-        history: List[BaseMessage] = events_to_messages(transcript_tail)
+        fast = self._fast_route(state, transcript_tail)
+        if fast is not None:
+            return fast
+
+        # 同步调用不等待：合并调用已经算好才用
+        prefetched = self._take_prefetched(state)
+        if prefetched is not None and prefetched.future.done():
+            decision = self._use_prefetched(state, prefetched, prefetched.future.result(), 0.0)
+            if decision is not None:
+                return decision
+
+        instruction, avoid = self._route_instruction(state)
+        history: List[BaseMessage] = self._history(state, transcript_tail, "route", [instruction])
+        key = self.cache.make_key("route", instruction, event_hashes(transcript_tail))
+        data = self._cached_json("route", key, self._route_chain, {"history": history, "instruction": instruction},
+                                 on_invoke=lambda: self._record_llm_route(state))
+        return self._parse_route(data, avoid)
+
+    async def aroute(self, state: Any, transcript_tail: List[dict]) -> Dict[str, Any]:
+        """route() 的异步版本：LLM 调用经网关排队，不占用线程池。"""
+        fast = self._fast_route(state, transcript_tail)
+        if fast is not None:
+            return fast
+
+        # 本轮的合并调用（update+route）已经在跑或跑完：等它的路由结果，不再单独调用
+        prefetched = self._take_prefetched(state)
+        if prefetched is not None:
+            wait_started = time.perf_counter()
+            try:
+                result = await prefetched.future
+            except Exception:
+                result = None
+            decision = self._use_prefetched(state, prefetched, result, (time.perf_counter() - wait_started) * 1000)
+            if decision is not None:
+                return decision
+
+        instruction, avoid = self._route_instruction(state)
+        history: List[BaseMessage] = self._history(state, transcript_tail, "route", [instruction])
+        key = self.cache.make_key("route", instruction, event_hashes(transcript_tail))
+        started = time.perf_counter()
+        data = await self._acached_json(
+            "route", key, self._route_chain, {"history": history, "instruction": instruction},
+            on_invoke=lambda: self._record_llm_route(state),
+        )
+        counters = self._batch(_get(state, "thread_id", ""))
+        counters.split_route_calls += 1
+        counters.split_route_ms += (time.perf_counter() - started) * 1000
+        return self._parse_route(data, avoid)
+
+    # ---------- Combined update + route ----------
+    def _batch(self, thread_id: str) -> _BatchCounters:
+        c = self._batch_counters.get(thread_id)
+        if c is None:
+            c = self._batch_counters[thread_id] = _BatchCounters()
+        return c
+
+    def _take_prefetched(self, state: Any) -> Optional[_PrefetchedRoute]:
+        """取出本 turn 的预取路由；turn 或上一发言者已变（如用户插话）则丢弃。"""
+        thread_id = _get(state, "thread_id", "")
+        prefetched = self._prefetched.pop(thread_id, None)
+        if prefetched is None:
+            return None
+        if prefetched.turn_id != int(_get(state, "turn_id", 0) or 0) \
+                or prefetched.last_speaker != _get(state, "last_speaker", None):
+            self._batch(thread_id).route_stale += 1
+            return None
+        return prefetched
 
-        topic = _get(state, "topic", "")
-        last_speaker = _get(state, "last_speaker", None)
+    def _use_prefetched(
+        self, state: Any, prefetched: _PrefetchedRoute, result: Optional[Tuple[Dict[str, Any], int]], waited_ms: float
+    ) -> Optional[Dict[str, Any]]:
+        if not result:
+            return None
+        decision, tokens_saved = result
+        counters = self._batch(_get(state, "thread_id", ""))
+        counters.route_used += 1
+        counters.tokens_saved += tokens_saved
+        # 节省的关键路径耗时 = 单独路由调用的平均耗时 - 实际还需等待的时间
+        # （还没有单独路由的样本时，用本次合并调用的耗时近似）
+        baseline = counters.avg_route_ms() or ((prefetched.finished or time.perf_counter()) - prefetched.started) * 1000
+        counters.saved_ms += max(0.0, baseline - waited_ms)
+        return decision
+
+    async def aupdate_and_route(self, state: Any, transcript_tail: List[dict]) -> Dict[str, Any]:
+        """
+        一次 LLM 调用同时产出状态更新 patch 和下一轮路由（由状态流水线在学伴发言后调用）。
+        - 返回 patch；路由结果暂存，下一轮 route()/aroute() 在同一 turn 内直接使用
+        - JSON 解析失败时退回 aupdate_from_new_public_event()，路由则由下一轮单独调用
+        """
+        thread_id = _get(state, "thread_id", "")
+        loop = asyncio.get_running_loop()
+        prefetched = _PrefetchedRoute(
+            turn_id=int(_get(state, "turn_id", 0) or 0),
+            last_speaker=_get(state, "last_speaker", None),
+            future=loop.create_future(),
+            started=time.perf_counter(),
+        )
+        self._prefetched[thread_id] = prefetched
+        counters = self._batch(thread_id)
+
+        try:
+            route_instruction, avoid = self._route_instruction(state)
+            update_instruction = self._update_instruction()
+            instruction = self._update_route_instruction(route_instruction, update_instruction)
+            history: List[BaseMessage] = self._history(state, transcript_tail, "update_route", [instruction])
+            key = self.cache.make_key("update_route", instruction, event_hashes(transcript_tail))
+            data = await self._acached_json(
+                "update_route", key, self._update_route_chain, {"history": history, "instruction": instruction}
+            )
+        except asyncio.CancelledError:
+            prefetched.future.set_result(None)
+            raise
+        except Exception as e:
+            print(f"[组织者] 合并调用失败，退回独立调用: {e}")
+            data = {}
+        counters.combined_calls += 1
+        prefetched.finished = time.perf_counter()
+
+        patch_data = data.get("patch") if isinstance(data.get("patch"), dict) else None
+        route_data = data.get("route") if isinstance(data.get("route"), dict) else None
+        route_ok = route_data is not None and route_data.get("next_speaker") in SPEAKERS
+
+        if route_ok:
+            # 省下的 token = 单独路由调用要重复发送的历史 + 路由指令 - 合并指令多出的部分
+            tokens_saved = (
+                _history_tokens(history) + estimate_tokens(route_instruction) + estimate_tokens(update_instruction)
+                - estimate_tokens(instruction)
+            )
+            prefetched.future.set_result((self._parse_route(route_data, avoid), max(0, tokens_saved)))
+        else:
+            prefetched.future.set_result(None)
+
+        if patch_data is None:
+            counters.fallbacks += 1
+            print(f"[组织者] 合并调用解析失败，退回独立的状态更新调用: {thread_id}")
+            return await self.aupdate_from_new_public_event(state, transcript_tail)
+        return self._parse_update(patch_data)
+
+    @staticmethod
+    def _update_route_instruction(route_instruction: str, update_instruction: str) -> str:
+        return (
+            "这一次请同时完成两件事，并把结果放进同一个 JSON 对象：\n"
+            "{"
+            '"patch":{状态更新，格式见【一】},'
+            '"route":{路由决定，格式见【二】}'
+            "}\n"
+            "只输出这一个 JSON，不要任何多余文字。\n"
+            "\n"
+            "【一、状态更新】\n"
+            f"{update_instruction}\n"
+            "【二、路由】\n"
+            f"{route_instruction}"
+        )
+
+    def batch_stats(self, thread_id: str) -> Dict[str, Any]:
+        return {"enabled": self.batch_update_route, **self._batch(thread_id).as_dict()}
+
+    def forget(self, thread_id: str):
+        """会话被删除或移出内存时，清理按 thread 保存的预取路由与统计。"""
+        # 进行中的合并调用仍会给自己持有的 future 写结果，这里只丢掉引用
+        self._prefetched.pop(thread_id, None)
+        self._batch_counters.pop(thread_id, None)
+        self.fast_router.forget(thread_id)
+
+    def _fast_route(self, state: Any, transcript_tail: List[dict]) -> Optional[Dict[str, Any]]:
+        """本地快速路由；不确定时返回 None。"""
+        return self.fast_router.decide(state, transcript_tail)
+
+    def _record_llm_route(self, state: Any):
+        """路由链真正被调用时记一次（命中缓存、用上预取的合并调用结果都不算）。"""
+        self.fast_router.record_llm_call(_get(state, "thread_id", ""))
+
+    @staticmethod
+    def _active_question(state: Any) -> Optional[str]:
+        """当前聚焦的议程问题（没有聚焦项时为 None）。"""
         active_item_id = _get(state, "active_item_id", None)
-        agenda = _get(state, "agenda", []) or []
+        if not active_item_id:
+            return None
+        for it in _get(state, "agenda", []) or []:
+            if isinstance(it, dict) and it.get("item_id") == active_item_id:
+                return it.get("question")
+        return None
 
-        active_q = None
-        if active_item_id:
-            for it in agenda:
-                if isinstance(it, dict) and it.get("item_id") == active_item_id:
-                    active_q = it.get("question")
-                    break
+    def _route_instruction(self, state: Any) -> Tuple[str, Optional[str]]:
+        topic = _get(state, "topic", "")
+        last_speaker = _get(state, "last_speaker", None)
+        active_q = self._active_question(state)
 
         # 兜底策略：避免连续同一人
         avoid = last_speaker if last_speaker in SPEAKERS else None
@@ -312,10 +627,10 @@ class OrganizerAgent:
             "请仔细分析最近2-3轮对话，判断话题类型，找出需要回应的具体观点。\n"
             "注意：用户会在每次发言后参与，请设计好承接性的任务提示。"
         )
+        return instruction, avoid
 
-        raw = self._route_chain.invoke({"history": history, "instruction": instruction})
-        data = _safe_json_loads(raw) or {}
-
+    @staticmethod
+    def _parse_route(data: dict, avoid: Optional[str]) -> Dict[str, Any]:
         nxt = data.get("next_speaker", None)
         if nxt not in SPEAKERS:
             # fallback：简单轮转
@@ -348,9 +663,34 @@ class OrganizerAgent:
         从最近公开发言里提炼“状态更新 patch”。
         返回 patch dict，建议由 state_store.apply_patch(state, patch) 来应用。
         """
-        history: List[BaseMessage] = events_to_messages(transcript_tail)
+        history: List[BaseMessage] = self._history(state, transcript_tail, "update", [self._update_instruction()])
+        key = self._update_key(state, transcript_tail)
+        data = self._cached_json(
+            "update", key, self._update_chain, {"history": history, "instruction": self._update_instruction()}
+        )
+        return self._parse_update(data)
+
+    async def aupdate_from_new_public_event(self, state: Any, transcript_tail: List[dict]) -> Dict[str, Any]:
+        """update_from_new_public_event() 的异步版本。"""
+        history: List[BaseMessage] = self._history(state, transcript_tail, "update", [self._update_instruction()])
+        key = self._update_key(state, transcript_tail)
+        data = await self._acached_json(
+            "update", key, self._update_chain, {"history": history, "instruction": self._update_instruction()}
+        )
+        return self._parse_update(data)
+
+    def _update_key(self, state: Any, transcript_tail: List[dict]) -> str:
+        """状态更新的缓存 key：话题 + 当前议程问题 + 最近发言（只看发言的话，不同对话的相同几句会串用结果）。"""
+        return self.cache.make_key(
+            "update",
+            normalize_text(_get(state, "topic", "")),
+            normalize_text(self._active_question(state) or ""),
+            event_hashes(transcript_tail),
+        )
 
-        instruction = (
+    @staticmethod
+    def _update_instruction() -> str:
+        return (
             "请从最近的讨论发言中提炼状态更新。\n"
             "输出 JSON，格式必须严格如下（字段可为空数组）：\n"
             "{"
@@ -368,9 +708,8 @@ class OrganizerAgent:
             "- style_flags: 如果发言像清单/套话/重复，就标记\n"
         )
 
-        raw = self._update_chain.invoke({"history": history, "instruction": instruction})
-        data = _safe_json_loads(raw) or {}
-
+    @staticmethod
+    def _parse_update(data: dict) -> Dict[str, Any]:
         patch = {
             "add_consensus": data.get("add_consensus", []) if isinstance(data.get("add_consensus", []), list) else [],
             "add_disagreements": data.get("add_disagreements", []) if isinstance(data.get("add_disagreements", []), list) else [],
@@ -411,9 +750,30 @@ class OrganizerAgent:
                 style_health[str(f)] = int(style_health.get(str(f), 0)) + 1
             _set(state, "style_health", style_health)
 
+    # ---------- Rolling summary (SummaryMemory) ----------
+    async def acompress(self, state: Any, text: str, level: int) -> str:
+        """
+        把一段较早的讨论压缩成摘要（由 SummaryMemory 在后台调用）。
+        level=0 时 text 是发言原文，level>0 时 text 是若干段下一层摘要。
+        """
+        topic = _get(state, "topic", "")
+        if level == 0:
+            instruction = (
+                f"话题：{topic}\n"
+                "下面是讨论中较早的一段发言，请压缩成不超过150字的摘要：\n"
+                f"{text}"
+            )
+        else:
+            instruction = (
+                f"话题：{topic}\n"
+                "下面是按时间顺序排列的几段阶段摘要，请合并成不超过200字的更概括的摘要，保留讨论推进的脉络：\n"
+                f"{text}"
+            )
+        out = await self._compress_chain.ainvoke({"instruction": instruction})
+        return clean_text(out)[:400]
+
     # ---------- Final summary ----------
     def finalize(self, state: Any, transcript_tail: List[dict]) -> str:
-        history: List[BaseMessage] = events_to_messages(transcript_tail)
         topic = _get(state, "topic", "")
 
         instruction = (
@@ -423,6 +783,7 @@ class OrganizerAgent:
             "- 提到：目前的共识、主要分歧、给用户一个下一步建议\n"
             "- 不要清单/小标题/套话\n"
         )
+        history: List[BaseMessage] = self._history(state, transcript_tail, "final", [instruction])
         out = self._final_chain.invoke({"history": history, "instruction": instruction})
         return clean_text(out)
 
@@ -432,10 +793,22 @@ class OrganizerAgent:
         生成中间总结，对话继续进行
         与 finalize 不同的是：这不是结束，而是帮助理清思路后继续讨论
         """
-        history: List[BaseMessage] = events_to_messages(transcript_tail)
-        topic = _get(state, "topic", "")
+        instruction = self._summary_instruction(state)
+        history: List[BaseMessage] = self._history(state, transcript_tail, "summary", [instruction])
+        out = self._summary_chain.invoke({"history": history, "instruction": instruction})
+        return clean_text(out)
 
-        instruction = (
+    async def asummarize(self, state: Any, transcript_tail: List[dict]) -> str:
+        """summarize() 的异步版本。"""
+        instruction = self._summary_instruction(state)
+        history: List[BaseMessage] = self._history(state, transcript_tail, "summary", [instruction])
+        out = await self._summary_chain.ainvoke({"history": history, "instruction": instruction})
+        return clean_text(out)
+
+    @staticmethod
+    def _summary_instruction(state: Any) -> str:
+        topic = _get(state, "topic", "")
+        return (
             f"话题：{topic}\n"
             "请做一个中间总结，要求：\n"
             "- 2~3段口语自然段\n"
@@ -443,5 +816,18 @@ class OrganizerAgent:
             "- 这是中间总结，对话还会继续，所以不要用'最后''结束'等词\n"
             "- 不要清单/小标题/套话\n"
         )
-        out = self._summary_chain.invoke({"history": history, "instruction": instruction})
-        return clean_text(out)
+
+
+# 所有会话共用的组织者（按 thread 区分的数据都以 thread_id 为键，链本身无状态）
+_shared_organizer: Optional[OrganizerAgent] = None
+_shared_lock = threading.Lock()
+
+
+def get_organizer() -> OrganizerAgent:
+    """获取共用的组织者实例（单例，首次调用时构建各条链）"""
+    global _shared_organizer
+    if _shared_organizer is None:
+        with _shared_lock:
+            if _shared_organizer is None:
+                _shared_organizer = OrganizerAgent()
+    return _shared_organizer
@@ -11,10 +11,12 @@ from ._shared import (
     clean_text,
     is_templated,
     build_rewrite_context,
+    build_interrupted_rewrite_context,
+    guarded_astream,
     pick_tic,
     taboos_text,
 )
-from dev.memory.history_store import events_to_messages
+from dev.memory.context_builder import context_builder
 from utils.companion_tool_io import CompanionSpeakInput, CompanionSpeakOutput, Hook
 from .model_client import llm_skeptic
 
@@ -93,8 +95,6 @@ _rewrite_chain = _prompt | llm_skeptic | RunnableLambda(lambda m: m.content)
 
 
 def skeptic_speak(req: CompanionSpeakInput) -> CompanionSpeakOutput:
-    history: List[BaseMessage] = events_to_messages(req.transcript_tail)
-
     active_q = _active_question_from_state(req.state)
     tic = pick_tic(req.style)
     taboos = taboos_text(req.style)
@@ -129,6 +129,11 @@ def skeptic_speak(req: CompanionSpeakInput) -> CompanionSpeakOutput:
 输出2~4段口语自然段，让你的质疑更加有力、更加深入。
 """
 
+    # 最近公开发言按 token 预算装配成 messages（任务卡片计入预算）
+    history: List[BaseMessage] = context_builder.messages(
+        req.transcript_tail, "companion", req.thread_id, [context_card]
+    )
+
     utterance = clean_text(_chain.invoke({"history": history, "context_card": context_card}))
 
     if is_templated(utterance):
@@ -158,8 +163,6 @@ async def skeptic_speak_stream(req: CompanionSpeakInput, stream_callback: Callab
     """
     质疑者工具流式版本：实时推送内容片段到前端
     """
-    history: List[BaseMessage] = events_to_messages(req.transcript_tail)
-
     active_q = _active_question_from_state(req.state)
     tic = pick_tic(req.style)
     taboos = taboos_text(req.style)
@@ -194,30 +197,44 @@ async def skeptic_speak_stream(req: CompanionSpeakInput, stream_callback: Callab
 输出2~4段口语自然段，让你的质疑更加有力、更加深入。
 """
 
+    # 最近公开发言按 token 预算装配成 messages（任务卡片计入预算）
+    history: List[BaseMessage] = context_builder.messages(
+        req.transcript_tail, "companion", req.thread_id, [context_card]
+    )
+
     # 流式生成
     prompt_messages = _prompt.invoke({"history": history, "context_card": context_card})
-    full_content = ""
-
-    async for chunk in llm_skeptic.astream(prompt_messages):
-        content = chunk.content if hasattr(chunk, 'content') else str(chunk)
-        if content:
-            full_content += content
-            try:
-                await stream_callback({
-                    "type": "stream_chunk",
-                    "role": "skeptic",
-                    "speaker": "质疑者",
-                    "content": content
-                })
-            except Exception as e:
-                print(f"[ERROR] 流式推送失败: {e}")
+
+    async def _push_chunk(content: str):
+        # 实时推送到WebSocket
+        try:
+            await stream_callback({
+                "type": "stream_chunk",
+                "role": "skeptic",
+                "speaker": "质疑者",
+                "content": content
+            })
+        except Exception as e:
+            print(f"[ERROR] 流式推送失败: {e}")
+
+    # 边生成边做反模板检测，命中即中断上游生成
+    full_content, violation = await guarded_astream(llm_skeptic, prompt_messages, _push_chunk)
 
     utterance = clean_text(full_content)
 
     # 反模板检查
-    if is_templated(utterance):
+    if violation:
+        # 中途打断：只浪费了打断前的那一小段，直接带着原任务重新生成
+        print(f"[质疑者] 流式生成中检测到模板化内容（{violation}），已中断 {len(full_content)} 字，立即重写...")
+        rewrite_card = build_interrupted_rewrite_context(context_card, full_content)
+    elif is_templated(utterance):
+        # 兜底：清洗后的全文再检查一次
         print("[质疑者] 检测到模板化内容，触发重写...")
         rewrite_card = build_rewrite_context(utterance)
+    else:
+        rewrite_card = None
+
+    if rewrite_card is not None:
         rewrite_messages = _prompt.invoke({"history": history, "context_card": rewrite_card})
 
         # 发送重写开始信号，让前端知道要替换内容
@@ -0,0 +1,253 @@
+# agents/speculative_router.py
+from __future__ import annotations
+
+import asyncio
+import copy
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from ._shared import clean_text
+
+
+# 部分发言至少积累这么多字才启动推测（太短的话路由依据不足）
+DEFAULT_MIN_CHARS = 80
+# 推测时看到的部分发言至少要占最终发言的这个比例，推测结果才被采纳
+DEFAULT_MIN_PREFIX_RATIO = 0.35
+
+
+@dataclass
+class _Speculation:
+    """一次推测路由。"""
+    speaker: str
+    prefix: str
+    active_item_id: Optional[str]
+    task: asyncio.Task
+    started: float
+    finished: Optional[float] = None
+    committed_turn: Optional[int] = None
+
+
+@dataclass
+class _RouteCounters:
+    started: int = 0
+    restarted: int = 0
+    hits: int = 0
+    misses: int = 0
+    saved_ms: float = 0.0
+    misses_by_reason: Dict[str, int] = field(default_factory=dict)
+
+    def miss(self, reason: str):
+        self.misses += 1
+        self.misses_by_reason[reason] = self.misses_by_reason.get(reason, 0) + 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        decided = self.hits + self.misses
+        return {
+            "started": self.started,
+            "restarted": self.restarted,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / decided, 3) if decided else 0.0,
+            "saved_ms": round(self.saved_ms, 1),
+            "misses_by_reason": dict(self.misses_by_reason),
+        }
+
+
+class SpeculativeRouter:
+    """
+    推测式路由：学伴还在流式输出时，就用“部分发言”提前跑下一轮的 organizer.route()。
+
+    - observe()：流式回调里调用，部分发言够长时启动推测（每轮最多一个在跑）；
+      推测是事件循环上的一个 task：先在线程池里读 transcript（同步查库），再调用 organizer.aroute()（经 LLM 网关排队）。
+      输出继续变长、推测依据的前缀不足 min_prefix_ratio 时，取消旧推测、用更长的前缀重新推测，
+      所以长发言也能在提交时满足比例要求
+    - commit()：本轮发言落定后调用，判断推测依据是否仍然成立，决定保留或丢弃
+    - take()：下一轮路由前调用，命中则直接拿推测结果（可能还需等一小会）
+    - invalidate()：用户插话等打断推测依据的情况
+
+    命中率和节省的路由耗时通过 stats() 上报。
+    """
+
+    def __init__(
+        self,
+        run_sync: Optional[Callable[..., "asyncio.Future"]] = None,
+        min_chars: int = DEFAULT_MIN_CHARS,
+        min_prefix_ratio: float = DEFAULT_MIN_PREFIX_RATIO,
+        tail_n: int = 12,
+    ):
+        """
+        Args:
+            run_sync: 在线程池中执行同步函数的方法，签名同 loop.run_in_executor(None, fn)；
+                      默认用事件循环的默认线程池
+        """
+        self._run_sync = run_sync or (lambda fn: asyncio.get_running_loop().run_in_executor(None, fn))
+        self.min_chars = min_chars
+        self.min_prefix_ratio = min_prefix_ratio
+        self.tail_n = tail_n
+        self._inflight: Dict[str, _Speculation] = {}   # 本轮发言中启动的推测
+        self._ready: Dict[str, _Speculation] = {}      # 已被 commit 保留、等待下一轮使用
+        self._counters: Dict[str, _RouteCounters] = {}
+        self._total = _RouteCounters()
+
+    def _count(self, thread_id: str) -> _RouteCounters:
+        c = self._counters.get(thread_id)
+        if c is None:
+            c = self._counters[thread_id] = _RouteCounters()
+        return c
+
+    def _miss(self, thread_id: str, reason: str):
+        self._count(thread_id).miss(reason)
+        self._total.miss(reason)
+
+    @staticmethod
+    def _discard(spec: Optional[_Speculation]) -> bool:
+        """丢弃一次推测：还在跑就取消（不再占用 LLM 网关的名额）。返回是否确有推测被丢弃。"""
+        if spec is None:
+            return False
+        if not spec.task.done():
+            spec.task.cancel()
+        return True
+
+    @staticmethod
+    def _on_done(task: asyncio.Task, spec: _Speculation):
+        spec.finished = time.perf_counter()
+        # 被丢弃的推测没人 await，这里取走异常，避免 “Task exception was never retrieved”
+        if not task.cancelled():
+            task.exception()
+
+    # ---------- 流式输出过程中 ----------
+    def observe(
+        self,
+        state: Any,
+        organizer: Any,
+        speaker: str,
+        partial_text: str,
+        tail_fn: Callable[[str, int], List[dict]],
+    ):
+        """根据当前已输出的部分发言决定是否启动推测路由。"""
+        thread_id = state.thread_id
+        restart = False
+        spec = self._inflight.get(thread_id)
+        if spec is not None:
+            if spec.speaker == speaker and partial_text.startswith(spec.prefix):
+                # 同一段输出仍在延续：前缀还够长时推测依据不变，否则用更长的前缀重新推测
+                if len(spec.prefix) >= len(partial_text) * self.min_prefix_ratio:
+                    return
+                restart = True
+            else:
+                # 内容被重写（stream_rewrite_start）或换人，旧推测作废
+                self._miss(thread_id, "rewritten")
+            self._discard(self._inflight.pop(thread_id, None))
+
+        if len(partial_text) < self.min_chars:
+            return
+
+        # 假设本轮发言已经提交：last_speaker 指向当前发言者，transcript 末尾是部分发言
+        snapshot = copy.copy(state)
+        snapshot.last_speaker = speaker
+
+        task = asyncio.create_task(self._speculate(organizer, snapshot, speaker, partial_text, tail_fn))
+        spec = _Speculation(
+            speaker=speaker,
+            prefix=partial_text,
+            active_item_id=getattr(state, "active_item_id", None),
+            task=task,
+            started=time.perf_counter(),
+        )
+        task.add_done_callback(lambda t, s=spec: self._on_done(t, s))
+        self._inflight[thread_id] = spec
+        if restart:
+            self._count(thread_id).restarted += 1
+            self._total.restarted += 1
+        else:
+            self._count(thread_id).started += 1
+            self._total.started += 1
+
+    async def _speculate(self, organizer: Any, snapshot: Any, speaker: str, partial_text: str,
+                         tail_fn: Callable[[str, int], List[dict]]) -> Dict[str, Any]:
+        # tail_fn 是同步查库，放到线程池里，不在流式回调里阻塞事件循环
+        tail = await self._run_sync(lambda: list(tail_fn(snapshot.thread_id, self.tail_n - 1)))
+        tail.append({"speaker": speaker, "content": partial_text})
+        return await organizer.aroute(snapshot, tail)
+
+    # ---------- 本轮提交 ----------
+    def commit(self, state: Any, speaker: str, final_text: str):
+        """本轮发言已记录并 advance_turn 之后调用。"""
+        thread_id = state.thread_id
+        spec = self._inflight.pop(thread_id, None)
+        if spec is None:
+            return
+
+        final_text = final_text or ""
+        reason = None
+        if spec.speaker != speaker:
+            reason = "speaker_changed"
+        # 最终发言经过 clean_text/兜底改写，前缀不再一致说明推测依据已变
+        elif not final_text.startswith(clean_text(spec.prefix)):
+            reason = "content_changed"
+        elif len(spec.prefix) < len(final_text) * self.min_prefix_ratio:
+            reason = "prefix_too_short"
+        elif getattr(state, "active_item_id", None) != spec.active_item_id:
+            reason = "agenda_changed"
+        if reason is not None:
+            self._discard(spec)
+            self._miss(thread_id, reason)
+            return
+
+        spec.committed_turn = int(getattr(state, "turn_id", 0))
+        self._ready[thread_id] = spec
+
+    def invalidate(self, thread_id: str, reason: str = "user_interjected"):
+        """用户插话等情况：丢弃所有推测。"""
+        if self._discard(self._inflight.pop(thread_id, None)):
+            self._miss(thread_id, reason)
+        if self._discard(self._ready.pop(thread_id, None)):
+            self._miss(thread_id, reason)
+
+    # ---------- 下一轮 ----------
+    async def take(self, state: Any) -> Optional[Dict[str, Any]]:
+        """
+        取出可用的推测路由结果；没有或已过期时返回 None，调用方走正常路由。
+        """
+        thread_id = state.thread_id
+        spec = self._ready.pop(thread_id, None)
+        if spec is None:
+            return None
+
+        # 提交之后又发生了其它公开发言（如中间总结），推测已过期
+        if spec.committed_turn != int(getattr(state, "turn_id", 0)):
+            self._discard(spec)
+            self._miss(thread_id, "stale")
+            return None
+
+        wait_started = time.perf_counter()
+        try:
+            decision = await spec.task
+        except Exception as e:
+            print(f"[推测路由] 推测任务失败: {thread_id}, 错误: {e}")
+            self._miss(thread_id, "error")
+            return None
+        waited_ms = (time.perf_counter() - wait_started) * 1000
+        route_ms = ((spec.finished or time.perf_counter()) - spec.started) * 1000
+
+        # 节省的时间 = 本来要同步等待的整次路由耗时 - 实际还需等待的部分
+        saved = max(0.0, route_ms - waited_ms)
+        counters = self._count(thread_id)
+        counters.hits += 1
+        counters.saved_ms += saved
+        self._total.hits += 1
+        self._total.saved_ms += saved
+        print(f"[推测路由] 命中: {thread_id}, next_speaker={decision.get('next_speaker')}, 节省 {saved:.0f}ms")
+        return decision
+
+    def forget(self, thread_id: str):
+        self._discard(self._inflight.pop(thread_id, None))
+        self._discard(self._ready.pop(thread_id, None))
+        self._counters.pop(thread_id, None)
+
+    def stats(self, thread_id: Optional[str] = None) -> Dict[str, Any]:
+        if thread_id is not None:
+            c = self._counters.get(thread_id)
+            return c.as_dict() if c else _RouteCounters().as_dict()
+        return self._total.as_dict()
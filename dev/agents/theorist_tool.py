@@ -11,10 +11,12 @@ from ._shared import (
     clean_text,
     is_templated,
     build_rewrite_context,
+    build_interrupted_rewrite_context,
+    guarded_astream,
     pick_tic,
     taboos_text,
 )
-from dev.memory.history_store import events_to_messages
+from dev.memory.context_builder import context_builder
 from utils.companion_tool_io import CompanionSpeakInput, CompanionSpeakOutput, Hook
 from .model_client import llm_theorist
 
@@ -104,10 +106,7 @@ def theorist_speak(req: CompanionSpeakInput) -> CompanionSpeakOutput:
     理论家工具：读讨论上下文 + 主持任务提示 -> 输出一段讨论发言 + hooks
     注意：不负责写共享历史（由主循环/组织者统一写 public utterance）
     """
-    # 1) 把最近公开发言转成 messages（让模型把它当对话而不是题干）
-    history: List[BaseMessage] = events_to_messages(req.transcript_tail)
-
-    # 2) 组织内部“本轮任务卡片”（不会进入共享历史）
+    # 1) 组织内部“本轮任务卡片”（不会进入共享历史）
     active_q = _active_question_from_state(req.state)
     tic = pick_tic(req.style)
     taboos = taboos_text(req.style)
@@ -141,15 +140,20 @@ def theorist_speak(req: CompanionSpeakInput) -> CompanionSpeakOutput:
 输出2~4段口语自然段，让你的理论分析更加深入和完整。
 """
 
-    # 3) 生成
+    # 最近公开发言按 token 预算装配成 messages（任务卡片计入预算）
+    history: List[BaseMessage] = context_builder.messages(
+        req.transcript_tail, "companion", req.thread_id, [context_card]
+    )
+
+    # 2) 生成
     utterance = clean_text(_chain.invoke({"history": history, "context_card": context_card}))
 
-    # 4) 反模板：触发则用同角色更稳温度重写（保留意思，改成口语自然段）
+    # 3) 反模板：触发则用同角色更稳温度重写（保留意思，改成口语自然段）
     if is_templated(utterance):
         rewrite_card = build_rewrite_context(utterance)
         utterance = clean_text(_rewrite_chain.invoke({"history": history, "context_card": rewrite_card}))
 
-    # 5) hooks：给组织者做路由参考（先简单，不强求）
+    # 4) hooks：给组织者做路由参考（先简单，不强求）
     hooks: List[Hook] = []
 
     # 线索：理论家常见“澄清/边界”信号
@@ -171,10 +175,7 @@ async def theorist_speak_stream(req: CompanionSpeakInput, stream_callback: Calla
     """
     理论家工具流式版本：实时推送内容片段到前端
     """
-    # 1) 把最近公开发言转成 messages
-    history: List[BaseMessage] = events_to_messages(req.transcript_tail)
-
-    # 2) 组织内部"本轮任务卡片"
+    # 1) 组织内部"本轮任务卡片"
     active_q = _active_question_from_state(req.state)
     tic = pick_tic(req.style)
     taboos = taboos_text(req.style)
@@ -208,32 +209,45 @@ async def theorist_speak_stream(req: CompanionSpeakInput, stream_callback: Calla
 输出2~4段口语自然段，让你的理论分析更加深入和完整。
 """
 
-    # 3) 流式生成
+    # 最近公开发言按 token 预算装配成 messages（任务卡片计入预算）
+    history: List[BaseMessage] = context_builder.messages(
+        req.transcript_tail, "companion", req.thread_id, [context_card]
+    )
+
+    # 2) 流式生成
     prompt_messages = _prompt.invoke({"history": history, "context_card": context_card})
-    full_content = ""
-
-    async for chunk in llm_theorist.astream(prompt_messages):
-        content = chunk.content if hasattr(chunk, 'content') else str(chunk)
-        if content:
-            full_content += content
-            # 实时推送到WebSocket
-            try:
-                await stream_callback({
-                    "type": "stream_chunk",
-                    "role": "theorist",
-                    "speaker": "理论家",
-                    "content": content
-                })
-            except Exception as e:
-                print(f"[ERROR] 流式推送失败: {e}")
-
-    # 4) 清理文本
+
+    async def _push_chunk(content: str):
+        # 实时推送到WebSocket
+        try:
+            await stream_callback({
+                "type": "stream_chunk",
+                "role": "theorist",
+                "speaker": "理论家",
+                "content": content
+            })
+        except Exception as e:
+            print(f"[ERROR] 流式推送失败: {e}")
+
+    # 边生成边做反模板检测，命中即中断上游生成
+    full_content, violation = await guarded_astream(llm_theorist, prompt_messages, _push_chunk)
+
+    # 3) 清理文本
     utterance = clean_text(full_content)
 
-    # 5) 反模板检查（如果检测到模板化，重新流式生成）
-    if is_templated(utterance):
+    # 4) 反模板检查（如果检测到模板化，重新流式生成）
+    if violation:
+        # 中途打断：只浪费了打断前的那一小段，直接带着原任务重新生成
+        print(f"[理论家] 流式生成中检测到模板化内容（{violation}），已中断 {len(full_content)} 字，立即重写...")
+        rewrite_card = build_interrupted_rewrite_context(context_card, full_content)
+    elif is_templated(utterance):
+        # 兜底：清洗后的全文再检查一次
         print("[理论家] 检测到模板化内容，触发重写...")
         rewrite_card = build_rewrite_context(utterance)
+    else:
+        rewrite_card = None
+
+    if rewrite_card is not None:
         rewrite_messages = _prompt.invoke({"history": history, "context_card": rewrite_card})
 
         # 发送重写开始信号，让前端知道要替换内容
@@ -265,7 +279,7 @@ async def theorist_speak_stream(req: CompanionSpeakInput, stream_callback: Calla
         utterance = clean_text(full_content)
         print(f"[理论家] 重写完成，新内容长度: {len(utterance)}")
 
-    # 6) 推送流结束信号
+    # 5) 推送流结束信号
     try:
         await stream_callback({
             "type": "stream_end",
@@ -276,7 +290,7 @@ async def theorist_speak_stream(req: CompanionSpeakInput, stream_callback: Calla
     except Exception as e:
         print(f"[ERROR] 流结束信号推送失败: {e}")
 
-    # 7) hooks
+    # 6) hooks
     hooks: List[Hook] = []
 
     if any(k in utterance for k in ["需要区分", "边界", "前提", "关键变量", "判断标准", "换句话说", "从概念上讲"]):
@@ -13,8 +13,7 @@ from dotenv import load_dotenv
 load_dotenv()
 import uuid
 import asyncio
-import zipfile
-import io
+import contextvars
 import pymysql
 from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional
@@ -45,12 +44,18 @@ from dev.auth.auth_utils import (
 from dev.email.verification import VerificationCodeManager
 from dev.email.email_service import email_service
 
-from dev.agents.organizer_agent import OrganizerAgent
+from dev.agents.organizer_agent import OrganizerAgent, get_organizer
 from dev.agents.theorist_tool import theorist_speak, theorist_speak_stream
 from dev.agents.practitioner_tool import practitioner_speak, practitioner_speak_stream
 from dev.agents.skeptic_tool import skeptic_speak, skeptic_speak_stream
 from dev.agents.rewriter_tools import rewrite_if_needed
+from dev.agents.speculative_router import SpeculativeRouter
+from dev.agents.llm_gateway import llm_gateway, bind_chat
+from dev.agents.chain_cache import organizer_cache
 from dev.memory.history_store import history_store, events_to_messages
+from dev.memory.context_builder import context_builder
+from dev.memory.summary_memory import summary_memory
+from dev.memory.session_cache import SessionCache
 from dev.memory.state_store import (
     init_state,
     set_agenda,
@@ -59,6 +64,12 @@ from dev.memory.state_store import (
     DiscussionState,
     load_state_from_db,
 )
+from dev.memory.patch_pipeline import StatePatchPipeline
+from dev.search.search_service import search_service
+from dev.moderation.banned_words import banned_words
+from dev.moderation.moderation_service import moderation
+from dev.nlp.content_analyzer import get_content_analyzer
+from dev.nlp.segmenter import segmenter
 from types import SimpleNamespace
 
 # 尝试导入数据库管理器
@@ -66,10 +77,13 @@ _db_manager = None
 _db_available = False  # 单独跟踪数据库可用性
 _db_config = None  # 保存数据库配置
 try:
-    from dev.mysql.db_utils import DatabaseManager, ensure_db_connected
+    from dev.mysql.db_utils import get_db_manager, ensure_db_connected
+    from dev.mysql.stats_service import dashboard_stats
+    from dev.mysql.export_service import ChatExporter, EXPORT_FORMATS
     from dev.mysql.db_config import get_db_config
     _db_config = get_db_config()
-    _db_manager = DatabaseManager.from_config()
+    # 与 history_store / 状态存储共用同一个连接池
+    _db_manager = get_db_manager()
 
     # 尝试连接数据库
     if ensure_db_connected():
@@ -112,137 +126,18 @@ def create_thread_local_connection():
         print(f"[API] 创建线程独立数据库连接失败: {e}")
         return None
 
-# ========== 违禁词检测（Trie树） ==========
-
-class BannedWordsTrie:
-    """违禁词Trie树"""
-
-    def __init__(self):
-        self.root = {'children': {}}
-        self._loaded = False
-
-    def insert(self, word: str, category: str = "其他", severity: int = 1):
-        """插入一个违禁词"""
-        node = self.root
-        for char in word:
-            if char not in node['children']:
-                node['children'][char] = {
-                    'char': char,
-                    'children': {},
-                    'is_end': False
-                }
-            node = node['children'][char]
-
-        node['is_end'] = True
-        node['category'] = category
-        node['severity'] = severity
-
-    def search(self, text: str):
-        """
-        搜索文本中的违禁词
-        返回第一个匹配的违禁词信息，或None
-        """
-        for i in range(len(text)):
-            node = self.root
-
-            for j in range(i, len(text)):
-                char = text[j]
-
-                if char not in node['children']:
-                    break
-
-                node = node['children'][char]
-
-                if node['is_end']:
-                    # 找到违禁词，立即返回
-                    return {
-                        'word': text[i:j+1],
-                        'start': i,
-                        'end': j+1,
-                        'category': node['category'],
-                        'severity': node['severity']
-                    }
-
-        return None
-
-    def search_all(self, text: str):
-        """
-        搜索文本中的所有违禁词
-        返回所有匹配的违禁词列表
-        """
-        violations = []
-
-        for i in range(len(text)):
-            node = self.root
-
-            for j in range(i, len(text)):
-                char = text[j]
-
-                if char not in node['children']:
-                    break
-
-                node = node['children'][char]
-
-                if node['is_end']:
-                    violations.append({
-                        'word': text[i:j+1],
-                        'start': i,
-                        'end': j+1,
-                        'category': node['category'],
-                        'severity': node['severity']
-                    })
-                    break  # 找到一个后继续从下一个位置开始
-
-        return violations
-
-# 全局违禁词Trie树
-_banned_words_trie = BannedWordsTrie()
-
-def load_banned_words_to_trie():
-    """从数据库加载违禁词到Trie树"""
-    global _banned_words_trie
+# ========== 违禁词检测（Aho-Corasick 自动机，见 dev/moderation） ==========
 
+def load_banned_words():
+    """从数据库全量加载违禁词（启动时；管理员增删改走 banned_words.add/remove 增量更新）"""
     if not _db_manager:
         print("[违禁词] 数据库未连接，无法加载违禁词")
         return False
-
-    try:
-        with _db_manager.get_cursor() as cursor:
-            cursor.execute("""
-                SELECT word, category, severity
-                FROM forbidden_words
-                WHERE is_active = 1
-            """)
-            words = cursor.fetchall()
-
-            # 重建Trie树
-            _banned_words_trie = BannedWordsTrie()
-            count = 0
-            for word_info in words:
-                _banned_words_trie.insert(
-                    word_info['word'],
-                    word_info['category'],
-                    word_info['severity']
-                )
-                count += 1
-
-            _banned_words_trie._loaded = True
-            print(f"[违禁词] 成功加载 {count} 个违禁词到Trie树")
-            return True
-
-    except Exception as e:
-        print(f"[违禁词] 加载失败: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
-
-def reload_banned_words():
-    """重新加载违禁词（管理员修改后调用）"""
-    return load_banned_words_to_trie()
+    return banned_words.load_from_db(_db_manager)
 
 # 应用启动时加载违禁词
 if _db_available:
-    load_banned_words_to_trie()
+    load_banned_words()
 
 
 # ========== FastAPI 应用初始化 ==========
@@ -274,11 +169,39 @@ STREAM_TOOLS = {
     "质疑者": skeptic_speak_stream,
 }
 
-# ========== 线程池执行器（用于非阻塞LLM调用） ==========
-# 创建线程池，用于在独立线程中执行同步的LLM调用，避免阻塞事件循环
-# max_workers=10 表示最多同时处理10个LLM请求
+# ========== 线程池执行器（用于数据库读写等同步调用） ==========
+# LLM 调用的并发由 llm_gateway 按服务商控制（见 dev/agents/llm_gateway.py），
+# 线程池里的同步 LLM 调用也会转交给网关排队，这里的 10 个线程不再是 LLM 并发上限
 executor = ThreadPoolExecutor(max_workers=10)
 
+
+async def run_in_executor(func):
+    """在线程池中执行同步函数（带上当前上下文，LLM 网关据此识别所属对话）"""
+    loop = asyncio.get_event_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(executor, ctx.run, func)
+
+
+# ========== 后台状态更新流水线 ==========
+# organizer.update_from_new_public_event 不再阻塞 stream_complete，
+# 发言送达后在后台按 turn 顺序提炼并应用 patch
+patch_pipeline = StatePatchPipeline(run_sync=run_in_executor, memory=summary_memory)
+
+# ========== 推测式路由 ==========
+# 学伴流式输出期间用部分发言提前计算下一轮路由，本轮提交后决定保留或丢弃
+speculative_router = SpeculativeRouter(run_sync=run_in_executor)
+
+# ========== 全文检索 ==========
+# 新发言追加后增量写入倒排索引（全量索引在启动后后台建立）
+history_store.add_append_listener(search_service.index_event)
+
+# ========== 发言审核 ==========
+# 每条发言追加时扫描违禁词并累积到对话的违规摘要，提交公开时直接查摘要
+history_store.add_append_listener(moderation.check_event)
+moderation.loader = history_store.all
+# 违规摘要达到这个严重程度时不允许提交公开（1-轻微，2-中等，3-严重）
+MODERATION_BLOCK_SEVERITY = int(os.getenv("MODERATION_BLOCK_SEVERITY", 3))
+
 # ========== 风格参数 ==========
 THEORIST_STYLE = SimpleNamespace(
     vibe="学院派但不装腔，谨慎克制，爱讲边界条件和判断标准",
@@ -304,10 +227,35 @@ STYLE_BY_SPEAKER = {
 
 # ========== 全局状态管理 ==========
 # 存储所有会话的状态和连接
-sessions: Dict[str, Dict[str, Any]] = {}
 active_websockets: Dict[str, WebSocket] = {}
 
 
+def _session_evictable(chat_id: str, session: Dict[str, Any]) -> bool:
+    """有 WebSocket 连接或状态更新还没跑完的会话不移出内存"""
+    return chat_id not in active_websockets and patch_pipeline.lag(session.get("thread_id", chat_id)) == 0
+
+
+def _on_session_evicted(chat_id: str, session: Dict[str, Any]):
+    """会话移出内存：只清理各模块的内存缓存，数据库里的记录保留，下次访问时重新加载"""
+    thread_id = session.get("thread_id", chat_id)
+    patch_pipeline.forget(thread_id)
+    context_builder.forget(thread_id)
+    summary_memory.forget(thread_id)
+    speculative_router.forget(thread_id)
+    get_organizer().forget(thread_id)
+    moderation.forget(thread_id)
+
+
+# 热会话缓存：LRU + 空闲淘汰，未命中时从数据库懒加载（loader 在 load_session_from_db 定义后设置）
+sessions = SessionCache(
+    max_sessions=int(os.getenv("SESSION_CACHE_MAX", 200)),
+    max_messages=int(os.getenv("SESSION_CACHE_MAX_MESSAGES", 20000)),
+    idle_ttl=float(os.getenv("SESSION_IDLE_TTL", 1800)),
+    can_evict=_session_evictable,
+    on_evict=_on_session_evicted,
+)
+
+
 # ========== Pydantic 数据模型 ==========
 class CreateChatRequest(BaseModel):
     topic: str
@@ -451,15 +399,58 @@ def get_timestamp() -> str:
     return datetime.now().strftime("%m/%d %H:%M")
 
 
+def find_session(chat_id: str) -> Optional[Dict[str, Any]]:
+    """从热会话缓存获取会话，不在内存中时尝试从数据库加载"""
+    if _db_manager:
+        return sessions.get_or_load(chat_id)
+    return sessions.get(chat_id)
+
+
 def get_session(chat_id: str) -> Dict[str, Any]:
-    """获取或创建会话"""
-    if chat_id not in sessions:
-        # 尝试从数据库加载
-        if _db_manager:
-            load_session_from_db(chat_id)
-        if chat_id not in sessions:
-            raise HTTPException(status_code=404, detail="会话不存在")
-    return sessions[chat_id]
+    """获取会话（不存在时返回 404）"""
+    session = find_session(chat_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="会话不存在")
+    return session
+
+
+def event_to_chat_message(chat_id: str, event: Dict[str, Any]) -> Dict[str, Any]:
+    """数据库事件 → 前端消息格式（message_id 使用 event_id，可作为分页游标）"""
+    role_id_map = {
+        "用户": "user",
+        "理论家": "theorist",
+        "实践者": "practitioner",
+        "质疑者": "skeptic",
+        "组织者": "facilitator",
+    }
+    speaker = event.get('speaker', '未知')
+    created_at = event.get('created_at', '')
+
+    # 格式化时间 - 兼容多种时间格式
+    time_str = get_current_time()
+    if created_at:
+        try:
+            # 尝试解析不同格式的时间
+            created_at_str = str(created_at)
+            if '.' in created_at_str:
+                # 带微秒的格式
+                dt = datetime.strptime(created_at_str, "%Y-%m-%d %H:%M:%S.%f")
+            else:
+                # 不带微秒的格式
+                dt = datetime.strptime(created_at_str, "%Y-%m-%d %H:%M:%S")
+            time_str = dt.strftime("%H:%M")
+        except:
+            time_str = get_current_time()
+
+    return {
+        "message_id": event.get('event_id', uuid.uuid4().hex),
+        "chat_id": chat_id,
+        "author_id": role_id_map.get(speaker, "user"),
+        "author_name": speaker,
+        "content": event.get('content', ''),
+        "timestamp": time_str,
+        "role": speaker,
+    }
 
 
 def load_session_from_db(chat_id: str):
@@ -468,8 +459,8 @@ def load_session_from_db(chat_id: str):
         return False
 
     try:
-        # 获取线程的所有事件
-        events = _db_manager.get_thread_events(chat_id)
+        # 获取线程的所有事件（经历史存储读取，包含写后日志里尚未写库的发言）
+        events = history_store.all(chat_id)
         if not events:
             return False
 
@@ -489,56 +480,28 @@ def load_session_from_db(chat_id: str):
             publication_status = thread_info.get('publication_status', 'draft')
             rejection_reason = thread_info.get('rejection_reason', '')
 
-        # 初始化状态
-        state = init_state(thread_id=chat_id, topic=topic)
+        # 恢复持久化的讨论状态（议程、共识/分歧/问题、风格健康度、摘要）；
+        # 没有保存过状态时才按发言重放出一个初始状态
+        state = load_state_from_db(chat_id)
+        if state is None:
+            state = init_state(thread_id=chat_id, topic=topic)
+            for event in events:
+                if event.get('speaker') in ["用户", "组织者", "理论家", "实践者", "质疑者"]:
+                    advance_turn(state, event.get('speaker'))
+            # 恢复更早讨论的滚动摘要（长对话重新加载后不用从头压缩）
+            summary_memory.restore(state)
+        else:
+            # 状态是批量落库的，最后几条发言可能还没反映到 turn_id 上
+            last = events[-1]
+            if int(last.get('turn_id') or 0) > state.turn_id:
+                state.turn_id = int(last['turn_id'])
+                state.last_speaker = last.get('speaker')
 
-        # 创建组织者
-        organizer = OrganizerAgent()
+        # 所有会话共用一个组织者
+        organizer = get_organizer()
 
         # 转换事件为消息格式
-        role_id_map = {
-            "用户": "user",
-            "理论家": "theorist",
-            "实践者": "practitioner",
-            "质疑者": "skeptic",
-            "组织者": "facilitator",
-        }
-
-        messages = []
-        for event in events:
-            speaker = event.get('speaker', '未知')
-            content = event.get('content', '')
-            created_at = event.get('created_at', '')
-
-            # 格式化时间 - 兼容多种时间格式
-            time_str = get_current_time()
-            if created_at:
-                try:
-                    # 尝试解析不同格式的时间
-                    created_at_str = str(created_at)
-                    if '.' in created_at_str:
-                        # 带微秒的格式
-                        dt = datetime.strptime(created_at_str, "%Y-%m-%d %H:%M:%S.%f")
-                    else:
-                        # 不带微秒的格式
-                        dt = datetime.strptime(created_at_str, "%Y-%m-%d %H:%M:%S")
-                    time_str = dt.strftime("%H:%M")
-                except:
-                    time_str = get_current_time()
-
-            messages.append({
-                "message_id": event.get('event_id', uuid.uuid4().hex),
-                "chat_id": chat_id,
-                "author_id": role_id_map.get(speaker, "user"),
-                "author_name": speaker,
-                "content": content,
-                "timestamp": time_str,
-                "role": speaker,
-            })
-
-            # 更新状态（如果是用户或组织者）
-            if speaker in ["用户", "组织者", "理论家", "实践者", "质疑者"]:
-                advance_turn(state, speaker)
+        messages = [event_to_chat_message(chat_id, event) for event in events]
 
         # 存储会话
         sessions[chat_id] = {
@@ -565,11 +528,23 @@ def load_session_from_db(chat_id: str):
         return False
 
 
-def load_all_sessions_from_db():
-    """从数据库加载所有历史对话（只加载登录用户的对话，不加载游客的）"""
+sessions.loader = load_session_from_db
+
+
+def load_all_sessions_from_db(limit: Optional[int] = None):
+    """
+    预热最近的历史对话（只加载登录用户的对话，不加载游客的）。
+    其余会话在第一次访问时懒加载；默认不预热（SESSION_WARM_COUNT=0）。
+    """
     if not _db_manager:
         return 0
 
+    if limit is None:
+        limit = int(os.getenv("SESSION_WARM_COUNT", 0))
+    limit = min(limit, sessions.max_sessions)
+    if limit <= 0:
+        return 0
+
     try:
         # 只加载有 user_id 的对话，不加载游客的对话（user_id 为 NULL）
         with _db_manager.get_cursor() as cursor:
@@ -578,8 +553,8 @@ def load_all_sessions_from_db():
                 FROM threads
                 WHERE user_id IS NOT NULL
                 ORDER BY updated_at DESC
-                LIMIT 100
-            """)
+                LIMIT %s
+            """, (limit,))
             thread_ids = [row['thread_id'] for row in cursor.fetchall()]
 
         loaded = 0
@@ -608,7 +583,7 @@ def generate_ai_response_in_background(
         print(f"[后台任务] 开始生成AI响应: {chat_id}")
 
         # 获取历史记录
-        history = history_store.tail(thread_id, 12) if not is_guest else []
+        history = context_builder.window(thread_id, "route") if not is_guest else []
 
         # 组织者路由决定下一个发言者
         decision = organizer.route(state, history)
@@ -625,13 +600,14 @@ def generate_ai_response_in_background(
             tail_n=6,
         )
 
-        # 记录发言（非游客才保存到历史）
+        # 记录发言（非游客才保存到历史）；消息 ID 与 event_id 一致，驱逐后从数据库恢复时不变
+        message_id = uuid.uuid4().hex
         if not is_guest:
-            history_store.record_speaker(thread_id, next_speaker, utterance)
+            message_id = history_store.record_speaker(thread_id, next_speaker, utterance)["event_id"]
         advance_turn(state, next_speaker)
 
         # 更新状态
-        patch = organizer.update_from_new_public_event(state, history_store.tail(thread_id, 12) if not is_guest else [])
+        patch = organizer.update_from_new_public_event(state, context_builder.window(thread_id, "update") if not is_guest else [])
         apply_patch(state, patch)
 
         # 映射角色ID
@@ -646,7 +622,7 @@ def generate_ai_response_in_background(
         # 更新会话消息
         if chat_id in sessions:
             sessions[chat_id]["messages"].append({
-                "message_id": uuid.uuid4().hex,
+                "message_id": message_id,
                 "chat_id": chat_id,
                 "author_id": first_agent_id,
                 "author_name": next_speaker,
@@ -674,7 +650,8 @@ def call_companion(
     tail_n: int = 12,
 ) -> str:
     """调用智能体生成发言"""
-    transcript_tail = history_store.tail(state.thread_id, n=tail_n)
+    # tail_n 是学伴最多参考的条数（聚焦最近发言），实际条数再受 token 预算约束
+    transcript_tail = context_builder.window(state.thread_id, "companion", max_events=tail_n)
 
     req = SimpleNamespace(
         thread_id=state.thread_id,
@@ -700,7 +677,8 @@ def call_organizer_open(organizer: OrganizerAgent, topic: str, history_tail: lis
 
 async def call_companion_stream_async(speaker: str, state: DiscussionState, task_hint: str, stance_hint: Optional[str], tail_n: int, stream_callback) -> str:
     """异步流式调用智能体生成发言"""
-    transcript_tail = history_store.tail(state.thread_id, n=tail_n)
+    # tail_n 是学伴最多参考的条数（聚焦最近发言），实际条数再受 token 预算约束
+    transcript_tail = context_builder.window(state.thread_id, "companion", max_events=tail_n)
 
     req = SimpleNamespace(
         thread_id=state.thread_id,
@@ -731,35 +709,29 @@ async def call_companion_stream_async(speaker: str, state: DiscussionState, task
 async def process_user_message_in_background(chat_id: str, session: Dict[str, Any], content: str):
     """
     在后台处理用户消息并生成AI响应（非阻塞，使用流式输出）
-    处理流程：用户发言 -> 组织者路由 -> 智能体流式回应 -> 更新状态 -> 推送到前端
+    处理流程：用户发言 -> 组织者路由 -> 智能体流式回应 -> 推送到前端 -> 后台更新状态
     """
     try:
+        bind_chat(chat_id)
         state = session["state"]
         organizer = session["organizer"]
 
-        # 分析并选择合适的智能体回应（使用线程池执行LLM调用）
-        loop = asyncio.get_event_loop()
-
+        # 分析并选择合适的智能体回应（LLM调用经网关排队）
         # 1. 调用组织者路由（如果需要）
         responder = None
         task_hint = None
 
-        # 简单的关键词匹配不需要LLM调用
-        if any(kw in content.lower() for kw in ["什么是", "如何", "怎么", "为什么", "哪些"]):
-            responder = "理论家"
-            task_hint = f"【用户提问】用户刚才问：\"{content}\"\n你的任务：直接回答这个具体问题，不要偏离主题。用简单的例子说明，让用户能理解。"
-        elif any(kw in content.lower() for kw in ["技能", "框架", "工具", "方法", "步骤", "怎么做"]):
-            responder = "实践者"
-            task_hint = f"【用户需求】用户想了解：\"{content}\"\n你的任务：给出可操作的建议和具体步骤，避免空泛的理论。"
-        elif any(kw in content.lower() for kw in ["对吗", "真的", "但是", "不对", "有问题"]):
-            responder = "质疑者"
-            task_hint = f"【用户质疑/反馈】用户说：\"{content}\"\n你的任务：认真回应用户的观点，指出可能的问题或盲点，但保持友善。"
+        # 明显的轮次（命中关键词等）由本地快速路由决定，不需要LLM调用
+        fast = organizer.fast_router.decide(
+            state, context_builder.tail(state.thread_id, 12), user_message=content
+        )
+        if fast is not None:
+            responder = fast["next_speaker"]
+            task_hint = fast["task_hint"]
         else:
-            # 需要调用组织者路由（LLM调用）
-            decision = await loop.run_in_executor(
-                executor,
-                lambda: organizer.route(state, history_store.tail(state.thread_id, 12))
-            )
+            # 需要调用组织者路由（LLM调用，经网关排队）
+            tail = await run_in_executor(lambda: context_builder.window(state.thread_id, "route"))
+            decision = await organizer.aroute(state, tail)
             responder = decision["next_speaker"]
             task_hint = f"【用户发言】用户刚才说：\"{content}\"\n{decision['task_hint']}\n重要：你的回应必须与用户的这个发言产生直接对话关系，不要忽略用户的需求！"
 
@@ -789,8 +761,11 @@ async def process_user_message_in_background(chat_id: str, session: Dict[str, An
             "message": temp_ai_msg
         })
 
+        partial_text = ""
+
         async def stream_callback(chunk_data: dict):
             """流式回调函数，实时推送到前端"""
+            nonlocal partial_text
             # 为流式数据添加 message_id，确保前端能找到正确的消息对象
             if chunk_data.get("type") in ["stream_chunk", "stream_end"]:
                 chunk_data["message_id"] = message_id
@@ -798,6 +773,13 @@ async def process_user_message_in_background(chat_id: str, session: Dict[str, An
                 print(f"[API-用户消息] 流式输出: type={chunk_data.get('type')}, length={len(content)}, preview='{content[:30]}'...")
             await send_to_websocket(chat_id, chunk_data)
 
+            # 用部分发言推测下一轮路由
+            if chunk_data.get("type") == "stream_chunk":
+                partial_text += chunk_data.get("content", "")
+                speculative_router.observe(state, organizer, responder, partial_text, context_builder.tail)
+            elif chunk_data.get("type") == "stream_rewrite_start":
+                partial_text = ""
+
         # 3. 调用智能体流式回应用户
         response = await call_companion_stream_async(
             responder,
@@ -808,18 +790,12 @@ async def process_user_message_in_background(chat_id: str, session: Dict[str, An
             stream_callback
         )
 
-        # 4. 记录回应
-        history_store.record_speaker(state.thread_id, responder, response)
+        # 4. 记录回应（event_id 沿用流式消息的 message_id）
+        history_store.record_speaker(state.thread_id, responder, response, event_id=message_id)
         advance_turn(state, responder)
+        speculative_router.commit(state, responder, response)
 
-        # 5. 更新状态（LLM调用）
-        patch = await loop.run_in_executor(
-            executor,
-            lambda: organizer.update_from_new_public_event(state, history_store.tail(state.thread_id, 12))
-        )
-        apply_patch(state, patch)
-
-        # 6. 创建完整的AI消息
+        # 5. 创建完整的AI消息
         ai_msg = {
             "message_id": message_id,
             "chat_id": chat_id,
@@ -830,17 +806,20 @@ async def process_user_message_in_background(chat_id: str, session: Dict[str, An
             "role": responder,
         }
 
-        # 7. 添加到会话
+        # 6. 添加到会话
         session["messages"].append(ai_msg)
         session["updated_at"] = get_timestamp()
 
-        # 8. 推送流完成消息
+        # 7. 推送流完成消息
         await send_to_websocket(chat_id, {
             "type": "stream_complete",
             "message": ai_msg,
             "updated_at": session["updated_at"]
         })
 
+        # 8. 消息送达后再在后台更新状态（LLM调用不占用响应关键路径）
+        patch_pipeline.submit(state, organizer, context_builder.tail)
+
         print(f"[API] 用户消息的AI流式响应已完成: chat_id={chat_id}")
     except Exception as e:
         print(f"[API] 后台处理用户消息失败: {e}")
@@ -858,8 +837,10 @@ async def process_agent_turn(chat_id: str, session: Dict[str, Any]) -> Optional[
     state = session["state"]
     organizer = session["organizer"]
 
+    bind_chat(chat_id)
+
     # 组织者动态路由
-    decision = organizer.route(state, history_store.tail(state.thread_id, 12))
+    decision = await organizer.aroute(state, context_builder.window(state.thread_id, "route"))
     next_speaker = decision["next_speaker"]
     task_hint = decision["task_hint"]
     stance_hint = decision.get("stance_hint")
@@ -880,12 +861,11 @@ async def process_agent_turn(chat_id: str, session: Dict[str, Any]) -> Optional[
     # =====================================================================
 
     # 记录发言
-    history_store.record_speaker(state.thread_id, next_speaker, utterance)
+    ev = history_store.record_speaker(state.thread_id, next_speaker, utterance)
     advance_turn(state, next_speaker)
 
-    # 更新状态
-    patch = organizer.update_from_new_public_event(state, history_store.tail(state.thread_id, 12))
-    apply_patch(state, patch)
+    # 更新状态（后台流水线）
+    patch_pipeline.submit(state, organizer, context_builder.tail)
 
     # 映射角色ID
     role_id_map = {
@@ -896,7 +876,7 @@ async def process_agent_turn(chat_id: str, session: Dict[str, Any]) -> Optional[
     }
 
     return {
-        "message_id": uuid.uuid4().hex,
+        "message_id": ev["event_id"],
         "chat_id": chat_id,
         "author_id": role_id_map.get(next_speaker, "theorist"),
         "author_name": next_speaker,
@@ -915,13 +895,46 @@ async def send_to_websocket(chat_id: str, message: dict):
             pass
 
 
+async def evict_idle_sessions_periodically(interval: float = 60.0):
+    """定期把空闲会话移出内存"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            sessions.evict_idle()
+        except Exception as e:
+            print(f"[API] 清理空闲会话失败: {e}")
+
+
+async def build_search_index():
+    """后台全量建立全文索引，完成前关键词过滤退回 LIKE / 子串匹配"""
+    await run_in_executor(lambda: search_service.build_from_db(_db_manager))
+
+
+async def reconcile_dashboard_stats_periodically():
+    """定期从数据库对账数据看板计数"""
+    while True:
+        await run_in_executor(dashboard_stats.reconcile)
+        await asyncio.sleep(dashboard_stats.reconcile_interval)
+
+
 # ========== API 路由 ==========
 
 @app.on_event("startup")
 async def startup_event():
     """应用启动时加载历史对话"""
     print("[API] 应用启动中...")
+    # 线程池里的同步 LLM 调用转交到主事件循环，由网关统一排队
+    llm_gateway.attach_loop(asyncio.get_running_loop())
     load_all_sessions_from_db()
+    asyncio.create_task(evict_idle_sessions_periodically())
+    # 预热 jieba 词典（含领域词典）和内容分析器，第一条发言和第一次检索不再承担词典加载
+    await run_in_executor(get_content_analyzer().warm_up)
+    if hasattr(history_store, "start_analysis"):
+        # 发言内容分析交给后台工作进程（在预热之后 fork，直接继承已加载的词典）
+        await run_in_executor(history_store.start_analysis)
+    if _db_manager:
+        asyncio.create_task(reconcile_dashboard_stats_periodically())
+        asyncio.create_task(build_search_index())
     # 启动完成后打印访问信息
     print("\n" + "="*50)
     print("[OK] 服务器启动成功！")
@@ -1013,6 +1026,9 @@ async def register(request: RegisterRequest):
                 True  # 邮箱已验证,设置为True
             ))
 
+            dashboard_stats.user_added("user")
+            dashboard_stats.mark_active(user_id)
+
             # 生成访问令牌
             access_token = create_access_token(user_id, request.username, "user")
 
@@ -1109,6 +1125,7 @@ async def login(request: LoginRequest):
                 # 会话保存失败，但仍允许登录
                 print(f"[API] 警告: 无法保存用户会话: {session_err}")
 
+            dashboard_stats.mark_active(user["user_id"])
             print(f"[API] 登录成功: {request.username} (role: {user['role']})")
 
             return {
@@ -1340,6 +1357,8 @@ async def create_chat(
     thread_id = uuid.uuid4().hex[:12]
     chat_id = thread_id
     topic = request.topic
+    # 新对话从空的违规摘要开始，之后每条发言追加时累加
+    moderation.track(thread_id)
     # 生成标题时截断过长的主题，最多显示30个字符
     display_topic = topic[:30] + ("..." if len(topic) > 30 else "")
     title = request.title or f"主题：{display_topic}"
@@ -1349,13 +1368,13 @@ async def create_chat(
     # 初始化状态
     state = init_state(thread_id=thread_id, topic=topic)
 
-    # 创建组织者
-    organizer = OrganizerAgent()
+    # 所有会话共用一个组织者
+    organizer = get_organizer()
 
     # 游客不保存到数据库，只在内存中
     if not is_guest:
         # 登录用户：记录到历史存储（会保存到数据库）
-        history_store.record_user(thread_id, topic, tags=["topic"], topic=topic)
+        topic_message_id = history_store.record_user(thread_id, topic, tags=["topic"], topic=topic)["event_id"]
         advance_turn(state, "用户")
 
         # ========== 使用线程池执行组织者开场（非阻塞） ==========
@@ -1365,11 +1384,11 @@ async def create_chat(
             call_organizer_open,
             organizer,
             topic,
-            history_store.tail(thread_id, 8)
+            context_builder.window(thread_id, "opening")
         )
         # ============================================================
         opening = rewrite_if_needed(opening)
-        history_store.record_speaker(thread_id, "组织者", opening, tags=["opening"])
+        opening_message_id = history_store.record_speaker(thread_id, "组织者", opening, tags=["opening"])["event_id"]
         advance_turn(state, "组织者")
 
         set_agenda(state, agenda_items, active_item_id)
@@ -1391,10 +1410,15 @@ async def create_chat(
                         "INSERT INTO thread_owners (thread_id, user_id, is_public) VALUES (%s, %s, %s)",
                         (thread_id, user_id, False)
                     )
+                dashboard_stats.incr("thread_count")
+                dashboard_stats.mark_active(user_id)
             except Exception as e:
                 print(f"[API] 保存用户关联失败: {e}")
+        search_service.index_thread(thread_id, topic, user_id)
     else:
         # 游客：只初始化状态，不保存到数据库
+        topic_message_id = uuid.uuid4().hex
+        opening_message_id = uuid.uuid4().hex
         advance_turn(state, "用户")
 
         # ========== 使用线程池执行组织者开场（非阻塞） ==========
@@ -1426,7 +1450,7 @@ async def create_chat(
         "updated_at": get_timestamp(),
         "messages": [
             {
-                "message_id": uuid.uuid4().hex,
+                "message_id": topic_message_id,
                 "chat_id": chat_id,
                 "author_id": "user",
                 "author_name": "用户",
@@ -1435,7 +1459,7 @@ async def create_chat(
                 "role": "用户",
             },
             {
-                "message_id": uuid.uuid4().hex,
+                "message_id": opening_message_id,
                 "chat_id": chat_id,
                 "author_id": "facilitator",
                 "author_name": "组织者",
@@ -1470,6 +1494,42 @@ async def create_chat(
     }
 
 
+def thread_list_row(thread: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    未加载的对话在列表里的精简表示（get_threads_by_user 的一行）：只带最后一条发言，
+    字段与内存会话一致，关键词过滤可以共用 chat_matches_keyword
+    """
+    chat_id = thread['thread_id']
+    messages = []
+    if thread.get('last_event_id'):
+        messages.append(event_to_chat_message(chat_id, {
+            "event_id": thread['last_event_id'],
+            "speaker": thread.get('last_speaker') or '未知',
+            "content": thread.get('last_content') or "",
+            "created_at": thread.get('last_created_at'),
+        }))
+    updated_at = thread.get('updated_at')
+    return {
+        "chat_id": chat_id,
+        "thread_id": chat_id,
+        "title": thread.get('topic') or "历史对话",
+        "topic": thread.get('topic') or "历史对话",
+        "updated_at": updated_at.strftime("%m/%d %H:%M") if hasattr(updated_at, "strftime") else get_timestamp(),
+        "messages": messages,
+    }
+
+
+def chat_matches_keyword(session: Dict[str, Any], keyword: str, matched: Optional[set]) -> bool:
+    """对话列表关键词过滤：已建索引的对话查索引结果，否则（索引未就绪、游客会话）按标题和最后一条消息子串匹配"""
+    thread_id = session.get("thread_id", session["chat_id"])
+    if matched is not None and search_service.is_indexed(thread_id):
+        return thread_id in matched
+    kw = keyword.lower()
+    if kw in session["title"].lower():
+        return True
+    return bool(session["messages"]) and kw in session["messages"][-1]["content"].lower()
+
+
 @app.get("/api/chats", response_model=ChatListResponse)
 async def get_chats(
     keyword: Optional[str] = None,
@@ -1482,19 +1542,21 @@ async def get_chats(
     # 获取当前用户ID
     user_id = current_user["user_id"] if current_user else None
 
+    # 关键词先查全文索引（话题或任一发言命中），索引未就绪或关键词分词后为空时为 None（退回子串匹配）
+    matched = None
+    if keyword and search_service.ready:
+        matched = await run_in_executor(lambda: search_service.matching_threads(keyword, user_id=user_id))
+
     # 首先从数据库获取历史对话（只获取当前用户的）
+    # 已在内存里的会话直接用；其余只用列表查询带出的话题、更新时间、最后一条发言和发布状态组装，
+    # 不在列表请求里把会话整个加载进来（既占事件循环，又会把热会话挤出缓存），打开对话时再加载
     if _db_manager and user_id:  # 只有登录用户才从数据库加载历史对话
         try:
-            db_threads = _db_manager.get_threads_by_user(user_id, limit=limit)
+            db_threads = await run_in_executor(lambda: _db_manager.get_threads_by_user(user_id, limit=limit))
             for thread in db_threads:
                 thread_id = thread.get('thread_id')
-                # 如果不在内存中，需要加载
-                if thread_id not in sessions:
-                    load_session_from_db(thread_id)
-
-                # 现在从内存获取信息
-                if thread_id in sessions:
-                    session = sessions[thread_id]
+                session = sessions.get(thread_id)
+                if session is not None:
                     chat_info = {
                         "id": session["chat_id"],
                         "title": session["title"],
@@ -1506,15 +1568,23 @@ async def get_chats(
                         "publicationStatus": session.get("publication_status", "draft"),
                         "rejectionReason": session.get("rejection_reason", ""),
                     }
-                    # 关键词过滤
-                    if keyword:
-                        kw = keyword.lower()
-                        if kw not in chat_info["title"].lower():
-                            if session["messages"]:
-                                last_msg = session["messages"][-1]["content"].lower()
-                                if kw not in last_msg:
-                                    continue
-                    chats.append(chat_info)
+                else:
+                    session = thread_list_row(thread)
+                    chat_info = {
+                        "id": thread_id,
+                        "title": session["title"],
+                        "topic": session["topic"],
+                        "pinned": False,
+                        "updatedAt": session["updated_at"],
+                        "messages": session["messages"],
+                        "messageCount": int(thread.get('turn_id') or 0),
+                        "publicationStatus": thread.get('publication_status') or "draft",
+                        "rejectionReason": thread.get('rejection_reason') or "",
+                    }
+                # 关键词过滤
+                if keyword and not chat_matches_keyword(session, keyword, matched):
+                    continue
+                chats.append(chat_info)
         except Exception as e:
             print(f"[API] 从数据库获取对话失败: {e}")
 
@@ -1539,13 +1609,8 @@ async def get_chats(
                 "rejectionReason": session.get("rejection_reason", ""),
             }
             # 关键词过滤
-            if keyword:
-                kw = keyword.lower()
-                if kw not in chat_info["title"].lower():
-                    if session["messages"]:
-                        last_msg = session["messages"][-1]["content"].lower()
-                        if kw not in last_msg:
-                            continue
+            if keyword and not chat_matches_keyword(session, keyword, matched):
+                continue
             chats.append(chat_info)
 
     # 按更新时间排序
@@ -1554,87 +1619,68 @@ async def get_chats(
     return ChatListResponse(chats=chats, total=len(chats))
 
 
+@app.get("/api/search")
+async def search_my_chats(
+    q: str,
+    kind: Optional[str] = None,  # 'event' 或 'topic'，默认两者
+    page: int = 1,
+    page_size: int = 20,
+    current_user: Optional[Dict[str, Any]] = Depends(get_current_user)
+):
+    """在当前用户自己的对话里全文检索话题和发言（按相关度排序，命中词用 <em> 高亮）"""
+    if not current_user:
+        raise HTTPException(status_code=401, detail="请先登录")
+    if not q or not q.strip():
+        raise HTTPException(status_code=400, detail="搜索关键词不能为空")
+    kinds = [kind] if kind in ("event", "topic") else ["event", "topic"]
+    return await run_in_executor(lambda: search_service.search(
+        q.strip(), kinds=kinds, user_id=current_user["user_id"], page=page, page_size=page_size
+    ))
+
+
 @app.get("/api/chats/export")
 async def export_all_chats(
+    format: str = "txt",  # txt / md / json
     current_user: Optional[Dict[str, Any]] = Depends(get_current_user)
 ):
-    """导出用户的所有对话为 ZIP 文件"""
+    """导出用户的所有对话为 ZIP 文件（边读数据库边压缩边发送，不在内存里拼整个压缩包）"""
     if not current_user:
         raise HTTPException(status_code=401, detail="未登录")
 
     if not _db_manager:
         raise HTTPException(status_code=503, detail="数据库服务不可用")
 
-    try:
-        # 查询用户的所有对话
-        with _db_manager.get_cursor() as cursor:
-            cursor.execute(
-                """SELECT thread_id, topic, created_at, updated_at
-                   FROM threads
-                   WHERE user_id = %s
-                   ORDER BY updated_at DESC""",
-                (current_user["user_id"],)
-            )
-            threads = cursor.fetchall()
-
-            if not threads:
-                raise HTTPException(status_code=404, detail="没有可导出的对话")
-
-            # 创建 ZIP 文件在内存中
-            zip_buffer = io.BytesIO()
-
-            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                for thread in threads:
-                    thread_id = thread["thread_id"]
-
-                    # 获取该对话的所有消息
-                    events = _db_manager.get_thread_events(thread_id)
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="不支持的导出格式")
 
-                    # 格式化对话内容
-                    content_lines = [
-                        f"对话主题: {thread['topic']}",
-                        f"创建时间: {thread['created_at'].strftime('%Y-%m-%d %H:%M:%S')}",
-                        f"更新时间: {thread['updated_at'].strftime('%Y-%m-%d %H:%M:%S')}",
-                        f"对话ID: {thread_id}",
-                        "",
-                        "=== 对话记录 ===",
-                        ""
-                    ]
-
-                    for event in events:
-                        timestamp = event.get('created_at', '').strftime('%Y-%m-%d %H:%M:%S') if event.get('created_at') else ''
-                        content_lines.append(f"[{timestamp}] {event['speaker']}:")
-                        content_lines.append(event['content'])
-                        content_lines.append("")
-
-                    # 添加到 ZIP
-                    filename = f"{thread['topic'][:50]}_{thread_id[:8]}.txt"
-                    # 确保文件名安全
-                    filename = filename.replace('/', '_').replace('\\', '_').replace(':', '_')
-                    zip_file.writestr(filename, '\n'.join(content_lines))
-
-            # 准备响应
-            zip_buffer.seek(0)
-            zip_bytes = zip_buffer.getvalue()
-
-            # 生成文件名: 用户名_对话记录_日期.zip
-            from urllib.parse import quote
-            date_str = datetime.now().strftime('%Y%m%d')
-            safe_username = current_user["username"].replace('/', '_').replace('\\', '_')
-            filename_ascii = f"{safe_username}_chats_{date_str}.zip"
-            filename_utf8 = f"{safe_username}_对话记录_{date_str}.zip"
-
-            # 使用 RFC 5987 编码格式支持中文文件名
-            encoded_filename = quote(filename_utf8.encode('utf-8'))
-            content_disposition = f"attachment; filename=\"{filename_ascii}\"; filename*=UTF-8''{encoded_filename}"
-
-            return StreamingResponse(
-                io.BytesIO(zip_bytes),
-                media_type="application/zip",
-                headers={
-                    "Content-Disposition": content_disposition
-                }
-            )
+    try:
+        exporter = ChatExporter(_db_manager, current_user["user_id"], format)
+        if not await run_in_executor(exporter.has_threads):
+            raise HTTPException(status_code=404, detail="没有可导出的对话")
+
+        # 写后日志里还没写库的发言先落库，导出内容才完整
+        journal = getattr(history_store, "journal", None)
+        if journal is not None:
+            await run_in_executor(journal.flush)
+
+        # 生成文件名: 用户名_对话记录_日期.zip
+        from urllib.parse import quote
+        date_str = datetime.now().strftime('%Y%m%d')
+        safe_username = current_user["username"].replace('/', '_').replace('\\', '_')
+        filename_ascii = f"{safe_username}_chats_{date_str}.zip"
+        filename_utf8 = f"{safe_username}_对话记录_{date_str}.zip"
+
+        # 使用 RFC 5987 编码格式支持中文文件名
+        encoded_filename = quote(filename_utf8.encode('utf-8'))
+        content_disposition = f"attachment; filename=\"{filename_ascii}\"; filename*=UTF-8''{encoded_filename}"
+
+        return StreamingResponse(
+            exporter.iter_zip(),
+            media_type="application/zip",
+            headers={
+                "Content-Disposition": content_disposition
+            }
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -1658,16 +1704,100 @@ async def get_chat(chat_id: str):
     }
 
 
+def load_message_page_from_db(chat_id: str, limit: int, before: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    直接从数据库取一页消息（会话不在内存中时使用，不加载整个会话）。
+    before 为 message_id（即 event_id），先换成 turn_id，再走 (thread_id, turn_id) 索引取更早的 limit 条。
+    写后日志里尚未写库的发言（最新的几条）按 turn_id 一并合并进来，before 也可以是其中一条。
+    total 取 threads.turn_id（每条发言 +1），不再 COUNT(*) 扫整个对话。
+    """
+    pending = history_store.pending_events(chat_id) if hasattr(history_store, "pending_events") else []
+
+    with _db_manager.get_cursor() as cursor:
+        cursor.execute("""
+            SELECT t.updated_at, t.turn_id,
+                   COALESCE(`to`.publication_status, 'draft') as publication_status,
+                   COALESCE(`to`.rejection_reason, '') as rejection_reason
+            FROM threads t
+            LEFT JOIN thread_owners `to` ON t.thread_id = `to`.thread_id
+            WHERE t.thread_id = %s
+        """, (chat_id,))
+        thread_info = cursor.fetchone()
+        if not thread_info and not pending:
+            return None
+        thread_info = thread_info or {}
+
+        before_turn = None
+        if before:
+            before_turn = next((ev['turn_id'] for ev in pending if ev['event_id'] == before), None)
+            if before_turn is None:
+                cursor.execute(
+                    "SELECT turn_id FROM events WHERE event_id = %s AND thread_id = %s",
+                    (before, chat_id)
+                )
+                row = cursor.fetchone()
+                # 游标不是这个对话的消息：没有更早的内容可返回
+                before_turn = row['turn_id'] if row else 0
+
+        events, has_more = _db_manager.get_thread_events_page(chat_id, limit, before_turn)
+
+    total = max([int(thread_info.get('turn_id') or 0)] + [ev['turn_id'] for ev in pending])
+    # 合并未写库的发言（按 event_id 去重、按 turn_id 升序），超出一页的部分留给下一页
+    if pending:
+        if before_turn is not None:
+            pending = [ev for ev in pending if ev['turn_id'] < before_turn]
+        seen = {ev['event_id'] for ev in events}
+        events = sorted(events + [ev for ev in pending if ev['event_id'] not in seen], key=lambda ev: ev['turn_id'])
+        if len(events) > limit:
+            events = events[-limit:]
+            has_more = True
+
+    messages = [event_to_chat_message(chat_id, event) for event in events]
+    updated_at = thread_info.get('updated_at')
+    return {
+        "messages": messages,
+        "total": total,
+        "has_more": has_more,
+        "next_before": messages[0]["message_id"] if has_more and messages else None,
+        "updated_at": updated_at.strftime("%m/%d %H:%M") if updated_at else None,
+        "publication_status": thread_info.get('publication_status', 'draft'),
+        "rejection_reason": thread_info.get('rejection_reason', ''),
+    }
+
+
 @app.get("/api/chats/{chat_id}/messages")
 async def get_messages(chat_id: str, limit: int = 100, before: Optional[str] = None):
-    """获取对话消息列表"""
-    session = get_session(chat_id)
+    """
+    获取对话消息列表（游标分页）：
+    - 不带 before 返回最近 limit 条；before 为上一页返回的 next_before（最早一条消息的 message_id），
+      返回它之前的 limit 条，has_more 表示是否还有更早的消息
+    - 会话在内存中时直接从热会话缓存切片；否则按 (thread_id, turn_id) 查库，只取这一页
+    """
+    limit = max(1, min(limit, 1000))
+    session = sessions.get(chat_id)
+
+    if session is None:
+        if not _db_manager:
+            raise HTTPException(status_code=404, detail="会话不存在")
+        page = await run_in_executor(lambda: load_message_page_from_db(chat_id, limit, before))
+        if page is None:
+            raise HTTPException(status_code=404, detail="会话不存在")
+        return page
+
     messages = session["messages"]
+    end = len(messages)
+    if before:
+        # 游标通常在靠后的位置，从后往前找；找不到说明没有更早的内容
+        end = next((i for i in range(len(messages) - 1, -1, -1) if messages[i].get("message_id") == before), 0)
+    start = max(0, end - limit)
+    page = messages[start:end]
 
     # 返回消息、更新时间和发布状态
     return {
-        "messages": messages[-limit:],
+        "messages": page,
         "total": len(messages),
+        "has_more": start > 0,
+        "next_before": page[0]["message_id"] if start > 0 and page else None,
         "updated_at": session.get("updated_at"),
         "publication_status": session.get("publication_status", "draft"),
         "rejection_reason": session.get("rejection_reason", "")
@@ -1690,13 +1820,16 @@ async def send_message(request: SendMessageRequest):
 
     # 用户输入内容
     if content:
+        # 用户插话后，上一轮的推测路由依据不再成立
+        speculative_router.invalidate(state.thread_id)
+
         # 记录用户发言
-        history_store.record_user(state.thread_id, content, tags=["interject"], topic=session["topic"])
+        user_ev = history_store.record_user(state.thread_id, content, tags=["interject"], topic=session["topic"])
         state.last_user_interjection = content
         advance_turn(state, "用户")
 
         user_msg = {
-            "message_id": uuid.uuid4().hex,
+            "message_id": user_ev["event_id"],
             "chat_id": chat_id,
             "author_id": "user",
             "author_name": "用户",
@@ -1756,15 +1889,15 @@ async def process_agent_in_background(chat_id: str, session: Dict[str, Any]):
     智能体生成过程中，通过WebSocket实时推送结果到前端
     """
     try:
+        bind_chat(chat_id)
         state = session["state"]
         organizer = session["organizer"]
 
-        # 组织者动态路由
-        loop = asyncio.get_event_loop()
-        decision = await loop.run_in_executor(
-            executor,
-            lambda: organizer.route(state, history_store.tail(state.thread_id, 12))
-        )
+        # 组织者动态路由：优先使用上一轮流式输出期间推测好的结果
+        decision = await speculative_router.take(state)
+        if decision is None:
+            tail = await run_in_executor(lambda: context_builder.window(state.thread_id, "route"))
+            decision = await organizer.aroute(state, tail)
 
         next_speaker = decision["next_speaker"]
         task_hint = decision["task_hint"]
@@ -1805,8 +1938,11 @@ async def process_agent_in_background(chat_id: str, session: Dict[str, Any]):
             "message": temp_ai_msg
         })
 
+        partial_text = ""
+
         async def stream_callback(chunk_data: dict):
             """流式回调函数，实时推送到前端"""
+            nonlocal partial_text
             # 为流式数据添加 message_id，确保前端能找到正确的消息对象
             if chunk_data.get("type") in ["stream_chunk", "stream_end"]:
                 chunk_data["message_id"] = message_id
@@ -1814,6 +1950,13 @@ async def process_agent_in_background(chat_id: str, session: Dict[str, Any]):
                 print(f"[API-继续对话] 流式输出: type={chunk_data.get('type')}, length={len(content)}, preview='{content[:30]}'...")
             await send_to_websocket(chat_id, chunk_data)
 
+            # 用部分发言推测下一轮路由
+            if chunk_data.get("type") == "stream_chunk":
+                partial_text += chunk_data.get("content", "")
+                speculative_router.observe(state, organizer, next_speaker, partial_text, context_builder.tail)
+            elif chunk_data.get("type") == "stream_rewrite_start":
+                partial_text = ""
+
         # 调用流式智能体
         print(f"[API] 调用流式智能体: next_speaker={next_speaker}")
         utterance = await call_companion_stream_async(
@@ -1826,16 +1969,10 @@ async def process_agent_in_background(chat_id: str, session: Dict[str, Any]):
         )
         print(f"[API] 流式智能体响应完成: speaker={next_speaker}, content_length={len(utterance)}")
 
-        # 记录发言
-        history_store.record_speaker(state.thread_id, next_speaker, utterance)
+        # 记录发言（event_id 沿用流式消息的 message_id）
+        history_store.record_speaker(state.thread_id, next_speaker, utterance, event_id=message_id)
         advance_turn(state, next_speaker)
-
-        # 更新状态
-        patch = await loop.run_in_executor(
-            executor,
-            lambda: organizer.update_from_new_public_event(state, history_store.tail(state.thread_id, 12))
-        )
-        apply_patch(state, patch)
+        speculative_router.commit(state, next_speaker, utterance)
 
         # 创建完整的AI消息
         agent_msg = {
@@ -1859,6 +1996,9 @@ async def process_agent_in_background(chat_id: str, session: Dict[str, Any]):
             "updated_at": session["updated_at"]
         })
 
+        # 消息送达后再在后台更新状态，下一轮路由读取已应用的最新状态
+        patch_pipeline.submit(state, organizer, context_builder.tail)
+
         print(f"[API] 智能体流式发言已完成: chat_id={chat_id}")
     except Exception as e:
         print(f"[API] 后台处理智能体发言失败: {e}")
@@ -1904,6 +2044,8 @@ async def rename_chat(
         except Exception as e:
             print(f"[API] 重命名对话失败: {e}")
             raise HTTPException(status_code=500, detail="重命名失败")
+    if search_service.is_indexed(chat_id):
+        search_service.index_thread(chat_id, new_title, search_service.owner_of(chat_id))
 
     return {"message": "重命名成功", "title": new_title}
 
@@ -2025,27 +2167,28 @@ async def export_chat(chat_id: str):
 
 @app.post("/api/chats/{chat_id}/summary")
 async def summarize_chat(chat_id: str):
-    """生成对话总结，对话继续进行（使用线程池，非阻塞）"""
+    """生成对话总结，对话继续进行（非阻塞）"""
     session = get_session(chat_id)
     state = session["state"]
     organizer = session["organizer"]
 
-    # ========== 使用线程池执行组织者总结（非阻塞） ==========
-    loop = asyncio.get_event_loop()
-    summary = await loop.run_in_executor(
-        executor,
-        lambda: organizer.summarize(state, history_store.tail(state.thread_id, 20))
-    )
+    # 等后台状态更新流水线处理完已有发言，总结基于完整的共识/分歧（最多等 10 秒）
+    await patch_pipeline.wait_idle(state.thread_id, timeout=10)
+
+    # ========== 组织者总结（异步调用，经 LLM 网关排队） ==========
+    bind_chat(chat_id)
+    tail = await run_in_executor(lambda: context_builder.window(state.thread_id, "summary"))
+    summary = await organizer.asummarize(state, tail)
     # ============================================================
     summary = rewrite_if_needed(summary)
 
     # 记录总结到历史
-    history_store.record_speaker(state.thread_id, "组织者", summary, tags=["summary"])
+    summary_ev = history_store.record_speaker(state.thread_id, "组织者", summary, tags=["summary"])
     advance_turn(state, "组织者")
 
     # 添加总结消息
     summary_msg = {
-        "message_id": uuid.uuid4().hex,
+        "message_id": summary_ev["event_id"],
         "chat_id": chat_id,
         "author_id": "facilitator",
         "author_name": "组织者",
@@ -2065,6 +2208,24 @@ async def summarize_chat(chat_id: str):
     }
 
 
+@app.get("/api/chats/{chat_id}/routing-stats")
+async def get_routing_stats(chat_id: str):
+    """获取路由统计（快速路由省下的LLM调用、合并调用省下的token与耗时、推测式路由命中率、节省的路由耗时、各链 prompt token 数）"""
+    session = sessions.get(chat_id)
+    fast_router = session["organizer"].fast_router if session else None
+    return {
+        "chat_id": chat_id,
+        "fast_path": fast_router.stats(chat_id) if fast_router else None,
+        "batched": session["organizer"].batch_stats(chat_id) if session else None,
+        "context": context_builder.stats(chat_id),
+        "speculative": speculative_router.stats(chat_id),
+        "speculative_total": speculative_router.stats(),
+        "state_version": patch_pipeline.state_version(chat_id),
+        "pending_state_updates": patch_pipeline.lag(chat_id),
+        "summary_memory": summary_memory.stats(session["state"]) if session else None,
+    }
+
+
 @app.delete("/api/chats/all")
 async def delete_all_chats(
     current_user: Optional[Dict[str, Any]] = Depends(get_current_user)
@@ -2098,31 +2259,41 @@ async def delete_all_chats(
                 # 删除相关的所有数据（外键会自动级联删除）
                 # threads 表会被删除，events 等会自动级联
                 cursor.execute("DELETE FROM threads WHERE thread_id = %s", (thread_id,))
+                search_service.remove_thread(thread_id)
+                moderation.forget(thread_id)
                 deleted_count += 1
 
             print(f"[API] 从数据库删除用户所有对话: {current_user['username']}, 删除了 {deleted_count} 个对话")
+            # 级联删除了评论和发布记录，下次读取看板时对账
+            dashboard_stats.invalidate()
+
+        # 清除内存中的会话（只清除属于当前用户的对话）；放在游标块外面，
+        # 关闭 WebSocket 要 await，不能在持有数据库连接时让出事件循环
+        for chat_id in list(sessions.keys()):
+            if chat_id in threads_to_delete:
+                # 清理历史记录
+                history_store.clear(chat_id)
+                patch_pipeline.forget(chat_id)
+                context_builder.forget(chat_id)
+                summary_memory.forget(chat_id)
+                speculative_router.forget(chat_id)
+                get_organizer().forget(chat_id)
+                # 删除会话
+                sessions.pop(chat_id)
+                # 关闭WebSocket连接
+                if chat_id in active_websockets:
+                    try:
+                        await active_websockets[chat_id].close()
+                    except Exception:
+                        pass
+                    del active_websockets[chat_id]
+
+        print(f"[API] 从内存清除会话: {len(threads_to_delete)} 个")
 
-            # 清除内存中的会话（只清除属于当前用户的对话）
-            for chat_id in list(sessions.keys()):
-                if chat_id in threads_to_delete:
-                    # 清理历史记录
-                    history_store.clear(chat_id)
-                    # 删除会话
-                    del sessions[chat_id]
-                    # 关闭WebSocket连接
-                    if chat_id in active_websockets:
-                        try:
-                            await active_websockets[chat_id].close()
-                        except Exception:
-                            pass
-                        del active_websockets[chat_id]
-
-            print(f"[API] 从内存清除会话: {len(threads_to_delete)} 个")
-
-            return {
-                "message": f"已删除 {deleted_count} 个对话",
-                "deleted_count": deleted_count
-            }
+        return {
+            "message": f"已删除 {deleted_count} 个对话",
+            "deleted_count": deleted_count
+        }
     except HTTPException:
         raise
     except Exception as e:
@@ -2138,18 +2309,26 @@ async def delete_chat(
     current_user: Optional[Dict[str, Any]] = Depends(get_current_user)
 ):
     """删除对话"""
-    # 首先检查会话是否在内存中
-    if chat_id not in sessions:
+    # 首先检查会话是否存在（不在内存中时从数据库加载）
+    session = find_session(chat_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="会话不存在")
 
     # 获取thread_id
-    thread_id = sessions[chat_id]["thread_id"]
+    thread_id = session["thread_id"]
 
     # 清理历史记录
     history_store.clear(thread_id)
+    search_service.remove_thread(thread_id)
+    moderation.forget(thread_id)
+    patch_pipeline.forget(thread_id)
+    context_builder.forget(thread_id)
+    summary_memory.forget(thread_id)
+    speculative_router.forget(thread_id)
+    get_organizer().forget(thread_id)
 
     # 删除会话
-    del sessions[chat_id]
+    sessions.pop(chat_id)
 
     # 关闭WebSocket连接
     if chat_id in active_websockets:
@@ -2166,6 +2345,7 @@ async def delete_chat(
                 # 删除相关的所有数据（外键会自动级联删除）
                 cursor.execute("DELETE FROM threads WHERE thread_id = %s", (chat_id,))
                 print(f"[API] 从数据库删除对话: {chat_id}")
+            dashboard_stats.invalidate()
         except Exception as e:
             print(f"[API] 删除数据库记录失败: {e}")
 
@@ -2305,6 +2485,7 @@ async def create_user(
                 VALUES (%s, %s, %s, %s, %s, %s, %s)
             """, (user_id, username, email, password_hash, role, is_active, False))
 
+            dashboard_stats.user_added(role)
             print(f"[API] 创建用户成功: {username} (role: {role})")
 
             return {
@@ -2385,6 +2566,9 @@ async def update_user(
             query = f"UPDATE users SET {', '.join(update_fields)}, updated_at = %s WHERE user_id = %s"
             cursor.execute(query, params)
 
+            if "role" in user_data:
+                # 角色变化影响用户数/管理员数，下次读取看板时对账
+                dashboard_stats.invalidate()
             print(f"[API] 更新用户成功: {user_id}")
 
             return {"message": "用户信息已更新"}
@@ -2418,7 +2602,10 @@ async def delete_user(
 
             # 删除用户（外键会自动级联删除相关数据）
             cursor.execute("DELETE FROM users WHERE user_id = %s", (user_id,))
+            search_service.remove_user(user_id)
 
+            # 级联删除了该用户的对话、评论等，下次读取看板时对账
+            dashboard_stats.invalidate()
             print(f"[API] 删除用户成功: {user['username']}")
 
             return {"message": "用户已删除"}
@@ -2528,6 +2715,11 @@ async def publish_chat(
             if not cursor.fetchone():
                 raise HTTPException(status_code=404, detail="对话不存在或无权操作")
 
+            # 违规摘要在发言追加时已累积好，这里只是查表（摘要不在内存时才重扫一次）
+            moderation_summary = moderation.thread_summary(chat_id)
+            if moderation_summary["max_severity"] >= MODERATION_BLOCK_SEVERITY:
+                raise HTTPException(status_code=400, detail="对话包含严重违规内容，无法提交公开")
+
             # 检查thread_owners表中是否已有记录
             cursor.execute("""
                 SELECT publication_status FROM thread_owners
@@ -2560,7 +2752,7 @@ async def publish_chat(
 
             print(f"[API] 提交对话公开申请成功: {chat_id}")
 
-            return {"message": "已提交公开申请", "status": "pending"}
+            return {"message": "已提交公开申请", "status": "pending", "moderation": moderation_summary}
     except HTTPException:
         raise
     except Exception as e:
@@ -2620,7 +2812,7 @@ async def get_publication_requests(
             # 为每个请求添加消息预览
             result = []
             for req in requests:
-                events = _db_manager.get_thread_events(req["thread_id"])
+                events = history_store.all(req["thread_id"])
                 messages_preview = [
                     {"author_name": e["speaker"], "content": e["content"]}
                     for e in events
@@ -2635,7 +2827,9 @@ async def get_publication_requests(
                     "status": req["publication_status"],
                     "created_at": req["submitted_for_review_at"],
                     "messages_preview": messages_preview,
-                    "reject_reason": req["rejection_reason"]
+                    "reject_reason": req["rejection_reason"],
+                    # 违规摘要（已缓存时直接返回，否则用上面取出的全部发言重扫并缓存，不再读第二次）
+                    "moderation": moderation.thread_summary(req["thread_id"], events, complete=True),
                 })
 
             return {"requests": result, "total": len(result)}
@@ -2700,6 +2894,8 @@ async def review_publication_request(
                 """, (datetime.now(), current_user["user_id"], reason, request_id))
                 print(f"[API] 公开请求审核驳回: {request_id}")
 
+            dashboard_stats.publication_changed(owner["publication_status"], "published" if approved else "rejected")
+
             # 更新内存中的会话状态
             if request_id in sessions:
                 sessions[request_id]["publication_status"] = "published" if approved else "rejected"
@@ -2719,6 +2915,20 @@ async def review_publication_request(
 class CommentRequest(BaseModel):
     content: str
 
+# thread_owners 上反规范化的计数列（公开对话大厅按它排序）
+_THREAD_COUNTERS = ("like_count", "comment_count")
+
+
+def bump_thread_counter(cursor, thread_id: str, column: str, delta: int):
+    """在当前事务里调整对话的点赞数/评论数，与点赞、评论的写入一起提交"""
+    if column not in _THREAD_COUNTERS or not delta:
+        return
+    cursor.execute(
+        f"UPDATE thread_owners SET {column} = GREATEST({column} + %s, 0) WHERE thread_id = %s",
+        (delta, thread_id)
+    )
+
+
 @app.post("/api/chats/{chat_id}/like")
 async def like_chat(
     chat_id: str,
@@ -2753,6 +2963,7 @@ async def like_chat(
                 "INSERT INTO thread_likes (thread_id, user_id) VALUES (%s, %s)",
                 (chat_id, current_user['user_id'])
             )
+            bump_thread_counter(cursor, chat_id, "like_count", 1)
 
             return {"message": "点赞成功"}
 
@@ -2792,6 +3003,7 @@ async def unlike_chat(
                 "DELETE FROM thread_likes WHERE thread_id = %s AND user_id = %s",
                 (chat_id, current_user['user_id'])
             )
+            bump_thread_counter(cursor, chat_id, "like_count", -cursor.rowcount)
 
             return {"message": "取消点赞成功"}
 
@@ -2815,13 +3027,13 @@ async def get_like_status(
 
     try:
         with _db_manager.get_cursor() as cursor:
-            # 获取点赞总数
+            # 获取点赞总数（计数列）
             cursor.execute(
-                "SELECT COUNT(*) as count FROM thread_likes WHERE thread_id = %s",
+                "SELECT like_count FROM thread_owners WHERE thread_id = %s",
                 (chat_id,)
             )
             result = cursor.fetchone()
-            like_count = result['count'] if result else 0
+            like_count = result['like_count'] if result else 0
 
             # 检查当前用户是否已点赞
             is_liked = False
@@ -2844,64 +3056,111 @@ async def get_like_status(
 
 # ========== 公开对话大厅 API ==========
 
+# 公开对话大厅每个对话预览的消息条数
+HALL_PREVIEW_EVENTS = 3
+
+
+def make_hall_cursor(row: Dict[str, Any]) -> str:
+    """大厅游标：最后一行的 (点赞数, 公开记录创建时间, id)"""
+    ranked_at = row['ranked_at'].strftime("%Y%m%d%H%M%S") if row.get('ranked_at') else "19700101000000"
+    return f"{row['like_count']}_{ranked_at}_{row['rank_id']}"
+
+
+def parse_hall_cursor(value: str) -> Optional[tuple]:
+    """解析大厅游标，格式不对时返回 None（退回 offset 分页）"""
+    try:
+        like_count, ranked_at, rank_id = value.split("_")
+        return int(like_count), datetime.strptime(ranked_at, "%Y%m%d%H%M%S"), int(rank_id)
+    except (ValueError, AttributeError):
+        return None
+
+
 @app.get("/api/public/chats")
 async def get_public_chat_hall(
     limit: int = 20,
     offset: int = 0,
+    after: Optional[str] = None,
     current_user: Optional[Dict[str, Any]] = Depends(get_current_user)
 ):
     """
     获取公开对话大厅列表（按点赞数和创建时间排序）
+    排序直接读 thread_owners 上的计数列，走 idx_hall_rank 索引范围扫描；
+    after 为上一页返回的 next_cursor（游标分页，优先于 offset）
     """
     if not _db_manager:
         raise HTTPException(status_code=503, detail="数据库未连接")
 
     try:
-        with _db_manager.get_cursor() as cursor:
+        # 异步游标：查询期间不阻塞事件循环
+        async with _db_manager.aget_cursor() as cursor:
             # 查询已公开的对话
             query = """
                 SELECT
+                    to_owners.id as rank_id,
+                    to_owners.created_at as ranked_at,
                     t.thread_id as id,
                     t.topic as title,
                     t.created_at,
                     u.username,
                     to_owners.publication_status,
-                    COUNT(DISTINCT tl.user_id) as like_count,
-                    COUNT(DISTINCT c.comment_id) as comment_count
-                FROM threads t
-                INNER JOIN thread_owners to_owners ON t.thread_id = to_owners.thread_id
+                    to_owners.like_count,
+                    to_owners.comment_count
+                FROM thread_owners to_owners
+                INNER JOIN threads t ON t.thread_id = to_owners.thread_id
                 LEFT JOIN users u ON to_owners.user_id = u.user_id
-                LEFT JOIN thread_likes tl ON t.thread_id = tl.thread_id
-                LEFT JOIN comments c ON t.thread_id = c.thread_id AND c.is_deleted = 0
                 WHERE to_owners.publication_status = 'published'
-                GROUP BY t.thread_id, t.topic, t.created_at, u.username, to_owners.publication_status
-                ORDER BY like_count DESC, t.created_at DESC
-                LIMIT %s OFFSET %s
             """
-
-            cursor.execute(query, (limit, offset))
-            chats = cursor.fetchall()
-
-            # 获取当前用户点赞的所有对话ID
+            params: List[Any] = []
+            position = parse_hall_cursor(after) if after else None
+            if position:
+                like_count, ranked_at, rank_id = position
+                # 行比较与 ORDER BY 的列顺序一致，MySQL 可以直接在 idx_hall_rank 上做范围扫描
+                query += " AND (to_owners.like_count, to_owners.created_at, to_owners.id) < (%s, %s, %s)"
+                params += [like_count, ranked_at, rank_id]
+            query += " ORDER BY to_owners.like_count DESC, to_owners.created_at DESC, to_owners.id DESC LIMIT %s"
+            params.append(limit)
+            if not position:
+                query += " OFFSET %s"
+                params.append(offset)
+
+            await cursor.execute(query, params)
+            chats = await cursor.fetchall()
+
+            thread_ids = [chat['id'] for chat in chats]
+            placeholders = ", ".join(["%s"] * len(thread_ids))
+
+            # 当前用户在本页里点赞过的对话ID
             liked_thread_ids = set()
-            if current_user:
-                cursor.execute(
-                    "SELECT DISTINCT thread_id FROM thread_likes WHERE user_id = %s",
-                    (current_user['user_id'],)
+            if current_user and thread_ids:
+                await cursor.execute(
+                    f"SELECT DISTINCT thread_id FROM thread_likes WHERE user_id = %s AND thread_id IN ({placeholders})",
+                    [current_user['user_id']] + thread_ids
                 )
-                liked_thread_ids = {row['thread_id'] for row in cursor.fetchall()}
+                liked_thread_ids = {row['thread_id'] for row in await cursor.fetchall()}
+
+            # 本页所有对话的前几条消息：一次窗口查询（按 thread 分区编号），而不是每个对话查一次
+            previews: Dict[str, List[Dict[str, Any]]] = {thread_id: [] for thread_id in thread_ids}
+            if thread_ids:
+                await cursor.execute(f"""
+                    SELECT thread_id, speaker, content FROM (
+                        SELECT thread_id, speaker, content, turn_id,
+                               ROW_NUMBER() OVER (PARTITION BY thread_id ORDER BY turn_id ASC, created_at ASC) AS rn
+                        FROM events
+                        WHERE thread_id IN ({placeholders})
+                    ) ranked
+                    WHERE rn <= %s
+                    ORDER BY thread_id, rn
+                """, thread_ids + [HALL_PREVIEW_EVENTS])
+                for e in await cursor.fetchall():
+                    previews[e['thread_id']].append({
+                        "author_id": e.get("agent_id", "user"),
+                        "author_name": e["speaker"],
+                        "content": e["content"],
+                    })
 
             # 为每个对话添加消息预览和点赞状态
             result = []
             for chat in chats:
-                events = _db_manager.get_thread_events(chat['id'])
-                messages_preview = [
-                    {"author_id": e.get("agent_id", "user"),
-                     "author_name": e["speaker"],
-                     "content": e["content"]}
-                    for e in events[:3]
-                ]
-
                 result.append({
                     "id": chat['id'],
                     "title": chat['title'],
@@ -2911,10 +3170,11 @@ async def get_public_chat_hall(
                     "like_count": chat['like_count'],
                     "comment_count": chat['comment_count'],
                     "is_liked": chat['id'] in liked_thread_ids,
-                    "messages_preview": messages_preview
+                    "messages_preview": previews.get(chat['id'], [])
                 })
 
-            return {"chats": result, "total": len(result)}
+            next_cursor = make_hall_cursor(chats[-1]) if len(chats) == limit else None
+            return {"chats": result, "total": len(result), "next_cursor": next_cursor}
 
     except Exception as e:
         print(f"[API] 获取公开对话大厅失败: {e}")
@@ -2990,12 +3250,12 @@ async def check_violation(request_data: CheckViolationRequest):
         }
 
     try:
-        # 确保Trie树已加载
-        if not _banned_words_trie._loaded:
-            load_banned_words_to_trie()
+        # 确保违禁词已加载
+        if not banned_words.loaded:
+            load_banned_words()
 
-        # 执行检测（返回所有违规词）
-        violations = _banned_words_trie.search_all(content)
+        # 执行检测（返回所有违规词，包括重叠的）
+        violations = banned_words.search_all(content)
 
         return {
             "has_violation": len(violations) > 0,
@@ -3055,6 +3315,10 @@ async def add_comment_api(
                 INSERT INTO comments (comment_id, thread_id, user_id, content, is_deleted, created_at)
                 VALUES (%s, %s, %s, %s, %s, %s)
             """, (comment_id, thread_id, current_user['user_id'], content, 0, created_at))
+            bump_thread_counter(cursor, thread_id, "comment_count", 1)
+            dashboard_stats.incr("comment_count")
+            dashboard_stats.mark_active(current_user['user_id'])
+            search_service.index_comment(comment_id, thread_id, current_user['user_id'], content, created_at=created_at)
 
             return {
                 "message": "评论成功",
@@ -3117,7 +3381,24 @@ async def get_admin_comments(
                 conditions.append("c.user_id = %s")
                 params.append(user_id)
 
-            if keyword:
+            # 关键词：索引就绪时用命中的评论 ID（按相关度取前 MAX_COMMENT_MATCHES 条）过滤并排序，
+            # 索引未就绪或关键词分词后为空时退回 LIKE
+            order_clause = "c.created_at DESC"
+            order_params = []
+            hit_ids = None
+            if keyword and search_service.ready:
+                hit_ids = search_service.matching_comment_ids(
+                    keyword, thread_id=thread_id, user_id=user_id, include_deleted=(status != 'normal'),
+                )
+            if hit_ids is not None:
+                if not hit_ids:
+                    return {"comments": [], "total": 0, "page": page, "page_size": page_size, "total_pages": 0}
+                id_placeholders = ','.join(['%s'] * len(hit_ids))
+                conditions.append(f"c.comment_id IN ({id_placeholders})")
+                params.extend(hit_ids)
+                order_clause = f"FIELD(c.comment_id, {id_placeholders})"
+                order_params = hit_ids
+            elif keyword:
                 conditions.append("c.content LIKE %s")
                 params.append(f"%{keyword}%")
 
@@ -3154,11 +3435,11 @@ async def get_admin_comments(
                 LEFT JOIN users u2 ON c.deleted_by = u2.user_id
                 LEFT JOIN threads t ON c.thread_id = t.thread_id
                 WHERE {where_clause}
-                ORDER BY c.created_at DESC
+                ORDER BY {order_clause}
                 LIMIT %s OFFSET %s
             """
 
-            cursor.execute(query, params + [page_size, offset])
+            cursor.execute(query, params + order_params + [page_size, offset])
             comments = cursor.fetchall()
 
             # 格式化结果
@@ -3207,9 +3488,13 @@ async def delete_comment_admin(
 
     try:
         with _db_manager.get_cursor() as cursor:
-            # 检查评论是否存在
-            cursor.execute("SELECT comment_id FROM comments WHERE comment_id = %s", (comment_id,))
-            if not cursor.fetchone():
+            # 检查评论是否存在（锁住该行，并发删除/恢复排队执行）
+            cursor.execute(
+                "SELECT comment_id, thread_id, is_deleted FROM comments WHERE comment_id = %s FOR UPDATE",
+                (comment_id,)
+            )
+            comment = cursor.fetchone()
+            if not comment:
                 raise HTTPException(status_code=404, detail="评论不存在")
 
             # 软删除
@@ -3221,6 +3506,10 @@ async def delete_comment_admin(
                     delete_reason = %s
                 WHERE comment_id = %s
             """, (current_user['user_id'], request_data.reason, comment_id))
+            # 行已锁住，读到的删除状态在本事务提交前不会被并发请求改变
+            if not comment['is_deleted']:
+                bump_thread_counter(cursor, comment['thread_id'], "comment_count", -1)
+            search_service.set_comment_deleted([comment_id], True)
 
             return {"message": "评论已删除"}
 
@@ -3250,7 +3539,7 @@ async def delete_comment_user(
         with _db_manager.get_cursor() as cursor:
             # 检查评论是否存在且属于当前用户
             cursor.execute(
-                "SELECT comment_id, user_id, is_deleted FROM comments WHERE comment_id = %s",
+                "SELECT comment_id, thread_id, user_id, is_deleted FROM comments WHERE comment_id = %s FOR UPDATE",
                 (comment_id,)
             )
             comment = cursor.fetchone()
@@ -3271,8 +3560,12 @@ async def delete_comment_user(
                     deleted_at = NOW(),
                     deleted_by = %s,
                     delete_reason = %s
-                WHERE comment_id = %s
+                WHERE comment_id = %s AND is_deleted = 0
             """, (current_user['user_id'], request_data.reason, comment_id))
+            # 只有确实从未删除变为删除时才减计数
+            if cursor.rowcount:
+                bump_thread_counter(cursor, comment['thread_id'], "comment_count", -1)
+            search_service.set_comment_deleted([comment_id], True)
 
             return {"message": "评论已删除"}
 
@@ -3298,7 +3591,7 @@ async def restore_comment(
         with _db_manager.get_cursor() as cursor:
             # 检查评论是否存在且已删除
             cursor.execute(
-                "SELECT comment_id, is_deleted FROM comments WHERE comment_id = %s",
+                "SELECT comment_id, thread_id, is_deleted FROM comments WHERE comment_id = %s FOR UPDATE",
                 (comment_id,)
             )
             comment = cursor.fetchone()
@@ -3314,8 +3607,12 @@ async def restore_comment(
                     deleted_at = NULL,
                     deleted_by = NULL,
                     delete_reason = NULL
-                WHERE comment_id = %s
+                WHERE comment_id = %s AND is_deleted = 1
             """, (comment_id,))
+            # 只有确实从删除变为未删除时才加计数
+            if cursor.rowcount:
+                bump_thread_counter(cursor, comment['thread_id'], "comment_count", 1)
+            search_service.set_comment_deleted([comment_id], False)
 
             return {"message": "评论已恢复"}
 
@@ -3341,31 +3638,51 @@ async def batch_comments_action(
         raise HTTPException(status_code=400, detail="无效的操作")
 
     try:
+        if not request_data.comment_ids:
+            return {"message": "没有需要处理的评论"}
+
         with _db_manager.get_cursor() as cursor:
+            placeholders = ','.join(['%s'] * len(request_data.comment_ids))
+            # 只处理状态确实会变化的评论，并按对话统计评论数的变化量
+            from_deleted = 1 if request_data.action == 'restore' else 0
+            cursor.execute(f"""
+                SELECT thread_id, COUNT(*) as count FROM comments
+                WHERE comment_id IN ({placeholders}) AND is_deleted = %s
+                GROUP BY thread_id
+                FOR UPDATE
+            """, request_data.comment_ids + [from_deleted])
+            changed = {row['thread_id']: row['count'] for row in cursor.fetchall()}
+
             if request_data.action == 'restore':
                 # 批量恢复
-                placeholders = ','.join(['%s'] * len(request_data.comment_ids))
                 cursor.execute(f"""
                     UPDATE comments
                     SET is_deleted = 0,
                         deleted_at = NULL,
                         deleted_by = NULL,
                         delete_reason = NULL
-                    WHERE comment_id IN ({placeholders})
+                    WHERE comment_id IN ({placeholders}) AND is_deleted = 1
                 """, request_data.comment_ids)
-                return {"message": f"已恢复 {cursor.rowcount} 条评论"}
+                count = cursor.rowcount
+                for thread_id, n in changed.items():
+                    bump_thread_counter(cursor, thread_id, "comment_count", n)
+                search_service.set_comment_deleted(request_data.comment_ids, False)
+                return {"message": f"已恢复 {count} 条评论"}
 
             elif request_data.action == 'delete':
                 # 批量删除
-                placeholders = ','.join(['%s'] * len(request_data.comment_ids))
                 cursor.execute(f"""
                     UPDATE comments
                     SET is_deleted = 1,
                         deleted_at = NOW(),
                         deleted_by = %s
-                    WHERE comment_id IN ({placeholders})
+                    WHERE comment_id IN ({placeholders}) AND is_deleted = 0
                 """, [current_user['user_id']] + request_data.comment_ids)
-                return {"message": f"已删除 {cursor.rowcount} 条评论"}
+                count = cursor.rowcount
+                for thread_id, n in changed.items():
+                    bump_thread_counter(cursor, thread_id, "comment_count", -n)
+                search_service.set_comment_deleted(request_data.comment_ids, True)
+                return {"message": f"已删除 {count} 条评论"}
 
     except Exception as e:
         print(f"[API] 批量操作失败: {e}")
@@ -3421,69 +3738,102 @@ async def get_comments_stats(
         raise HTTPException(status_code=500, detail="获取评论统计失败")
 
 
-@app.get("/api/admin/dashboard-stats")
-async def get_dashboard_stats(
+@app.get("/api/admin/llm-gateway")
+async def get_llm_gateway_stats(
     current_user: Dict[str, Any] = Depends(require_admin)
 ):
-    """
-    获取数据看板统计数据
-    """
+    """获取 LLM 网关状态（各服务商并发、排队、等待耗时，以及组织者链缓存命中率）"""
+    return {
+        "providers": llm_gateway.stats(),
+        "organizer_cache": organizer_cache.stats(),
+    }
+
+
+@app.get("/api/admin/db-pool")
+async def get_db_pool_stats(
+    current_user: Dict[str, Any] = Depends(require_admin)
+):
+    """获取数据库连接池状态（连接数、空闲数、借用等待耗时、超时次数）以及发言追加/写后日志状态"""
     if not _db_manager:
         raise HTTPException(status_code=503, detail="数据库未连接")
+    stats = _db_manager.pool_stats()
+    if hasattr(history_store, "append_stats"):
+        stats["appends"] = history_store.append_stats()
+    return stats
 
-    try:
-        with _db_manager.get_cursor() as cursor:
-            # 用户总数
-            cursor.execute("SELECT COUNT(*) as count FROM users WHERE role = 'user'")
-            user_count = cursor.fetchone()['count']
 
-            # 管理员总数（admin + super_admin）
-            cursor.execute("SELECT COUNT(*) as count FROM users WHERE role IN ('admin', 'super_admin')")
-            admin_count = cursor.fetchone()['count']
+@app.get("/api/admin/analysis")
+async def get_analysis_stats(
+    current_user: Dict[str, Any] = Depends(require_admin)
+):
+    """获取发言分析流水线状态（队列深度、在途数量、吞吐量、平均延迟、重试/失败次数）以及分词词典加载情况"""
+    stats = history_store.analysis_stats() if hasattr(history_store, "analysis_stats") else None
+    if stats is None:
+        stats = {"running": False, "mode": "inline"}
+    stats["segmenter"] = segmenter.stats()
+    return stats
+
+
+@app.get("/api/admin/search")
+async def admin_search(
+    q: str,
+    kind: Optional[str] = None,  # 'event'、'comment'、'topic'，默认全部
+    thread_id: Optional[str] = None,
+    user_id: Optional[str] = None,  # 评论者
+    include_deleted: bool = True,
+    page: int = 1,
+    page_size: int = 20,
+    current_user: Dict[str, Any] = Depends(require_admin)
+):
+    """全站全文检索（管理员）"""
+    if not q or not q.strip():
+        raise HTTPException(status_code=400, detail="搜索关键词不能为空")
+    kinds = [kind] if kind in ("event", "comment", "topic") else None
+    return await run_in_executor(lambda: search_service.search(
+        q.strip(), kinds=kinds, thread_id=thread_id, comment_user_id=user_id,
+        include_deleted=include_deleted, page=page, page_size=page_size
+    ))
+
+
+@app.get("/api/admin/search-index")
+async def get_search_index_stats(
+    current_user: Dict[str, Any] = Depends(require_admin)
+):
+    """获取全文索引状态（文档数、词项数、是否建立完成）"""
+    return search_service.stats()
 
-            # 总对话数量
-            cursor.execute("SELECT COUNT(*) as count FROM threads")
-            thread_count = cursor.fetchone()['count']
 
-            # 已发布对话数量
-            cursor.execute("SELECT COUNT(*) as count FROM thread_owners WHERE publication_status = 'published'")
-            published_count = cursor.fetchone()['count']
+@app.get("/api/admin/moderation")
+async def get_moderation_stats(
+    current_user: Dict[str, Any] = Depends(require_admin)
+):
+    """获取违禁词自动机与发言审核状态（词数、状态数、扫描发言数、命中发言数）"""
+    return {
+        "banned_words": banned_words.stats(),
+        "moderation": moderation.stats(),
+    }
 
-            # 违规对话数量
-            cursor.execute("SELECT COUNT(*) as count FROM thread_owners WHERE publication_status = 'rejected'")
-            violation_count = cursor.fetchone()['count']
 
-            # 评论总数
-            cursor.execute("SELECT COUNT(*) as count FROM comments")
-            comment_count = cursor.fetchone()['count']
+@app.get("/api/admin/session-cache")
+async def get_session_cache_stats(
+    current_user: Dict[str, Any] = Depends(require_admin)
+):
+    """获取热会话缓存状态（命中/未命中、懒加载次数、LRU 与空闲淘汰次数）"""
+    return sessions.stats()
 
-            # 今日活跃用户数（今日有评论、对话或登录的用户）
-            cursor.execute("""
-                SELECT COUNT(DISTINCT user_id) as count
-                FROM (
-                    SELECT user_id FROM threads WHERE DATE(created_at) = CURDATE()
-                    UNION
-                    SELECT user_id FROM comments WHERE DATE(created_at) = CURDATE()
-                    UNION
-                    SELECT user_id FROM user_sessions WHERE DATE(created_at) = CURDATE()
-                ) AS active_users
-                WHERE user_id IS NOT NULL AND user_id != ''
-            """)
-            active_users_today = cursor.fetchone()['count']
 
-            # 公开对话总数
-            public_chat_count = published_count
+@app.get("/api/admin/dashboard-stats")
+async def get_dashboard_stats(
+    current_user: Dict[str, Any] = Depends(require_admin)
+):
+    """
+    获取数据看板统计数据（内存计数，写路径增量维护，后台定期对账）
+    """
+    if not _db_manager:
+        raise HTTPException(status_code=503, detail="数据库未连接")
 
-            return {
-                "user_count": user_count,
-                "admin_count": admin_count,
-                "thread_count": thread_count,
-                "published_count": published_count,
-                "violation_count": violation_count,
-                "comment_count": comment_count,
-                "active_users_today": active_users_today,
-                "public_chat_count": public_chat_count,
-            }
+    try:
+        return await run_in_executor(dashboard_stats.snapshot)
 
     except Exception as e:
         print(f"[API] 获取数据看板统计失败: {e}")
@@ -3511,15 +3861,13 @@ async def get_top_public_chats(
                     t.topic as title,
                     u.username,
                     towner.publication_status,
-                    COUNT(tl.id) as like_count,
+                    towner.like_count,
                     towner.reviewed_at
-                FROM threads t
-                INNER JOIN thread_owners towner ON t.thread_id = towner.thread_id
+                FROM thread_owners towner
+                INNER JOIN threads t ON t.thread_id = towner.thread_id
                 LEFT JOIN users u ON towner.user_id = u.user_id
-                LEFT JOIN thread_likes tl ON t.thread_id = tl.thread_id
                 WHERE towner.publication_status = 'published'
-                GROUP BY t.thread_id, t.topic, u.username, towner.publication_status, towner.reviewed_at
-                ORDER BY like_count DESC, towner.reviewed_at DESC
+                ORDER BY towner.like_count DESC, towner.reviewed_at DESC
                 LIMIT %s
             """
 
@@ -3672,8 +4020,8 @@ async def create_banned_word(
                 VALUES (%s, %s, %s, %s, %s)
             """, (word, request_data.category, request_data.severity, 1, current_user['user_id']))
 
-            # 重新加载违禁词到Trie树，确保新添加的违禁词立即生效
-            reload_banned_words()
+            # 增量加入自动机，新添加的违禁词立即生效
+            banned_words.add(word, request_data.category, request_data.severity)
 
             return {
                 "message": "违禁词添加成功"
@@ -3702,7 +4050,8 @@ async def update_banned_word(
         with _db_manager.get_cursor() as cursor:
             # 检查是否存在
             cursor.execute("SELECT word FROM forbidden_words WHERE word_id = %s", (word_id,))
-            if not cursor.fetchone():
+            existing = cursor.fetchone()
+            if not existing:
                 raise HTTPException(status_code=404, detail="违禁词不存在")
 
             # 构建更新语句
@@ -3740,8 +4089,12 @@ async def update_banned_word(
             query = f"UPDATE forbidden_words SET {', '.join(updates)} WHERE word_id = %s"
             cursor.execute(query, params)
 
-            # 重新加载违禁词到Trie树，确保更新的违禁词立即生效
-            reload_banned_words()
+            # 按更新后的记录增量调整自动机，确保更新的违禁词立即生效
+            cursor.execute("SELECT word, category, severity, is_active FROM forbidden_words WHERE word_id = %s", (word_id,))
+            updated = cursor.fetchone()
+            banned_words.remove(existing['word'])
+            if updated and updated['is_active']:
+                banned_words.add(updated['word'], updated['category'], updated['severity'])
 
             return {"message": "违禁词更新成功"}
 
@@ -3767,14 +4120,15 @@ async def delete_banned_word(
         with _db_manager.get_cursor() as cursor:
             # 检查是否存在
             cursor.execute("SELECT word FROM forbidden_words WHERE word_id = %s", (word_id,))
-            if not cursor.fetchone():
+            existing = cursor.fetchone()
+            if not existing:
                 raise HTTPException(status_code=404, detail="违禁词不存在")
 
             # 删除
             cursor.execute("DELETE FROM forbidden_words WHERE word_id = %s", (word_id,))
 
-            # 重新加载违禁词到Trie树，确保删除的违禁词立即生效
-            reload_banned_words()
+            # 从自动机移除，确保删除的违禁词立即生效
+            banned_words.remove(existing['word'])
 
             return {"message": "违禁词已删除"}
 
@@ -3,14 +3,19 @@ Memory模块
 """
 
 from .history_store import history_store, events_to_messages
-from .state_store import init_state, set_agenda, apply_patch, advance_turn, DiscussionState, load_state_from_db
+from .context_builder import context_builder
+from .summary_memory import summary_memory
+from .state_store import init_state, set_agenda, apply_patch, persist_state, advance_turn, DiscussionState, load_state_from_db
 
 __all__ = [
     'history_store',
     'events_to_messages',
+    'context_builder',
+    'summary_memory',
     'init_state',
     'set_agenda',
     'apply_patch',
+    'persist_state',
     'advance_turn',
     'DiscussionState',
     'load_state_from_db'
@@ -0,0 +1,277 @@
+# memory/context_builder.py
+from __future__ import annotations
+
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage, HumanMessage
+
+from .history_store import history_store, event_to_message, _get_field
+
+
+# 各条链的 prompt token 预算（历史发言 + 指令/任务卡片，不含固定的系统提示）
+PROMPT_BUDGETS: Dict[str, int] = {
+    "opening": 1500,
+    "route": 2500,
+    "update": 2500,
+    "update_route": 3000,
+    "summary": 4000,
+    "final": 4000,
+    "companion": 3000,
+}
+DEFAULT_BUDGET = 2500
+# 每个 thread 在内存里最多保留的近期发言条数（预算再大也不会超过它）
+DEFAULT_MAX_EVENTS = 40
+# 单条发言转换时截断的字数（与 events_to_messages 的默认值一致）
+DEFAULT_MAX_CONTENT_CHARS = 600
+
+_CJK_RE = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算 token 数（没有引入各家 tokenizer）：
+    中文及全角符号按 1 字 1 token，其余按 4 字符 1 token，外加每条消息的固定开销。
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4 + 4
+
+
+@dataclass
+class _ThreadWindow:
+    """单个 thread 的近期发言缓存（按 turn_id 升序）。"""
+    events: List[Dict[str, Any]] = field(default_factory=list)
+    last_turn: int = 0
+
+
+@dataclass
+class _PromptCounters:
+    calls: int = 0
+    total_tokens: int = 0
+    last_tokens: int = 0
+    max_tokens: int = 0
+    last_events: int = 0
+
+    def add(self, tokens: int, events: int):
+        self.calls += 1
+        self.total_tokens += tokens
+        self.last_tokens = tokens
+        self.max_tokens = max(self.max_tokens, tokens)
+        self.last_events = events
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "last_tokens": self.last_tokens,
+            "avg_tokens": round(self.total_tokens / self.calls, 1) if self.calls else 0.0,
+            "max_tokens": self.max_tokens,
+            "last_events": self.last_events,
+        }
+
+
+class ContextBuilder:
+    """
+    增量上下文构建器：
+    - 每个 thread 在内存里维护近期发言，新发言通过 history_store 的追加回调增量进入，
+      同一轮里 tail(6/8/12/20) 不再反复查库
+    - 发言 → LangChain message 的转换结果按 event_id 缓存，只转换新发言
+    - messages() 按 token 预算从最新往前装配历史，而不是固定条数
+    - 记录每次调用的 prompt token 数（按 thread、按链）
+    """
+
+    def __init__(
+        self,
+        store: Any,
+        max_events: int = DEFAULT_MAX_EVENTS,
+        max_content_chars: int = DEFAULT_MAX_CONTENT_CHARS,
+        max_cached_messages: int = 4096,
+    ):
+        self._store = store
+        self.max_events = max_events
+        self.max_content_chars = max_content_chars
+        self.max_cached_messages = max_cached_messages
+        self._lock = threading.RLock()
+        self._threads: Dict[str, _ThreadWindow] = {}
+        self._messages: "OrderedDict[str, Tuple[BaseMessage, int]]" = OrderedDict()
+        self._prompt_stats: Dict[str, Dict[str, _PromptCounters]] = {}
+        self._cache_hits = 0
+        self._cache_misses = 0
+
+        if hasattr(store, "add_append_listener"):
+            store.add_append_listener(self._on_append)
+
+    # ---------- 发言窗口 ----------
+    def _window(self, thread_id: str) -> _ThreadWindow:
+        w = self._threads.get(thread_id)
+        if w is None:
+            # 冷启动：只查一次库
+            try:
+                events = list(self._store.tail(thread_id, self.max_events) or [])
+            except Exception as e:
+                pending = getattr(e, "pending", None)
+                if pending is None:
+                    raise
+                # 数据库暂时读不到（HistoryUnavailableError）：这次只用未写库的发言，不缓存窗口
+                events = list(pending)[-self.max_events:]
+                return _ThreadWindow(events=events, last_turn=max((int(e.get("turn_id") or 0) for e in events), default=0))
+            w = _ThreadWindow(events=events, last_turn=max((int(e.get("turn_id") or 0) for e in events), default=0))
+            self._threads[thread_id] = w
+        return w
+
+    def _on_append(self, thread_id: str, ev: Dict[str, Any]):
+        """history_store 追加发言后的回调：只把新发言放进已加载的窗口。"""
+        with self._lock:
+            w = self._threads.get(thread_id)
+            if w is None:
+                return  # 还没被读过，等第一次读取时再加载
+            turn_id = int(ev.get("turn_id") or 0)
+            if w.last_turn and turn_id > w.last_turn + 1 and hasattr(self._store, "since"):
+                # 中间有缺口（例如其它进程写入），补齐；补不齐时丢掉窗口，下次读取重新加载
+                try:
+                    gap = self._store.since(thread_id, w.last_turn)
+                except Exception as e:
+                    print(f"[上下文] 补齐发言缺口失败，窗口将重新加载: {thread_id}, 错误: {e}")
+                    self._threads.pop(thread_id, None)
+                    return
+                for missing in gap:
+                    if int(missing.get("turn_id") or 0) < turn_id:
+                        w.events.append(missing)
+            w.events.append(ev)
+            w.last_turn = max(w.last_turn, turn_id)
+            if len(w.events) > self.max_events:
+                del w.events[:-self.max_events]
+
+    def tail(self, thread_id: str, n: int = 10) -> List[Dict[str, Any]]:
+        """与 history_store.tail 同签名，但从内存窗口读取。"""
+        if n <= 0:
+            return []
+        with self._lock:
+            w = self._window(thread_id)
+            if n > len(w.events) and len(w.events) >= self.max_events:
+                # 需要的比窗口还多：直接查库（查不到时退回窗口里已有的部分）
+                try:
+                    return self._store.tail(thread_id, n)
+                except Exception as e:
+                    if getattr(e, "pending", None) is None:
+                        raise
+                    return list(w.events[-n:])
+            return list(w.events[-n:])
+
+    def window(self, thread_id: str, chain: str, max_events: Optional[int] = None) -> List[Dict[str, Any]]:
+        """按该链的 token 预算，从最新往前取尽可能多的发言（至少 1 条）。"""
+        budget = PROMPT_BUDGETS.get(chain, DEFAULT_BUDGET)
+        events = self.tail(thread_id, max_events or self.max_events)
+        picked, _ = self._fit(events, budget)
+        return picked
+
+    def forget(self, thread_id: str):
+        with self._lock:
+            self._threads.pop(thread_id, None)
+            self._prompt_stats.pop(thread_id, None)
+
+    # ---------- 消息转换 ----------
+    def _message(self, ev: Any) -> Tuple[BaseMessage, int]:
+        event_id = _get_field(ev, "event_id", None)
+        if event_id:
+            with self._lock:
+                hit = self._messages.get(event_id)
+                if hit is not None:
+                    self._messages.move_to_end(event_id)
+                    self._cache_hits += 1
+                    return hit
+        msg = event_to_message(ev, self.max_content_chars)
+        entry = (msg, estimate_tokens(str(msg.content)))
+        if event_id:
+            with self._lock:
+                self._cache_misses += 1
+                self._messages[event_id] = entry
+                while len(self._messages) > self.max_cached_messages:
+                    self._messages.popitem(last=False)
+        return entry
+
+    def _fit(self, events: Sequence[Any], budget: int) -> Tuple[List[Any], List[Tuple[BaseMessage, int]]]:
+        """从最新往前装，直到超出预算；最新一条总会保留。"""
+        picked: List[Any] = []
+        entries: List[Tuple[BaseMessage, int]] = []
+        used = 0
+        for ev in reversed(list(events)):
+            entry = self._message(ev)
+            if picked and used + entry[1] > budget:
+                break
+            picked.append(ev)
+            entries.append(entry)
+            used += entry[1]
+        picked.reverse()
+        entries.reverse()
+        return picked, entries
+
+    def messages(
+        self,
+        events: Sequence[Any],
+        chain: str,
+        thread_id: Optional[str] = None,
+        fixed_parts: Sequence[str] = (),
+        token_budget: Optional[int] = None,
+        summary: str = "",
+        covered_turn: int = 0,
+    ) -> List[BaseMessage]:
+        """
+        替代 events_to_messages：按预算装配历史消息并记录本次 prompt token 数。
+
+        Args:
+            events: 候选发言（升序）
+            chain: 链名，决定默认预算并用于统计
+            thread_id: 用于按会话统计（可选）
+            fixed_parts: 本次 prompt 中的指令/任务卡片等固定文本，先从预算中扣除
+            token_budget: 覆盖默认预算
+            summary: 更早讨论的滚动摘要（summary_memory.render），放在历史最前面并计入预算
+            covered_turn: 摘要已覆盖到的 turn_id，这之前的原文不再重复装配（最新一条除外）
+        """
+        budget = token_budget or PROMPT_BUDGETS.get(chain, DEFAULT_BUDGET)
+        fixed_tokens = sum(estimate_tokens(p) for p in fixed_parts if p)
+
+        head: List[BaseMessage] = []
+        if summary:
+            summary_text = f"【此前讨论摘要】\n{summary}"
+            fixed_tokens += estimate_tokens(summary_text)
+            head.append(HumanMessage(content=summary_text))
+            if covered_turn:
+                events = list(events)
+                events = [
+                    ev for ev in events[:-1]
+                    if int(_get_field(ev, "turn_id", 0) or 0) > covered_turn
+                ] + events[-1:]
+
+        picked, entries = self._fit(events, max(0, budget - fixed_tokens))
+        prompt_tokens = fixed_tokens + sum(t for _, t in entries)
+
+        with self._lock:
+            per_thread = self._prompt_stats.setdefault(thread_id or "_global", {})
+            per_thread.setdefault(chain, _PromptCounters()).add(prompt_tokens, len(picked))
+        return head + [m for m, _ in entries]
+
+    def stats(self, thread_id: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = {
+                "message_cache": {
+                    "entries": len(self._messages),
+                    "hits": self._cache_hits,
+                    "misses": self._cache_misses,
+                },
+                "threads": len(self._threads),
+            }
+            if thread_id is not None:
+                out["prompt_tokens"] = {
+                    chain: c.as_dict() for chain, c in self._prompt_stats.get(thread_id, {}).items()
+                }
+            return out
+
+
+# 全局实例：server / 各智能体共用
+context_builder = ContextBuilder(history_store)
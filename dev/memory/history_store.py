@@ -16,9 +16,10 @@ _use_persistent = False
 
 if USE_PERSISTENT_STORAGE:
     try:
-        from dev.mysql.persistent_store import PersistentHistoryStore
-        # 尝试创建持久化存储实例（会测试数据库连接）
-        _history_store_instance = PersistentHistoryStore()
+        # 复用 persistent_store 的全局实例（会测试数据库连接）：
+        # 两个实例会各自分配 turn_id 并共用同一个写后日志文件
+        from dev.mysql.persistent_store import persistent_history_store
+        _history_store_instance = persistent_history_store
         # 测试连接是否正常
         if _history_store_instance.db_manager.connection:
             _use_persistent = True
@@ -48,6 +49,11 @@ if not _use_persistent:
         def __init__(self):
             self._events: Dict[str, List[Dict[str, Any]]] = {}
             self._turn: Dict[str, int] = {}
+            self._append_listeners: List[Any] = []
+
+        def add_append_listener(self, fn):
+            """注册发言追加回调 fn(thread_id, event)。"""
+            self._append_listeners.append(fn)
 
         def _next_turn(self, thread_id: str) -> int:
             self._turn[thread_id] = self._turn.get(thread_id, 0) + 1
@@ -59,28 +65,40 @@ if not _use_persistent:
             speaker: str,
             content: str,
             tags: Optional[Sequence[str]] = None,
+            event_id: Optional[str] = None,
         ) -> Dict[str, Any]:
             ev = {
-                "event_id": uuid.uuid4().hex,
+                "event_id": event_id or uuid.uuid4().hex,
                 "speaker": speaker,
                 "content": (content or "").strip(),
                 "turn_id": self._next_turn(thread_id),
                 "tags": list(tags) if tags else [],
             }
             self._events.setdefault(thread_id, []).append(ev)
+            for fn in self._append_listeners:
+                try:
+                    fn(thread_id, ev)
+                except Exception as e:
+                    print(f"[内存存储] 追加回调失败: {e}")
             return ev
 
         # 便捷方法：更语义化
-        def record_user(self, thread_id: str, content: str, tags: Optional[Sequence[str]] = None, topic: Optional[str] = None):
-            return self.append(thread_id, "用户", content, tags)
+        def record_user(self, thread_id: str, content: str, tags: Optional[Sequence[str]] = None, topic: Optional[str] = None,
+                        event_id: Optional[str] = None):
+            return self.append(thread_id, "用户", content, tags, event_id)
 
-        def record_speaker(self, thread_id: str, speaker: str, content: str, tags: Optional[Sequence[str]] = None, topic: Optional[str] = None):
-            return self.append(thread_id, speaker, content, tags)
+        def record_speaker(self, thread_id: str, speaker: str, content: str, tags: Optional[Sequence[str]] = None, topic: Optional[str] = None,
+                           event_id: Optional[str] = None):
+            return self.append(thread_id, speaker, content, tags, event_id)
 
         def tail(self, thread_id: str, n: int = 10) -> List[Dict[str, Any]]:
             evs = self._events.get(thread_id, [])
             return evs[-n:] if n > 0 else []
 
+        def since(self, thread_id: str, after_turn: int) -> List[Dict[str, Any]]:
+            """turn_id 大于 after_turn 的发言（升序）。"""
+            return [ev for ev in self._events.get(thread_id, []) if ev["turn_id"] > after_turn]
+
         def all(self, thread_id: str) -> List[Dict[str, Any]]:
             return list(self._events.get(thread_id, []))
 
@@ -105,6 +123,27 @@ def _get_field(ev: Any, key: str, default: Any = None) -> Any:
     return getattr(ev, key, default)
 
 
+def event_to_message(
+    ev: Any,
+    max_content_chars: Optional[int] = 600,
+    include_tags: bool = False,
+) -> BaseMessage:
+    """单条公开发言 → LangChain message（规则见 events_to_messages）。"""
+    speaker = str(_get_field(ev, "speaker", "未知"))
+    content = str(_get_field(ev, "content", "")).strip()
+    tags = _get_field(ev, "tags", []) or []
+
+    if max_content_chars and len(content) > max_content_chars:
+        content = content[:max_content_chars] + "…"
+
+    if include_tags and tags:
+        content = f"{content}\n（tags: {', '.join(map(str, tags))}）"
+
+    if speaker == "用户":
+        return HumanMessage(content=f"【用户】{content}")
+    return AIMessage(content=f"{content}")
+
+
 def events_to_messages(
     events: Sequence[Any],
     max_content_chars: Optional[int] = 600,
@@ -118,22 +157,4 @@ def events_to_messages(
 
     这样模型看到的是“讨论对话”，而不是“题目”。
     """
-    messages: List[BaseMessage] = []
-
-    for ev in events:
-        speaker = str(_get_field(ev, "speaker", "未知"))
-        content = str(_get_field(ev, "content", "")).strip()
-        tags = _get_field(ev, "tags", []) or []
-
-        if max_content_chars and len(content) > max_content_chars:
-            content = content[:max_content_chars] + "…"
-
-        if include_tags and tags:
-            content = f"{content}\n（tags: {', '.join(map(str, tags))}）"
-
-        if speaker == "用户":
-            messages.append(HumanMessage(content=f"【用户】{content}"))
-        else:
-            messages.append(AIMessage(content=f"{content}"))
-
-    return messages
+    return [event_to_message(ev, max_content_chars, include_tags) for ev in events]
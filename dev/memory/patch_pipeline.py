@@ -0,0 +1,181 @@
+# memory/patch_pipeline.py
+from __future__ import annotations
+
+import asyncio
+import copy
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from .state_store import apply_patch, ensure_item_ids, persist_state
+
+
+# 同一 thread 内，在这个时间窗口里陆续完成的发言会被合并成一次 update 调用
+DEFAULT_COALESCE_WINDOW = 0.3
+# 单次 update 至少参考的公开发言条数（与原来 tail(12) 保持一致）
+DEFAULT_TAIL_N = 12
+
+
+@dataclass
+class _ThreadPatchQueue:
+    """单个 thread 的待处理 patch 请求。"""
+    pending_turns: List[int] = field(default_factory=list)
+    worker: Optional[asyncio.Task] = None
+    compactor: Optional[asyncio.Task] = None   # 滚动摘要压缩任务
+    applied_turn: int = 0      # 已经应用到 state 的最新 turn_id
+    submitted_turn: int = 0    # 已提交（可能尚未应用）的最新 turn_id
+    idle: Optional[asyncio.Event] = None
+
+
+class StatePatchPipeline:
+    """
+    后台状态更新流水线：把 organizer.update_from_new_public_event() 挪出响应关键路径。
+
+    - submit()：发言落库后立即返回，真正的 update 调用在后台跑
+    - 同一 thread 只有一个 worker，patch 严格按 turn 顺序应用
+    - 窗口期内陆续完成的多轮发言合并成一次 update（tail 覆盖所有待处理的发言）
+    - 路由直接读 state（即已应用的最新版本），不需要等待流水线
+    - patch 在事件循环线程上应用（路由等协程也在这个线程上读 state，不会读到改了一半的状态）；
+      落库用 state 的副本在线程池里做，完成后把落库快照和版本号写回
+    - 每次 patch 应用后顺带触发滚动摘要压缩（SummaryMemory，独立任务，不阻塞下一次 update）
+    - wait_idle()：收尾总结前等待流水线清空，总结基于完整的共识/分歧
+    """
+
+    def __init__(
+        self,
+        run_sync: Callable[..., "asyncio.Future"],
+        coalesce_window: float = DEFAULT_COALESCE_WINDOW,
+        tail_n: int = DEFAULT_TAIL_N,
+        memory: Optional[Any] = None,
+    ):
+        """
+        Args:
+            run_sync: 在线程池中执行同步函数的方法，签名同 loop.run_in_executor(None, fn)
+                      （server.py 传入绑定了 executor 的版本）
+            coalesce_window: 合并窗口（秒）
+            tail_n: 单次 update 参考的最少发言条数
+            memory: SummaryMemory（可选），提供 acompact(state, organizer, run_sync)
+        """
+        self._run_sync = run_sync
+        self.coalesce_window = coalesce_window
+        self.tail_n = tail_n
+        self.memory = memory
+        self._queues: Dict[str, _ThreadPatchQueue] = {}
+        self._stats = {
+            "submitted": 0,
+            "update_calls": 0,
+            "coalesced": 0,
+            "failed": 0,
+            "total_lag_ms": 0.0,
+        }
+
+    def _queue(self, thread_id: str) -> _ThreadPatchQueue:
+        q = self._queues.get(thread_id)
+        if q is None:
+            q = _ThreadPatchQueue(idle=asyncio.Event())
+            q.idle.set()
+            self._queues[thread_id] = q
+        return q
+
+    def submit(self, state: Any, organizer: Any, tail_fn: Callable[[str, int], List[dict]]):
+        """
+        提交一次状态更新（在记录发言、advance_turn 之后调用）。
+
+        Args:
+            state: DiscussionState
+            organizer: OrganizerAgent
+            tail_fn: 读取公开发言的函数，签名同 history_store.tail(thread_id, n)
+        """
+        q = self._queue(state.thread_id)
+        turn_id = int(getattr(state, "turn_id", 0))
+        q.pending_turns.append(turn_id)
+        q.submitted_turn = max(q.submitted_turn, turn_id)
+        q.idle.clear()
+        self._stats["submitted"] += 1
+
+        if q.worker is None or q.worker.done():
+            q.worker = asyncio.create_task(self._drain(state, organizer, tail_fn, q))
+
+    async def _drain(self, state: Any, organizer: Any, tail_fn, q: _ThreadPatchQueue):
+        """按顺序消费某个 thread 的待处理请求，窗口期内的请求合并处理。"""
+        try:
+            while q.pending_turns:
+                # 等一个合并窗口，让接近同时完成的发言一起处理
+                await asyncio.sleep(self.coalesce_window)
+
+                batch = q.pending_turns
+                q.pending_turns = []
+                started = time.perf_counter()
+
+                # 合并后的 tail 要覆盖批内所有发言
+                n = max(self.tail_n, self.tail_n + len(batch) - 1)
+                try:
+                    tail = await self._run_sync(lambda: tail_fn(state.thread_id, n))
+                    # LLM 调用走异步接口（经网关排队），不占线程池；
+                    # 最新发言来自学伴时，状态更新与下一轮路由合并成一次调用
+                    if getattr(organizer, "batch_update_route", False) and state.last_speaker != "用户":
+                        patch = await organizer.aupdate_and_route(state, tail)
+                    else:
+                        patch = await organizer.aupdate_from_new_public_event(state, tail)
+                    apply_patch(state, patch, persist=False)
+                    await self._persist(state)
+                    q.applied_turn = max(batch)
+                    self._stats["update_calls"] += 1
+                    self._stats["coalesced"] += len(batch) - 1
+                    self._stats["total_lag_ms"] += (time.perf_counter() - started) * 1000
+                    if len(batch) > 1:
+                        print(f"[状态流水线] {state.thread_id}: 合并 {len(batch)} 轮发言为一次更新")
+                    if self.memory is not None and (q.compactor is None or q.compactor.done()):
+                        q.compactor = asyncio.create_task(self.memory.acompact(state, organizer, self._run_sync))
+                except Exception as e:
+                    self._stats["failed"] += 1
+                    print(f"[状态流水线] 状态更新失败: {state.thread_id}, 错误: {e}")
+        finally:
+            q.idle.set()
+
+    async def _persist(self, state: Any):
+        """在线程池里保存 state 的副本；线程池只读写副本，原 state 只在事件循环线程上修改。"""
+        # 新议程项的 item_id 先在原 state 上补好，否则每次保存副本都会拿到新 id（删了再插）
+        ensure_item_ids(state)
+        snapshot = copy.deepcopy(state)
+        await self._run_sync(lambda: persist_state(snapshot))
+        if snapshot.version != getattr(state, "version", 0):
+            state.version = snapshot.version
+            state._persisted = snapshot._persisted
+
+    def state_version(self, thread_id: str) -> int:
+        """返回已应用到 state 的最新 turn_id（路由读到的就是这个版本）。"""
+        q = self._queues.get(thread_id)
+        return q.applied_turn if q else 0
+
+    def lag(self, thread_id: str) -> int:
+        """已提交但尚未应用的轮数。"""
+        q = self._queues.get(thread_id)
+        return max(0, q.submitted_turn - q.applied_turn) if q else 0
+
+    async def wait_idle(self, thread_id: str, timeout: Optional[float] = None) -> bool:
+        """等待某个 thread 的流水线清空（例如收尾总结前需要完整状态）。"""
+        q = self._queues.get(thread_id)
+        if q is None:
+            return True
+        try:
+            await asyncio.wait_for(q.idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def forget(self, thread_id: str):
+        """删除会话时清理队列。"""
+        q = self._queues.pop(thread_id, None)
+        if q and q.worker and not q.worker.done():
+            q.worker.cancel()
+        if q and q.compactor and not q.compactor.done():
+            q.compactor.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        calls = self._stats["update_calls"]
+        return {
+            **self._stats,
+            "avg_lag_ms": round(self._stats["total_lag_ms"] / calls, 1) if calls else 0.0,
+            "threads": len(self._queues),
+        }
@@ -0,0 +1,220 @@
+# memory/session_cache.py
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, Optional
+
+
+# 内存里最多保留的会话数
+DEFAULT_MAX_SESSIONS = 200
+# 所有会话消息总数上限（粗略的内存预算；0 表示不限制）
+DEFAULT_MAX_MESSAGES = 20000
+# 空闲超过这么久（秒）的会话在清理时被移出内存
+DEFAULT_IDLE_TTL = 1800
+
+
+class SessionCache:
+    """
+    热会话缓存（替代 server.py 里不回收的全局 sessions dict）：
+    - 按最近访问顺序（LRU）保留会话，超过会话数或消息总数预算时淘汰最久未访问的
+    - 空闲超过 idle_ttl 的会话由 evict_idle() 移出内存（服务端定期调用）
+    - get_or_load() 未命中时调用 loader 从数据库恢复（懒加载），同一会话并发访问只加载一次
+    - can_evict(chat_id, session) 返回 False 的会话不会被淘汰（例如有 WebSocket 连接或状态更新未完成）
+    - on_evict(chat_id, session) 在淘汰后调用，用于清理各模块里按 thread 缓存的数据
+
+    用法与 dict 一致（sessions[chat_id] / in / get / items / del），
+    只有 __getitem__、get、get_or_load 会刷新访问顺序；遍历不会。
+    游客会话不在数据库里，被淘汰后无法恢复。
+    """
+
+    def __init__(
+        self,
+        loader: Optional[Callable[[str], bool]] = None,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        max_messages: int = DEFAULT_MAX_MESSAGES,
+        idle_ttl: float = DEFAULT_IDLE_TTL,
+        can_evict: Optional[Callable[[str, Dict[str, Any]], bool]] = None,
+        on_evict: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+    ):
+        """
+        Args:
+            loader: loader(chat_id) 从数据库加载会话并写入本缓存，返回是否成功
+            max_sessions: 最多保留的会话数
+            max_messages: 所有会话 messages 总条数上限（0 表示不限制）
+            idle_ttl: 空闲淘汰时间（秒）
+            can_evict: 判断会话当前能否淘汰
+            on_evict: 淘汰后的回调
+        """
+        self.loader = loader
+        self.max_sessions = max(1, max_sessions)
+        self.max_messages = max(0, max_messages)
+        self.idle_ttl = idle_ttl
+        self.can_evict = can_evict
+        self.on_evict = on_evict
+        self._data: "OrderedDict[str, tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._loading: Dict[str, threading.Lock] = {}
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "loads": 0,
+            "load_failures": 0,
+            "evicted_lru": 0,
+            "evicted_idle": 0,
+        }
+
+    # ---------- dict 接口 ----------
+    def __contains__(self, chat_id: object) -> bool:
+        with self._lock:
+            return chat_id in self._data
+
+    def __getitem__(self, chat_id: str) -> Dict[str, Any]:
+        with self._lock:
+            session, _ = self._data[chat_id]
+            self._touch(chat_id, session)
+            return session
+
+    def __setitem__(self, chat_id: str, session: Dict[str, Any]):
+        with self._lock:
+            self._data[chat_id] = (session, time.monotonic())
+            self._data.move_to_end(chat_id)
+            self._enforce(keep=chat_id)
+
+    def __delitem__(self, chat_id: str):
+        with self._lock:
+            del self._data[chat_id]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def get(self, chat_id: str, default: Any = None) -> Any:
+        with self._lock:
+            hit = self._data.get(chat_id)
+            if hit is None:
+                return default
+            self._touch(chat_id, hit[0])
+            return hit[0]
+
+    def pop(self, chat_id: str, default: Any = None) -> Any:
+        with self._lock:
+            hit = self._data.pop(chat_id, None)
+            return hit[0] if hit is not None else default
+
+    def keys(self):
+        with self._lock:
+            return list(self._data.keys())
+
+    def values(self):
+        with self._lock:
+            return [s for s, _ in self._data.values()]
+
+    def items(self):
+        with self._lock:
+            return [(k, s) for k, (s, _) in self._data.items()]
+
+    # ---------- 懒加载 ----------
+    def get_or_load(self, chat_id: str) -> Optional[Dict[str, Any]]:
+        """命中直接返回；未命中时调用 loader 从数据库恢复，失败返回 None。"""
+        session = self.get(chat_id)
+        if session is not None:
+            self._stats["hits"] += 1
+            return session
+        self._stats["misses"] += 1
+        if self.loader is None:
+            return None
+
+        with self._lock:
+            load_lock = self._loading.setdefault(chat_id, threading.Lock())
+        with load_lock:
+            # 等锁期间可能已由其它请求加载完成
+            session = self.get(chat_id)
+            if session is None:
+                ok = False
+                try:
+                    ok = bool(self.loader(chat_id))
+                except Exception as e:
+                    print(f"[会话缓存] 加载会话失败: {chat_id}, 错误: {e}")
+                self._stats["loads" if ok else "load_failures"] += 1
+                session = self.get(chat_id) if ok else None
+        with self._lock:
+            self._loading.pop(chat_id, None)
+        return session
+
+    # ---------- 淘汰 ----------
+    def _touch(self, chat_id: str, session: Dict[str, Any]):
+        self._data[chat_id] = (session, time.monotonic())
+        self._data.move_to_end(chat_id)
+
+    def _evictable(self, chat_id: str, session: Dict[str, Any]) -> bool:
+        if self.can_evict is None:
+            return True
+        try:
+            return bool(self.can_evict(chat_id, session))
+        except Exception:
+            return False
+
+    def _message_count(self) -> int:
+        return sum(len(s.get("messages") or ()) for s, _ in self._data.values())
+
+    def _enforce(self, keep: Optional[str] = None):
+        """超出会话数或消息预算时，从最久未访问的开始淘汰（跳过不能淘汰的和刚写入的）。"""
+        over_messages = self.max_messages and self._message_count() > self.max_messages
+        if len(self._data) <= self.max_sessions and not over_messages:
+            return
+        evicted = []
+        for chat_id, (session, _) in list(self._data.items()):
+            if len(self._data) <= self.max_sessions and not over_messages:
+                break
+            if chat_id == keep or not self._evictable(chat_id, session):
+                continue
+            del self._data[chat_id]
+            evicted.append((chat_id, session))
+            if over_messages:
+                over_messages = self._message_count() > self.max_messages
+        self._stats["evicted_lru"] += len(evicted)
+        self._after_evict(evicted)
+
+    def evict_idle(self) -> int:
+        """淘汰空闲超过 idle_ttl 的会话，返回淘汰数。"""
+        deadline = time.monotonic() - self.idle_ttl
+        evicted = []
+        with self._lock:
+            for chat_id, (session, last_access) in list(self._data.items()):
+                # 按访问顺序排列，遇到第一个未过期的就可以停
+                if last_access > deadline:
+                    break
+                if self._evictable(chat_id, session):
+                    del self._data[chat_id]
+                    evicted.append((chat_id, session))
+            self._stats["evicted_idle"] += len(evicted)
+        self._after_evict(evicted)
+        return len(evicted)
+
+    def _after_evict(self, evicted):
+        if not evicted:
+            return
+        print(f"[会话缓存] 移出内存 {len(evicted)} 个会话，剩余 {len(self._data)} 个")
+        if self.on_evict is None:
+            return
+        for chat_id, session in evicted:
+            try:
+                self.on_evict(chat_id, session)
+            except Exception as e:
+                print(f"[会话缓存] 淘汰回调失败: {chat_id}, 错误: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "size": len(self._data),
+                "max_sessions": self.max_sessions,
+                "messages": self._message_count(),
+                "max_messages": self.max_messages,
+                "hit_rate": round(self._stats["hits"] / lookups, 3) if lookups else 0.0,
+            }
@@ -42,11 +42,99 @@ class DiscussionState:
         "repetitive": 0,
     })
 
+    # 分层滚动摘要（见 summary_memory.py）：每段 dict 字段 level/from_turn/to_turn/content
+    summaries: List[Dict[str, Any]] = field(default_factory=list)
+    summarized_turn: int = 0  # 已压缩进摘要的最新 turn_id
+
+    # 持久化版本：每次把变更写入数据库时 +1（threads.state_version）
+    version: int = 0
+    # 上次落库时的快照（见 state_changes / mark_persisted），只在内存里使用
+    _persisted: Optional[Dict[str, Any]] = field(default=None, repr=False, compare=False)
+
 
 def init_state(thread_id: str, topic: str) -> DiscussionState:
     return DiscussionState(thread_id=thread_id, topic=topic)
 
 
+# 落库的标量字段（threads 表）
+_PERSISTED_SCALARS = ("topic", "phase", "turn_id", "last_speaker", "last_user_interjection")
+# 只追加的列表字段（各自一张表）
+_PERSISTED_LISTS = ("consensus", "disagreements", "open_questions")
+
+
+def _agenda_row(it: Dict[str, Any]) -> tuple:
+    return (it.get("question", ""), it.get("priority", 50), it.get("status", "open"), it.get("created_by", "unknown"))
+
+
+def ensure_item_ids(state: DiscussionState):
+    """没有 item_id 的议程项补一个，之后的保存才能按 item_id 对比（要在原 state 上补，不能只补在副本上）。"""
+    for it in state.agenda:
+        if not it.get("item_id"):
+            it["item_id"] = uuid.uuid4().hex[:10]
+
+
+def state_changes(state: DiscussionState) -> Dict[str, Any]:
+    """
+    与上次落库的快照比较，返回需要写入的变更（没有变更时返回空 dict）：
+      threads: 标量字段有变化时为 True
+      agenda_upsert / agenda_delete: 新增或修改的议程项、被移除的 item_id
+      consensus / disagreements / open_questions: 新增的条目
+      style_health: 计数有变化的指标
+    列表字段按“只追加”处理：正常情况下只看快照长度之后的部分。
+    """
+    snap = state._persisted or {}
+    changes: Dict[str, Any] = {}
+
+    scalars = {k: getattr(state, k) for k in _PERSISTED_SCALARS}
+    if scalars != snap.get("scalars"):
+        changes["threads"] = True
+
+    saved_agenda: Dict[str, tuple] = snap.get("agenda", {})
+    ensure_item_ids(state)
+    upsert = []
+    for it in state.agenda:
+        if saved_agenda.get(it["item_id"]) != _agenda_row(it):
+            upsert.append(it)
+    current_ids = {it["item_id"] for it in state.agenda}
+    removed = [item_id for item_id in saved_agenda if item_id not in current_ids]
+    if upsert:
+        changes["agenda_upsert"] = upsert
+    if removed:
+        changes["agenda_delete"] = removed
+
+    for name in _PERSISTED_LISTS:
+        items = getattr(state, name)
+        count, last = snap.get(name, (0, None))
+        if len(items) >= count and (count == 0 or items[count - 1] == last):
+            added = items[count:]
+        else:
+            # 列表被整体替换过：退回按内容对比
+            saved = set(snap.get(f"{name}_all", ()))
+            added = [x for x in items if x not in saved]
+        if added:
+            changes[name] = list(added)
+
+    saved_health = snap.get("style_health", {})
+    health = {k: int(v) for k, v in state.style_health.items() if saved_health.get(k) != int(v)}
+    if health:
+        changes["style_health"] = health
+    return changes
+
+
+def mark_persisted(state: DiscussionState):
+    """记录当前状态为已落库（保存成功或刚从数据库加载后调用）。"""
+    snap: Dict[str, Any] = {
+        "scalars": {k: getattr(state, k) for k in _PERSISTED_SCALARS},
+        "agenda": {it["item_id"]: _agenda_row(it) for it in state.agenda if it.get("item_id")},
+        "style_health": {k: int(v) for k, v in state.style_health.items()},
+    }
+    for name in _PERSISTED_LISTS:
+        items = getattr(state, name)
+        snap[name] = (len(items), items[-1] if items else None)
+        snap[f"{name}_all"] = tuple(items)
+    state._persisted = snap
+
+
 def set_agenda(state: DiscussionState, agenda_items: List[Dict[str, Any]], active_item_id: Optional[str]):
     """
     把 organizer.open() 生成的 agenda_items 写入 state。
@@ -105,9 +193,11 @@ def _append_unique(target: List[str], items: List[str]):
             target.append(x)
 
 
-def apply_patch(state: DiscussionState, patch: Dict[str, Any]):
+def apply_patch(state: DiscussionState, patch: Dict[str, Any], persist: bool = True):
     """
     应用 organizer.update_from_new_public_event() 产生的 patch。
+    persist=False 时只改内存里的 state，由调用方稍后调用 persist_state() 落库
+    （异步服务里改 state 要在事件循环线程上做，落库放到线程池）。
     patch 格式（可能字段缺失）：
       add_consensus: list[str]
       add_disagreements: list[str]
@@ -146,7 +236,12 @@ def apply_patch(state: DiscussionState, patch: Dict[str, Any]):
                 continue
             state.style_health[k] = int(state.style_health.get(k, 0)) + 1
 
-    # 如果启用了持久化存储，同时保存到数据库
+    if persist:
+        persist_state(state)
+
+
+def persist_state(state: DiscussionState):
+    """如果启用了持久化存储，把 state 的变更保存到数据库（同步写库）。"""
     if os.getenv('USE_PERSISTENT_STORAGE', 'true').lower() == 'true':
         try:
             from dev.mysql.persistent_store import persistent_state_store
@@ -178,6 +273,10 @@ def load_state_from_db(thread_id: str) -> Optional[DiscussionState]:
                 "generic": 0,
                 "repetitive": 0,
             })
+            state.summaries = state_data.get('summaries', [])
+            state.summarized_turn = max((int(s.get('to_turn', 0)) for s in state.summaries), default=0)
+            state.version = int(state_data.get('state_version') or 0)
+            mark_persisted(state)
             return state
     except Exception as e:
         print(f"从数据库加载状态失败: {e}")
@@ -0,0 +1,233 @@
+# memory/summary_memory.py
+from __future__ import annotations
+
+import os
+import threading
+from typing import Any, Callable, Dict, List, Tuple
+
+from .context_builder import estimate_tokens
+from .history_store import history_store, _get_field
+
+
+# 最近这么多条发言不压缩（由近期窗口提供原文）
+DEFAULT_KEEP_RECENT = 12
+# 每段 0 层摘要覆盖的发言条数
+DEFAULT_CHUNK_EVENTS = 8
+# 同一层攒满这么多段就合并成上一层的一段
+DEFAULT_FANOUT = 4
+# 渲染进 prompt 的摘要 token 上限
+DEFAULT_SUMMARY_BUDGET = 800
+# 单次压缩最多处理的段数（老会话第一次补摘要时分几次完成，避免一次性打满 LLM）
+DEFAULT_MAX_CHUNKS_PER_RUN = 4
+# 单条发言送去压缩时截断的字数
+_EVENT_MAX_CHARS = 400
+
+
+def _seg_label(seg: Dict[str, Any]) -> str:
+    return f"（第{seg.get('from_turn')}~{seg.get('to_turn')}轮）{seg.get('content', '')}"
+
+
+class _ThreadCounters:
+    __slots__ = ("compressions", "rollups", "failed")
+
+    def __init__(self):
+        self.compressions = 0
+        self.rollups = 0
+        self.failed = 0
+
+
+class SummaryMemory:
+    """
+    分层滚动摘要（长对话的“更早讨论”记忆）：
+    - 滑出近期窗口的发言每 chunk_events 条压缩成一段 0 层摘要
+    - 同一层攒满 fanout 段就合并成上一层的一段，总段数随对话长度对数增长
+    - 摘要段存放在 DiscussionState.summaries，summarized_turn 记录已覆盖到的轮次；
+      持久化到 thread_summaries 表
+    - render() 给各条链提供“摘要 + 覆盖到的轮次”，近期原文只需要补 summarized_turn 之后的部分，
+      所以无论对话多长，prompt 都有上限
+
+    压缩本身由 organizer.acompress(state, text, level) 完成，在状态流水线后台执行，不占响应关键路径。
+    """
+
+    def __init__(
+        self,
+        store: Any,
+        keep_recent: int = DEFAULT_KEEP_RECENT,
+        chunk_events: int = DEFAULT_CHUNK_EVENTS,
+        fanout: int = DEFAULT_FANOUT,
+        token_budget: int = DEFAULT_SUMMARY_BUDGET,
+        max_chunks_per_run: int = DEFAULT_MAX_CHUNKS_PER_RUN,
+    ):
+        self._store = store
+        self.keep_recent = keep_recent
+        self.chunk_events = max(1, chunk_events)
+        self.fanout = max(2, fanout)
+        self.token_budget = token_budget
+        self.max_chunks_per_run = max(1, max_chunks_per_run)
+        self._running: Dict[str, bool] = {}
+        self._counters: Dict[str, _ThreadCounters] = {}
+        self._lock = threading.Lock()
+
+    # ---------- 读 ----------
+    def render(self, state: Any) -> Tuple[str, int]:
+        """
+        返回 (摘要文本, 覆盖到的 turn_id)。没有摘要时返回 ("", 0)。
+        超出预算时优先保留较新的段。
+        """
+        segs = sorted(list(getattr(state, "summaries", None) or []), key=lambda s: int(s.get("from_turn", 0)))
+        if not segs:
+            return "", 0
+
+        picked: List[str] = []
+        used = 0
+        for seg in reversed(segs):
+            line = _seg_label(seg)
+            tokens = estimate_tokens(line)
+            if picked and used + tokens > self.token_budget:
+                break
+            picked.append(line)
+            used += tokens
+        picked.reverse()
+        return "\n".join(picked), int(getattr(state, "summarized_turn", 0) or 0)
+
+    # ---------- 写（后台） ----------
+    async def acompact(self, state: Any, organizer: Any, run_sync: Callable[..., Any]) -> int:
+        """
+        把已滑出近期窗口的发言压缩成摘要并逐层合并，返回新增的 0 层段数。
+        同一 thread 同时只跑一个压缩；已有压缩在跑时直接返回 0。
+
+        Args:
+            state: DiscussionState
+            organizer: OrganizerAgent（提供 acompress）
+            run_sync: 在线程池中执行同步函数（读库/写库）
+        """
+        thread_id = state.thread_id
+        with self._lock:
+            if self._running.get(thread_id):
+                return 0
+            self._running[thread_id] = True
+            counters = self._counters.setdefault(thread_id, _ThreadCounters())
+
+        made = 0
+        try:
+            after = int(getattr(state, "summarized_turn", 0) or 0)
+            events = await run_sync(lambda: self._store.since(thread_id, after))
+            candidates = list(events or [])
+            if self.keep_recent > 0:
+                candidates = candidates[:-self.keep_recent]
+
+            while len(candidates) >= self.chunk_events and made < self.max_chunks_per_run:
+                chunk, candidates = candidates[:self.chunk_events], candidates[self.chunk_events:]
+                content = await organizer.acompress(state, self._events_text(chunk), 0)
+                if not content:
+                    break
+                state.summaries = list(state.summaries) + [{
+                    "level": 0,
+                    "from_turn": int(_get_field(chunk[0], "turn_id", 0) or 0),
+                    "to_turn": int(_get_field(chunk[-1], "turn_id", 0) or 0),
+                    "content": content,
+                }]
+                state.summarized_turn = int(_get_field(chunk[-1], "turn_id", 0) or 0)
+                counters.compressions += 1
+                made += 1
+                await self._rollup(state, organizer, counters)
+
+            if made:
+                await run_sync(lambda: self._persist(state))
+                print(f"[摘要记忆] {thread_id}: 新增 {made} 段摘要，已覆盖到第 {state.summarized_turn} 轮")
+        except Exception as e:
+            counters.failed += 1
+            print(f"[摘要记忆] 压缩失败: {thread_id}, 错误: {e}")
+        finally:
+            with self._lock:
+                self._running.pop(thread_id, None)
+        return made
+
+    async def _rollup(self, state: Any, organizer: Any, counters: _ThreadCounters):
+        """某一层攒满 fanout 段时，把最早的 fanout 段合并成上一层的一段（可能逐层向上）。"""
+        level = 0
+        while True:
+            same = sorted(
+                (s for s in state.summaries if int(s.get("level", 0)) == level),
+                key=lambda s: int(s.get("from_turn", 0)),
+            )
+            if len(same) < self.fanout:
+                return
+            group = same[:self.fanout]
+            content = await organizer.acompress(state, "\n".join(_seg_label(s) for s in group), level + 1)
+            if not content:
+                return
+            merged = {
+                "level": level + 1,
+                "from_turn": int(group[0].get("from_turn", 0)),
+                "to_turn": int(group[-1].get("to_turn", 0)),
+                "content": content,
+            }
+            ids = {id(s) for s in group}
+            state.summaries = [s for s in state.summaries if id(s) not in ids] + [merged]
+            counters.rollups += 1
+            level += 1
+
+    @staticmethod
+    def _events_text(events: List[Any]) -> str:
+        lines = []
+        for ev in events:
+            content = str(_get_field(ev, "content", "")).strip()
+            if len(content) > _EVENT_MAX_CHARS:
+                content = content[:_EVENT_MAX_CHARS] + "…"
+            lines.append(f"{_get_field(ev, 'speaker', '未知')}：{content}")
+        return "\n".join(lines)
+
+    # ---------- 持久化 ----------
+    @staticmethod
+    def _persist(state: Any):
+        if os.getenv('USE_PERSISTENT_STORAGE', 'true').lower() != 'true':
+            return
+        try:
+            from dev.mysql.persistent_store import persistent_state_store
+            persistent_state_store.save_summaries(state.thread_id, state.summaries)
+        except Exception as e:
+            print(f"[摘要记忆] 保存摘要到数据库失败: {e}")
+
+    @staticmethod
+    def restore(state: Any) -> bool:
+        """从数据库恢复某个会话的摘要（服务重启后重新加载会话时调用）。"""
+        if os.getenv('USE_PERSISTENT_STORAGE', 'true').lower() != 'true':
+            return False
+        try:
+            from dev.mysql.persistent_store import persistent_state_store
+            summaries = persistent_state_store.load_summaries(state.thread_id)
+        except Exception as e:
+            print(f"[摘要记忆] 从数据库加载摘要失败: {e}")
+            return False
+        if not summaries:
+            return False
+        state.summaries = summaries
+        state.summarized_turn = max(int(s.get("to_turn", 0)) for s in summaries)
+        return True
+
+    def forget(self, thread_id: str):
+        with self._lock:
+            self._counters.pop(thread_id, None)
+
+    def stats(self, state: Any) -> Dict[str, Any]:
+        segs = list(getattr(state, "summaries", None) or [])
+        text, covered = self.render(state)
+        c = self._counters.get(state.thread_id) or _ThreadCounters()
+        levels: Dict[int, int] = {}
+        for s in segs:
+            lv = int(s.get("level", 0))
+            levels[lv] = levels.get(lv, 0) + 1
+        return {
+            "segments": len(segs),
+            "levels": levels,
+            "summarized_turn": covered,
+            "render_tokens": estimate_tokens(text),
+            "compressions": c.compressions,
+            "rollups": c.rollups,
+            "failed": c.failed,
+        }
+
+
+# 全局实例：organizer（读）与状态流水线（写）共用
+summary_memory = SummaryMemory(history_store)
@@ -0,0 +1,12 @@
+"""
+Moderation模块（违禁词检测）
+"""
+
+from .aho_corasick import AhoCorasick
+from .banned_words import BannedWordFilter, banned_words
+
+__all__ = [
+    'AhoCorasick',
+    'BannedWordFilter',
+    'banned_words',
+]
@@ -0,0 +1,96 @@
+# moderation/aho_corasick.py
+from __future__ import annotations
+
+from collections import deque
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+
+class AhoCorasick:
+    """
+    编译好的 Aho-Corasick 多模式匹配自动机（构建后只读）：
+    - 状态用整数编号，转移 / 失败链接 / 输出都放在按状态编号索引的平行列表里，
+      匹配时不再逐层访问嵌套 dict 节点
+    - 输出表在构建时已经沿失败链接合并，一次扫描就能报告重叠的、互相包含的所有词
+    - 扫描文本 O(n + 命中数)，与词表大小无关
+
+    词表变化时重新构建一个新实例再整体替换（见 BannedWordFilter），
+    正在使用旧实例的扫描不受影响。
+    """
+
+    __slots__ = ("_goto", "_fail", "_out", "_words", "_lengths")
+
+    def __init__(self, words: Iterable[str]):
+        self._words: List[str] = []
+        self._lengths: List[int] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        out: List[List[int]] = [[]]
+
+        seen = set()
+        for word in words:
+            if not word or word in seen:
+                continue
+            seen.add(word)
+            state = 0
+            for ch in word:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    out.append([])
+                state = nxt
+            out[state].append(len(self._words))
+            self._words.append(word)
+            self._lengths.append(len(word))
+
+        # BFS 计算失败链接，同时合并输出
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                if out[self._fail[nxt]]:
+                    out[nxt].extend(out[self._fail[nxt]])
+
+        self._out: List[Tuple[int, ...]] = [tuple(o) for o in out]
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    @property
+    def words(self) -> Sequence[str]:
+        return self._words
+
+    @property
+    def state_count(self) -> int:
+        return len(self._goto)
+
+    def iter_matches(self, text: str):
+        """逐个产出 (start, end, word_index)，end 为开区间，按结束位置排序"""
+        goto, fail, out, lengths = self._goto, self._fail, self._out, self._lengths
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                end = i + 1
+                for idx in out[state]:
+                    yield end - lengths[idx], end, idx
+
+    def find_all(self, text: str) -> List[Tuple[int, int, int]]:
+        return list(self.iter_matches(text))
+
+    def find_first(self, text: str):
+        """最早结束的一个命中，没有则返回 None"""
+        return next(self.iter_matches(text), None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"words": len(self._words), "states": len(self._goto)}
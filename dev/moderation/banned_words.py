@@ -0,0 +1,139 @@
+# moderation/banned_words.py
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .aho_corasick import AhoCorasick
+from .normalizer import normalize, normalize_word
+
+
+class BannedWordFilter:
+    """
+    违禁词过滤器（替代 server.py 里的嵌套 dict Trie）：
+    - 词表（word → category/severity）常驻内存，编译成 AhoCorasick 自动机后用于检测
+    - 词表变化时在锁内编译新自动机，编译完成后整体替换引用；检测方拿到的是某一版完整的自动机，不需要加锁
+    - 管理员增删改违禁词时调用 add() / remove()，直接改内存词表重新编译，不再整表回查数据库
+    - load_from_db() 只在启动和手动刷新时全量加载
+    - 违禁词和待检测文本都先归一化（全角/半角、繁/简、大小写、插入的标点空白），
+      在归一化文本上匹配后再映射回原文位置，整体仍是线性时间
+    - version 在每次词表变化时递增，按词表版本缓存的检测结果据此判断是否过期
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        # (自动机, 与其词序号对齐的词条列表)，一起替换保证两者一致
+        self._compiled = (AhoCorasick(()), [])
+        self._loaded = False
+        self.version = 0
+        self._stats = {"rebuilds": 0, "last_build_ms": 0.0, "scans": 0}
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    # ---------- 词表维护 ----------
+    def load_from_db(self, db_manager) -> bool:
+        """从 forbidden_words 全量加载启用的违禁词"""
+        try:
+            with db_manager.get_cursor() as cursor:
+                cursor.execute("""
+                    SELECT word, category, severity
+                    FROM forbidden_words
+                    WHERE is_active = 1
+                """)
+                rows = cursor.fetchall()
+        except Exception as e:
+            print(f"[违禁词] 加载失败: {e}")
+            return False
+
+        entries = {
+            row['word']: {"category": row['category'] or "其他", "severity": row['severity'] or 1}
+            for row in rows if row.get('word')
+        }
+        with self._lock:
+            self._entries = entries
+            self._rebuild_locked()
+            self._loaded = True
+        print(f"[违禁词] 成功加载 {len(entries)} 个违禁词")
+        return True
+
+    def add(self, word: str, category: Optional[str] = "其他", severity: Optional[int] = 1):
+        """新增或更新一个违禁词"""
+        if not word:
+            return
+        with self._lock:
+            self._entries[word] = {"category": category or "其他", "severity": severity or 1}
+            self._rebuild_locked()
+
+    def remove(self, word: str) -> bool:
+        with self._lock:
+            if self._entries.pop(word, None) is None:
+                return False
+            self._rebuild_locked()
+            return True
+
+    def _rebuild_locked(self):
+        started = time.perf_counter()
+        # 归一化后相同的词只保留一个词条
+        normalized: Dict[str, Dict[str, Any]] = {}
+        for word, info in self._entries.items():
+            key = normalize_word(word)
+            if key:
+                normalized.setdefault(key, {"word": word, **info})
+        automaton = AhoCorasick(normalized)
+        entries = [normalized[key] for key in automaton.words]
+        self._compiled = (automaton, entries)
+        self.version += 1
+        self._stats["rebuilds"] += 1
+        self._stats["last_build_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    # ---------- 检测 ----------
+    def _hits(self, text: str, first_only: bool = False) -> List[Dict[str, Any]]:
+        automaton, entries = self._compiled
+        if not len(automaton):
+            return []
+        normalized, mapping = normalize(text)
+        hits = []
+        for start, end, idx in automaton.iter_matches(normalized):
+            s, e = mapping[start], mapping[end - 1] + 1
+            hits.append({
+                "word": text[s:e],
+                "matched_word": entries[idx]["word"],
+                "start": s,
+                "end": e,
+                "category": entries[idx]["category"],
+                "severity": entries[idx]["severity"],
+            })
+            if first_only:
+                break
+        return hits
+
+    def search_all(self, text: str) -> List[Dict[str, Any]]:
+        """
+        返回文本中所有违禁词命中（包括重叠、互相包含的词），按出现位置排序；
+        字段与旧接口一致：word（原文片段）/start/end/category/severity，另加 matched_word（词表中的词）
+        """
+        if not text:
+            return []
+        self._stats["scans"] += 1
+        hits = self._hits(text)
+        hits.sort(key=lambda h: (h["start"], h["end"]))
+        return hits
+
+    def search(self, text: str) -> Optional[Dict[str, Any]]:
+        """第一个命中（最早结束的），没有则返回 None"""
+        if not text:
+            return None
+        hits = self._hits(text, first_only=True)
+        return hits[0] if hits else None
+
+    def stats(self) -> Dict[str, Any]:
+        automaton, _ = self._compiled
+        return {**self._stats, **automaton.stats(), "loaded": self._loaded, "version": self.version}
+
+
+# 全局违禁词过滤器
+banned_words = BannedWordFilter()
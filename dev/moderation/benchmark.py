@@ -0,0 +1,114 @@
+"""
+违禁词匹配基准：旧的嵌套 dict Trie 逐位置扫描 vs. Aho-Corasick 自动机
+
+用法：
+    python -m dev.moderation.benchmark
+    python -m dev.moderation.benchmark --words 1000 10000 --text 10000 200000
+"""
+
+import argparse
+import random
+import time
+
+from .aho_corasick import AhoCorasick
+
+
+class LegacyTrie:
+    """原 server.py 中的 BannedWordsTrie（仅保留 insert / search_all），作为对照"""
+
+    def __init__(self):
+        self.root = {'children': {}}
+
+    def insert(self, word: str):
+        node = self.root
+        for char in word:
+            if char not in node['children']:
+                node['children'][char] = {'children': {}, 'is_end': False}
+            node = node['children'][char]
+        node['is_end'] = True
+
+    def search_all(self, text: str):
+        violations = []
+        for i in range(len(text)):
+            node = self.root
+            for j in range(i, len(text)):
+                char = text[j]
+                if char not in node['children']:
+                    break
+                node = node['children'][char]
+                if node['is_end']:
+                    violations.append((i, j + 1))
+                    break
+        return violations
+
+
+# 常用汉字区间里取一小段，让词与文本之间有足够多的公共前缀（接近真实词表的最坏情况）
+_ALPHABET = [chr(c) for c in range(0x4E00, 0x4E00 + 300)]
+
+
+def make_words(count: int, rng: random.Random):
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.choice(_ALPHABET) for _ in range(rng.randint(2, 6))))
+    return sorted(words)
+
+
+def make_text(length: int, words, rng: random.Random):
+    parts, size = [], 0
+    while size < length:
+        # 约 2% 的片段是违禁词，其余为随机字符
+        piece = rng.choice(words) if rng.random() < 0.02 else "".join(rng.choice(_ALPHABET) for _ in range(8))
+        parts.append(piece)
+        size += len(piece)
+    return "".join(parts)[:length]
+
+
+def timed(fn, repeat: int):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def run(word_counts, text_lengths, repeat: int = 3, seed: int = 42):
+    rng = random.Random(seed)
+    print(f"{'词数':>8} {'文本长度':>10} {'构建Trie':>10} {'构建AC':>10} {'Trie扫描':>10} {'AC扫描':>10} {'加速比':>8} {'Trie命中':>9} {'AC命中':>8}")
+    for n_words in word_counts:
+        words = make_words(n_words, rng)
+
+        def build_trie():
+            trie = LegacyTrie()
+            for w in words:
+                trie.insert(w)
+            return trie
+
+        t_build_trie, trie = timed(build_trie, 1)
+        t_build_ac, automaton = timed(lambda: AhoCorasick(words), 1)
+
+        for length in text_lengths:
+            text = make_text(length, words, rng)
+            t_trie, trie_hits = timed(lambda: trie.search_all(text), repeat)
+            t_ac, ac_hits = timed(lambda: automaton.find_all(text), repeat)
+            # 旧实现每个起点只报第一个（最短）命中，应当是新结果的子集
+            assert set(trie_hits) <= {(s, e) for s, e, _ in ac_hits}
+            print(
+                f"{n_words:>8} {length:>10} {t_build_trie * 1000:>8.1f}ms {t_build_ac * 1000:>8.1f}ms "
+                f"{t_trie * 1000:>8.1f}ms {t_ac * 1000:>8.1f}ms {t_trie / t_ac if t_ac else 0:>7.1f}x "
+                f"{len(trie_hits):>9} {len(ac_hits):>8}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="违禁词匹配基准")
+    parser.add_argument("--words", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--text", type=int, nargs="+", default=[1000, 20000, 200000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.words, args.text, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# moderation/moderation_service.py
+from __future__ import annotations
+
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .banned_words import BannedWordFilter, banned_words
+
+
+# 每个对话摘要里最多保留的命中明细
+MAX_RECORDED_HITS = 20
+# 内存里最多保留这么多个对话的摘要（按最近使用淘汰；淘汰后下次查询重扫）
+DEFAULT_MAX_THREADS = 2000
+
+
+class ModerationService:
+    """
+    发言审核：
+    - 作为 history_store 的追加回调，每条发言（用户和 AI 学伴的都算）追加时用违禁词自动机扫描一次
+    - 按对话累积违规摘要（命中数、最高严重程度、分类计数、最近的命中明细），常驻内存
+    - 摘要记录生成时的词表版本；词表变化或摘要不在内存（服务重启、会话被淘汰）时，
+      thread_summary() 用 loader 取出全部发言重扫一次再缓存，之后提交公开只需查表
+    - 会话被淘汰时由服务端调用 forget() 移除摘要；管理端列表等不经会话缓存的查询也会缓存摘要，
+      所以摘要总数另有 max_threads 上限
+    """
+
+    def __init__(self, word_filter: Optional[BannedWordFilter] = None,
+                 loader: Optional[Callable[[str], List[Dict[str, Any]]]] = None,
+                 max_threads: int = DEFAULT_MAX_THREADS):
+        """
+        Args:
+            word_filter: 违禁词过滤器，默认全局 banned_words
+            loader: loader(thread_id) 返回该对话全部发言（重扫时使用）
+            max_threads: 内存里最多保留的对话摘要数
+        """
+        self.filter = word_filter or banned_words
+        self.loader = loader
+        self.max_threads = max(1, max_threads)
+        self._lock = threading.Lock()
+        self._summaries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._stats = {"scanned_events": 0, "flagged_events": 0, "rescans": 0}
+
+    # ---------- 追加时扫描 ----------
+    def check_event(self, thread_id: str, event: Dict[str, Any]):
+        """发言追加回调，签名与 history_store.add_append_listener 一致"""
+        hits = self.filter.search_all(event.get("content") or "")
+        self._stats["scanned_events"] += 1
+        with self._lock:
+            summary = self._summaries.get(thread_id)
+            if summary is None or summary["version"] != self.filter.version:
+                # 还没有完整摘要：不凭一条发言建半截摘要，留给 thread_summary() 整体重扫
+                if hits:
+                    self._stats["flagged_events"] += 1
+                return
+            self._apply(summary, event, hits)
+        if hits:
+            self._stats["flagged_events"] += 1
+
+    def track(self, thread_id: str):
+        """新建对话时登记一个空摘要，后续发言直接累加"""
+        with self._lock:
+            self._store_locked(thread_id, self._empty())
+
+    # ---------- 查询 ----------
+    def thread_summary(self, thread_id: str, events: Optional[Iterable[Dict[str, Any]]] = None,
+                       complete: bool = False) -> Dict[str, Any]:
+        """
+        对话的违规摘要；缓存有效时直接返回，否则重扫。
+        未给出 events 时用 loader 取全部发言重扫并缓存；给出 events 时只按它们计算，
+        除非 complete=True（调用方已经用 loader 同样的方式取了全部发言）否则不缓存
+        （调用方给的发言未必完整，例如只含已写库的部分，缓存下来会一直是半截摘要）。
+        loader 读不到完整历史时会抛异常（HistoryUnavailableError），这里不捕获：不缓存、交给调用方拒绝请求。
+
+        Returns:
+            {"violation_count", "max_severity", "categories", "hits", "flagged_events"}
+        """
+        with self._lock:
+            summary = self._summaries.get(thread_id)
+            if summary is not None and summary["version"] == self.filter.version:
+                self._summaries.move_to_end(thread_id)
+                return self._public(summary)
+
+        cache = events is None or complete
+        if events is None:
+            events = self.loader(thread_id) if self.loader else []
+        summary = self._empty()
+        for event in events:
+            self._apply(summary, event, self.filter.search_all(event.get("content") or ""))
+        self._stats["rescans"] += 1
+        if cache:
+            with self._lock:
+                self._store_locked(thread_id, summary)
+        return self._public(summary)
+
+    def forget(self, thread_id: str):
+        with self._lock:
+            self._summaries.pop(thread_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "threads": len(self._summaries), "word_version": self.filter.version}
+
+    # ---------- 内部 ----------
+    def _store_locked(self, thread_id: str, summary: Dict[str, Any]):
+        self._summaries[thread_id] = summary
+        self._summaries.move_to_end(thread_id)
+        while len(self._summaries) > self.max_threads:
+            self._summaries.popitem(last=False)
+
+    def _empty(self) -> Dict[str, Any]:
+        return {
+            "version": self.filter.version,
+            "violation_count": 0,
+            "flagged_events": 0,
+            "max_severity": 0,
+            "categories": Counter(),
+            "hits": [],
+        }
+
+    @staticmethod
+    def _apply(summary: Dict[str, Any], event: Dict[str, Any], hits: List[Dict[str, Any]]):
+        if not hits:
+            return
+        summary["violation_count"] += len(hits)
+        summary["flagged_events"] += 1
+        for hit in hits:
+            summary["max_severity"] = max(summary["max_severity"], hit["severity"] or 0)
+            summary["categories"][hit["category"]] += 1
+            summary["hits"].append({
+                "event_id": event.get("event_id"),
+                "turn_id": event.get("turn_id"),
+                "speaker": event.get("speaker"),
+                "word": hit["word"],
+                "category": hit["category"],
+                "severity": hit["severity"],
+            })
+        del summary["hits"][:-MAX_RECORDED_HITS]
+
+    @staticmethod
+    def _public(summary: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "violation_count": summary["violation_count"],
+            "flagged_events": summary["flagged_events"],
+            "max_severity": summary["max_severity"],
+            "categories": dict(summary["categories"]),
+            "hits": list(summary["hits"]),
+        }
+
+
+# 全局发言审核实例（loader 由服务端设置为 history_store.all）
+moderation = ModerationService()
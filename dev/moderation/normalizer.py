@@ -0,0 +1,94 @@
+# moderation/normalizer.py
+from __future__ import annotations
+
+import re
+from typing import List, Tuple
+
+
+# 常见繁体字 → 简体字（逐字一一对应，保证归一化前后位置可以映射回原文）
+_TRAD_SIMP_PAIRS = """
+萬万 與与 醜丑 專专 業业 東东 絲丝 丟丢 兩两 嚴严 喪丧 個个 豐丰 臨临 為为 麗丽 舉举 義义 烏乌 樂乐
+喬乔 習习 鄉乡 書书 買买 亂乱 爭争 於于 虧亏 雲云 亞亚 產产 親亲 億亿 僅仅 從从 倉仓 儀仪 們们 價价
+眾众 優优 會会 傘伞 偉伟 傳传 傷伤 倫伦 偽伪 體体 俠侠 偵侦 側侧 僑侨 倆俩 儉俭 債债 傾倾 償偿 儲储
+兒儿 黨党 蘭兰 關关 興兴 養养 獸兽 岡冈 冊册 寫写 軍军 農农 馮冯 衝冲 決决 況况 凍冻 淨净 涼凉 減减
+幾几 鳳凤 憑凭 凱凯 擊击 劃划 劉刘 則则 剛刚 創创 刪删 別别 劑剂 劍剑 剝剥 劇剧 勸劝 辦办 務务 動动
+勵励 勁劲 勞劳 勢势 勝胜 區区 醫医 華华 協协 單单 賣卖 盧卢 衛卫 卻却 廠厂 廳厅 歷历 厲厉 壓压 厭厌
+廁厕 廚厨 縣县 參参 雙双 發发 變变 敘叙 疊叠 葉叶 號号 嘆叹 吳吴 呂吕 嚇吓 聽听 啟启 嗎吗 員员 響响
+問问 啞哑 喚唤 嘩哗 嗚呜 國国 圖图 圓圆 聖圣 場场 壞坏 塊块 堅坚 壇坛 壩坝 墳坟 墜坠 墾垦 壯壮 聲声
+殼壳 壺壶 處处 備备 復复 夠够 頭头 誇夸 夾夹 奪夺 奮奋 獎奖 奧奥 媽妈 婦妇 嬰婴 孫孙 學学 寧宁 寶宝
+實实 寵宠 審审 憲宪 宮宫 對对 尋寻 導导 將将 爾尔 塵尘 嘗尝 層层 屬属 歲岁 豈岂 島岛 嶺岭 幣币 帥帅
+師师 帳帐 帶带 幫帮 廣广 莊庄 慶庆 應应 廢废 開开 異异 棄弃 張张 彌弥 彎弯 彈弹 強强 歸归 當当 錄录
+徹彻 徑径 後后 憶忆 懷怀 態态 憐怜 總总 戀恋 惡恶 惱恼 愛爱 懇恳 慣惯 憤愤 懶懒 戰战 戲戏 戶户 撲扑
+執执 擴扩 掃扫 揚扬 擾扰 撫抚 搶抢 護护 報报 擔担 擬拟 擁拥 攔拦 撥拨 擇择 掛挂 撈捞 損损 撿捡 換换
+據据 攜携 搖摇 擺摆 攝摄 斂敛 數数 齋斋 斷断 無无 舊旧 時时 曠旷 暢畅 曉晓 暫暂 術术 機机 殺杀 雜杂
+權权 條条 來来 楊杨 極极 構构 槍枪 標标 棟栋 欄栏 樹树 橋桥 檢检 樓楼 樣样 歡欢 歐欧 殘残 毀毁 氣气
+漢汉 湯汤 溝沟 沒没 滅灭 濕湿 滿满 漁渔 潔洁 濃浓 濟济 淺浅 測测 澤泽 灣湾 溫温 遊游 灑洒 點点 煉炼
+煩烦 熱热 燒烧 營营 燈灯 爐炉 牆墙 狀状 猶犹 獨独 獄狱 獲获 現现 環环 瑪玛 電电 畫画 瘋疯 療疗 盡尽
+監监 盤盘 盜盗 睜睁 礦矿 碼码 確确 禮礼 禍祸 離离 種种 積积 稱称 穩稳 窮穷 競竞 筆笔 節节 範范 築筑
+簡简 籃篮 類类 糧粮 糾纠 紅红 級级 約约 紀纪 紙纸 紛纷 細细 終终 組组 經经 結结 給给 絕绝 統统 絡络
+網网 綠绿 維维 綜综 練练 線线 緊紧 緒绪 編编 緣缘 縮缩 織织 績绩 繼继 續续 罰罚 羅罗 聯联 職职 聞闻
+腦脑 臉脸 艦舰 藝艺 藥药 蘇苏 蟲虫 補补 裝装 製制 複复 見见 規规 視视 覺觉 覽览 觀观 計计 訂订 認认
+討讨 讓让 訓训 記记 講讲 許许 論论 設设 訪访 證证 評评 識识 詞词 試试 詩诗 話话 誠诚 誤误 說说 請请
+讀读 課课 誰谁 調调 談谈 謝谢 謎谜 豬猪 貓猫 貝贝 負负 財财 責责 貨货 質质 貧贫 購购 貴贵 費费 資资
+賊贼 賭赌 賽赛 贊赞 趕赶 趙赵 躍跃 車车 軟软 轉转 輪轮 輕轻 載载 較较 輸输 辭辞 邊边 遼辽 達达 遷迁
+過过 運运 還还 這这 進进 遠远 違违 連连 遲迟 適适 選选 遺遗 郵邮 鄰邻 醬酱 釋释 裡里 針针 鐘钟 鋼钢
+錢钱 鐵铁 銀银 鏡镜 長长 門门 閃闪 閉闭 間间 閱阅 隊队 陽阳 陰阴 陣阵 階阶 際际 陸陆 險险 隨随 隱隐
+難难 雞鸡 靈灵 靜静 頁页 項项 順顺 須须 預预 領领 頻频 題题 顏颜 願愿 顧顾 顯显 風风 飛飞 飯饭 飲饮
+館馆 馬马 駕驾 驗验 騙骗 鬥斗 魚鱼 鳥鸟 鳴鸣 鴨鸭 麥麦 黃黄 齊齐 齒齿 龍龙 龜龟 詐诈 毆殴 淫淫 穢秽
+"""
+
+# 全角字符 → 半角；大写 → 小写；繁体 → 简体：都是逐字映射，用一张 str.translate 表一次完成
+_TRANSLATION = {0x3000: 0x20}
+_TRANSLATION.update({code: code for code in range(ord("A"), ord("Z") + 1)})
+_TRANSLATION.update({code: code - 0xFEE0 for code in range(0xFF01, 0xFF5F)})
+_TRANSLATION.update({pair[0]: pair[1] for pair in _TRAD_SIMP_PAIRS.split()})
+_TRANSLATION = str.maketrans({
+    (k if isinstance(k, int) else ord(k)): (chr(v) if isinstance(v, int) else v).lower()
+    for k, v in _TRANSLATION.items()
+})
+
+# 字母、数字、汉字组成的连续片段；片段之间的标点、符号、表情、空白在匹配时忽略（对付“傻.逼”“傻 逼”这类插字符绕过）
+_KEEP_RE = re.compile(r"[^\W_]+")
+_WHITESPACE_RE = re.compile(r"\s")
+
+
+def _is_ascii_alnum(ch: str) -> bool:
+    return ch.isascii() and ch.isalnum()
+
+
+def normalize(text: str) -> Tuple[str, List[int]]:
+    """
+    违禁词匹配前的文本归一化：全角转半角、转小写、繁体转简体，去掉标点 / 符号 / 空白。
+
+    Returns:
+        (归一化文本, 位置映射)：normalized[i] 来自原文 text[mapping[i]]，
+        匹配到 normalized[s:e] 时对应原文 text[mapping[s]:mapping[e - 1] + 1]
+
+    两个英文单词之间的空白保留为一个空格（违禁词归一化后不含空格，所以空格会截断匹配），
+    避免 "is better" 这类跨词拼接误命中英文违禁词。整体仍是线性时间。
+    """
+    if not text:
+        return "", []
+    translated = text.translate(_TRANSLATION)
+    pieces: List[str] = []
+    mapping: List[int] = []
+    prev_end = 0
+    for m in _KEEP_RE.finditer(translated):
+        start, end = m.span()
+        if (
+            pieces
+            and _WHITESPACE_RE.search(translated, prev_end, start)
+            and _is_ascii_alnum(translated[prev_end - 1])
+            and _is_ascii_alnum(translated[start])
+        ):
+            pieces.append(" ")
+            mapping.append(prev_end)
+        pieces.append(m.group())
+        mapping.extend(range(start, end))
+        prev_end = end
+    return "".join(pieces), mapping
+
+
+def normalize_word(word: str) -> str:
+    """违禁词本身的归一化（与文本使用同一规则，去掉全部分隔符）"""
+    return "".join(_KEEP_RE.findall((word or "").translate(_TRANSLATION)))
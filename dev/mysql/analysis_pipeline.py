@@ -0,0 +1,322 @@
+"""
+发言内容分析流水线
+发言写入时只把分析任务放进有界队列，后台按批交给工作进程里的 ContentAnalyzer 分析，再批量写回数据库
+"""
+
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from dev.nlp.worker import analyze_batch, init_worker, ping
+
+
+# 吞吐量统计窗口（秒）
+THROUGHPUT_WINDOW = 60.0
+# 工作进程里需要的模块（forkserver 预先导入，之后的工作进程从它 fork 出来）
+WORKER_MODULE = "dev.nlp.worker"
+_PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _main_is_project_module() -> bool:
+    """
+    主模块是否是项目里的文件（例如 python dev/api/server.py 直接启动）。
+    forkserver/spawn 的子进程会重新导入主模块，这种情况下会把 dev.mysql 也导入一遍；
+    用 python -m uvicorn dev.api.server:app 启动时主模块是 uvicorn，不受影响。
+    """
+    main = sys.modules.get("__main__")
+    spec_name = getattr(getattr(main, "__spec__", None), "name", None) or ""
+    if spec_name.endswith("__main__") and not spec_name.startswith("dev."):
+        return False
+    path = getattr(main, "__file__", None)
+    return bool(path) and os.path.abspath(path).startswith(_PACKAGE_DIR + os.sep)
+
+
+class AnalysisPipeline:
+    """
+    发言分析流水线：
+    - submit()：append 把待分析的发言放进有界队列后立即返回，从不等待（append 在事件循环上调用）；
+      队列满时返回 False 并计入 overflow，这条发言不做内容分析
+    - 后台调度线程攒批，把一批发言平均分给各工作进程分析（jieba 分词是 CPU 密集的，放进进程池才不受 GIL 限制），
+      结果交给 writer 一个事务批量写库
+    - 工作进程用 forkserver（不支持时用 spawn）启动，不从已有线程和数据库连接的服务进程 fork；
+      任务函数在 dev.nlp.worker 里，子进程只导入 dev.nlp
+    - 分析失败、写库失败、发言还在写后日志里没落库（writer 返回的 event_id）都会退避后重试，
+      超过 max_retries 次放弃；工作进程崩溃时重建进程池
+    - stats() 给状态接口使用：队列深度、在途数量、吞吐量、平均延迟、重试/失败次数
+    """
+
+    def __init__(
+        self,
+        writer: Callable[[List[Dict[str, Any]]], Optional[List[str]]],
+        workers: int = 2,
+        max_queue: int = 1000,
+        batch_size: int = 50,
+        batch_interval: float = 0.1,
+        max_retries: int = 5,
+        task_timeout: float = 60.0,
+    ):
+        """
+        Args:
+            writer: 批量写库函数，参数为带分析结果的任务列表；返回暂时无法写入（发言尚未落库）的 event_id，失败时抛异常
+            workers: 工作进程数
+            max_queue: 队列上限，超过时 submit 直接返回 False
+            batch_size: 单批最多任务数
+            batch_interval: 攒批的等待时间（秒）
+            max_retries: 单个任务最多重试次数
+            task_timeout: 单批分析的超时时间（秒）
+        """
+        self._writer = writer
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.batch_interval = batch_interval
+        self.max_retries = max_retries
+        self.task_timeout = task_timeout
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max(self.batch_size, max_queue))
+        self._retry: List[Tuple[float, Dict[str, Any]]] = []  # (最早重试时间, 任务)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._inflight = 0
+        self._started_at = 0.0
+        self._done: Deque[Tuple[float, int]] = deque()  # (完成时间, 写入条数)，吞吐量窗口
+        self._latency_total = 0.0
+        self.mode: Optional[str] = None
+        self._stats = {
+            "submitted": 0,
+            "analyzed": 0,
+            "written": 0,
+            "batches": 0,
+            "retried": 0,
+            "deferred": 0,
+            "failed": 0,
+            "dropped": 0,
+            "overflow": 0,
+            "pool_restarts": 0,
+        }
+        self._last_error: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and not self._closed
+
+    # ---------- 启动 / 关闭 ----------
+    def start(self):
+        """创建工作进程池（各进程预先加载词典）并启动调度线程"""
+        if self._thread is not None:
+            return
+        self._executor = self._make_executor()
+        for future in [self._executor.submit(ping) for _ in range(self.workers)]:
+            future.result(timeout=self.task_timeout)
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="analysis-dispatcher", daemon=True)
+        self._thread.start()
+        print(f"[分析流水线] 已启动: {self.workers} 个工作{'进程' if self.mode == 'process' else '线程'}")
+
+    def _make_executor(self):
+        # 不用 fork：服务进程里已经有各种后台线程和数据库连接，fork 出来的子进程会继承它们（锁可能处于持有状态）
+        if _main_is_project_module():
+            print("[分析流水线] 主模块是项目文件，工作进程会重新导入它，改用线程池分析"
+                  "（用 python -m uvicorn dev.api.server:app 启动可使用进程池）")
+            self.mode = "thread"
+            return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="analysis", initializer=init_worker)
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            ctx = multiprocessing.get_context("forkserver")
+            ctx.set_forkserver_preload([WORKER_MODULE])
+        else:
+            ctx = multiprocessing.get_context("spawn")
+        self.mode = "process"
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx, initializer=init_worker)
+
+    def close(self, timeout: float = 10.0):
+        """停止调度线程；队列里剩下的任务在当前线程就地分析写库（退出阶段进程池已不接受新任务）"""
+        if self._thread is None or self._closed:
+            return
+        self._closed = True
+        self._thread.join(timeout)
+        with self._lock:
+            remaining = [job for _, job in self._retry]
+            self._retry = []
+        while True:
+            try:
+                remaining.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if remaining:
+            try:
+                analyses = analyze_batch([(job["content"], job["speaker"]) for job in remaining])
+                self._writer([dict(job, **analysis) for job, analysis in zip(remaining, analyses)])
+            except Exception as e:
+                print(f"[分析流水线] 退出前写入剩余 {len(remaining)} 条分析结果失败: {e}")
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # ---------- 提交 ----------
+    def submit(self, job: Dict[str, Any]) -> bool:
+        """
+        放入分析队列，job 至少包含 event_id / thread_id / speaker / content。
+        返回 False 表示流水线未运行或队列已满（不等待）。
+        """
+        if not self.running:
+            return False
+        job = dict(job, attempts=0, enqueued_at=time.monotonic())
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self._stats["overflow"] += 1
+            return False
+        self._stats["submitted"] += 1
+        return True
+
+    # ---------- 后台调度 ----------
+    def _run(self):
+        while not self._closed:
+            batch = self._next_batch()
+            if batch:
+                self._process(batch)
+
+    def _next_batch(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            self._retry.sort(key=lambda item: item[0])
+            due = 0
+            while due < len(self._retry) and due < self.batch_size and self._retry[due][0] <= now:
+                due += 1
+            batch = [job for _, job in self._retry[:due]]
+            del self._retry[:due]
+            next_retry = self._retry[0][0] if self._retry else None
+            # 重试积压达到队列上限时暂停取新任务，队列满后新的发言不再排队分析（计入 overflow）
+            accept_new = len(self._retry) < self._queue.maxsize
+
+        if not accept_new:
+            if not batch:
+                time.sleep(min(0.5, max(0.01, next_retry - now)))
+            return batch
+
+        if not batch:
+            wait = 0.5 if next_retry is None else min(0.5, max(0.01, next_retry - now))
+            try:
+                batch.append(self._queue.get(timeout=wait))
+            except queue.Empty:
+                return batch
+        # 攒一小会儿，让同一时间段的多条发言合成一批
+        deadline = time.monotonic() + self.batch_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _process(self, batch: List[Dict[str, Any]]):
+        self._inflight = len(batch)
+        try:
+            try:
+                analyses = self._analyze(batch)
+            except Exception as e:
+                # 工作进程崩溃，或超时（卡住的工作进程一直占着名额，不重建进程池会被逐个卡死）
+                if isinstance(e, (BrokenProcessPool, FutureTimeoutError)):
+                    self._rebuild(kill=isinstance(e, FutureTimeoutError))
+                self._retry_later(batch, f"分析失败: {e!r}")
+                return
+            self._stats["analyzed"] += len(batch)
+            self._stats["batches"] += 1
+
+            results = [dict(job, **analysis) for job, analysis in zip(batch, analyses)]
+            try:
+                deferred = set(self._writer(results) or ())
+            except Exception as e:
+                self._retry_later(batch, f"写库失败: {e}")
+                return
+        finally:
+            self._inflight = 0
+
+        now = time.monotonic()
+        written = [job for job in batch if job["event_id"] not in deferred]
+        with self._lock:
+            self._stats["written"] += len(written)
+            self._latency_total += sum(now - job["enqueued_at"] for job in written)
+            self._done.append((now, len(written)))
+            self._last_error = None
+        if deferred:
+            self._stats["deferred"] += len(deferred)
+            self._retry_later([job for job in batch if job["event_id"] in deferred], None)
+
+    def _analyze(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """把一批任务平均切给各工作进程，按原顺序收集结果"""
+        size = -(-len(batch) // self.workers)
+        futures = [
+            self._executor.submit(analyze_batch, [(job["content"], job["speaker"]) for job in batch[i:i + size]])
+            for i in range(0, len(batch), size)
+        ]
+        analyses = []
+        for future in futures:
+            analyses.extend(future.result(timeout=self.task_timeout))
+        return analyses
+
+    def _retry_later(self, jobs: List[Dict[str, Any]], error: Optional[str]):
+        """
+        退避后重试（1s、2s、4s…，最长 30s）；超过 max_retries 次放弃。
+        error 为空表示发言尚未落库，放弃时记为 dropped（多半是会话已被删除）。
+        """
+        now = time.monotonic()
+        with self._lock:
+            for job in jobs:
+                job["attempts"] += 1
+                if job["attempts"] > self.max_retries:
+                    self._stats["failed" if error else "dropped"] += 1
+                    continue
+                self._retry.append((now + min(2 ** (job["attempts"] - 1), 30.0), job))
+                self._stats["retried"] += 1
+            if error:
+                self._last_error = error
+        if error:
+            print(f"[分析流水线] {error}（{len(jobs)} 条，稍后重试）")
+
+    def _rebuild(self, kill: bool = False):
+        """
+        工作进程异常退出或任务超时后重建进程池。
+        kill=True 时终止旧池里仍在运行的工作进程（shutdown 不会打断正在执行的任务）；
+        线程模式下卡住的线程无法终止，只能放弃它、换一个新池。
+        """
+        old = self._executor
+        self._executor = self._make_executor()
+        if kill and isinstance(old, ProcessPoolExecutor):
+            for proc in list((getattr(old, "_processes", None) or {}).values()):
+                try:
+                    proc.terminate()
+                except Exception:
+                    pass
+        old.shutdown(wait=False, cancel_futures=True)
+        self._stats["pool_restarts"] += 1
+
+    # ---------- 状态 ----------
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            while self._done and self._done[0][0] < now - THROUGHPUT_WINDOW:
+                self._done.popleft()
+            window = min(THROUGHPUT_WINDOW, now - self._started_at) if self._started_at else 0.0
+            written = self._stats["written"]
+            return {
+                **self._stats,
+                "running": self.running,
+                "mode": self.mode,
+                "workers": self.workers,
+                "queue_depth": self._queue.qsize(),
+                "queue_capacity": self._queue.maxsize,
+                "retry_pending": len(self._retry),
+                "inflight": self._inflight,
+                "throughput_per_sec": round(sum(n for _, n in self._done) / window, 2) if window > 0 else 0.0,
+                "avg_latency_ms": round(self._latency_total / written * 1000, 1) if written else 0.0,
+                "avg_batch_size": round(self._stats["analyzed"] / self._stats["batches"], 2) if self._stats["batches"] else 0.0,
+                "last_error": self._last_error,
+            }
@@ -3,16 +3,224 @@
 用于管理thinking_together数据库的连接和操作
 """
 
+import asyncio
+import os
+import threading
+import time
 import pymysql
 import json
 import uuid
+from collections import deque
+from contextvars import ContextVar
 from datetime import datetime
-from typing import Optional, List, Dict, Any
-from contextlib import contextmanager
+from typing import Optional, List, Dict, Any, Callable, Deque, Tuple
+from contextlib import contextmanager, asynccontextmanager
+
+try:
+    import aiomysql  # 可选：安装后异步接口走原生异步驱动
+except ImportError:
+    aiomysql = None
+
+
+class _PoolMetrics:
+    """连接池统计（借用次数、等待耗时、超时、健康检查、空闲回收）。"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.total_wait_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.timeouts = 0
+        self.created = 0
+        self.health_failures = 0
+        self.reaped = 0
+
+    def record_wait(self, wait_ms: float):
+        self.checkouts += 1
+        self.total_wait_ms += wait_ms
+        self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "checkouts": self.checkouts,
+            "avg_wait_ms": round(self.total_wait_ms / self.checkouts, 2) if self.checkouts else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 2),
+            "timeouts": self.timeouts,
+            "created": self.created,
+            "health_failures": self.health_failures,
+            "reaped": self.reaped,
+        }
+
+
+class ConnectionPool:
+    """
+    线程安全的 pymysql 连接池：
+    - 连接总数有上限，借不到时排队等待，超过 checkout_timeout 抛异常
+    - 借出时只有空闲超过 ping_interval 的连接才 ping 一次（不再每次使用都 ping）
+    - 空闲超过 idle_timeout 的连接在借还时顺带回收，至少保留 min_idle 个
+    """
+
+    def __init__(
+        self,
+        connect_fn: Callable[[], Any],
+        max_size: int = 10,
+        min_idle: int = 1,
+        idle_timeout: float = 300,
+        ping_interval: float = 30,
+        checkout_timeout: float = 10,
+    ):
+        self._connect = connect_fn
+        self.max_size = max(1, max_size)
+        self.min_idle = max(0, min_idle)
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+        self.checkout_timeout = checkout_timeout
+        self._idle: Deque[Tuple[Any, float]] = deque()   # (连接, 最近归还时间)，右端最新
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self.metrics = _PoolMetrics()
+
+    def __bool__(self) -> bool:
+        return not self._closed
+
+    def acquire(self) -> Any:
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.checkout_timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise Exception("数据库连接池已关闭")
+                self._reap_locked()
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn, last_used = None, 0.0
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.metrics.timeouts += 1
+                    raise Exception(f"获取数据库连接超时（连接池已满: {self.max_size}）")
+                self._cond.wait(remaining)
+
+        try:
+            if conn is None:
+                conn = self._connect()
+                self.metrics.created += 1
+            elif time.monotonic() - last_used > self.ping_interval:
+                # 健康检查：空闲较久的连接先 ping，失效则换一个新连接
+                try:
+                    conn.ping(reconnect=False)
+                except Exception:
+                    self.metrics.health_failures += 1
+                    self._close_quietly(conn)
+                    conn = self._connect()
+                    self.metrics.created += 1
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        self.metrics.record_wait((time.perf_counter() - started) * 1000)
+        return conn
+
+    def release(self, conn: Any, broken: bool = False):
+        with self._cond:
+            if broken or self._closed:
+                self._size -= 1
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _reap_locked(self):
+        """回收空闲过久的连接（最旧的在左端）。"""
+        now = time.monotonic()
+        while len(self._idle) > self.min_idle and now - self._idle[0][1] > self.idle_timeout:
+            conn, _ = self._idle.popleft()
+            self._size -= 1
+            self.metrics.reaped += 1
+            self._close_quietly(conn)
+
+    def reap(self):
+        with self._cond:
+            self._reap_locked()
+
+    @staticmethod
+    def _close_quietly(conn: Any):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.popleft()
+                self._size -= 1
+                self._close_quietly(conn)
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                **self.metrics.as_dict(),
+            }
+
+
+class _ThreadedAsyncCursor:
+    """未安装 aiomysql 时的异步游标：把同步游标的调用放到线程池里执行，接口与 aiomysql 游标一致。"""
+
+    def __init__(self, cursor: Any):
+        self._cursor = cursor
+
+    async def execute(self, query: str, args: Any = None) -> int:
+        return await asyncio.to_thread(self._cursor.execute, query, args)
+
+    async def executemany(self, query: str, args: Any) -> int:
+        return await asyncio.to_thread(self._cursor.executemany, query, args)
+
+    async def fetchone(self) -> Optional[Dict[str, Any]]:
+        return self._cursor.fetchone()
+
+    async def fetchall(self) -> List[Dict[str, Any]]:
+        return self._cursor.fetchall()
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self) -> Any:
+        return self._cursor.lastrowid
+
+
+def _cursor_owner() -> tuple:
+    """get_cursor 嵌套复用连接的归属：当前线程 + 当前协程 task（不在事件循环里时为 None）"""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return threading.get_ident(), task
 
 
 class DatabaseManager:
-    """数据库管理器，负责处理与thinking_together数据库的所有交互"""
+    """
+    数据库管理器，负责处理与thinking_together数据库的所有交互
+
+    连接通过连接池管理（FastAPI 处理函数、线程池里的任务、history_store 各自借用独立连接）：
+    - get_cursor()：同步接口，同一线程内嵌套使用时复用同一个连接、最外层提交
+    - aget_cursor()：异步接口（aiomysql 风格：await cursor.execute / fetchall），
+      安装了 aiomysql 时使用原生异步连接池，否则退化为线程池执行
+    - pool_stats()：连接池大小、借用等待耗时等指标
+    """
 
     def __init__(self, host='localhost', user='root', password='root', database='thinking_together', port=3306, charset='utf8mb4'):
         self.host = host
@@ -21,7 +229,19 @@ class DatabaseManager:
         self.database = database
         self.port = port
         self.charset = charset
-        self.connection = None
+        self.pool_size = int(os.getenv('DB_POOL_SIZE', 10))
+        self.pool_min_idle = int(os.getenv('DB_POOL_MIN_IDLE', 1))
+        self.pool_idle_timeout = float(os.getenv('DB_POOL_IDLE_TIMEOUT', 300))
+        self.pool_ping_interval = float(os.getenv('DB_POOL_PING_INTERVAL', 30))
+        self.pool_timeout = float(os.getenv('DB_POOL_TIMEOUT', 10))
+        self._pool: Optional[ConnectionPool] = None
+        # 当前上下文里正在使用的连接 [conn, depth, owner]：按 contextvar 而不是线程区分，
+        # 事件循环线程上的各个协程（task）各有各的上下文，不会互相复用对方的连接
+        self._active: ContextVar[Optional[list]] = ContextVar(f"db_cursor_{id(self)}", default=None)
+        self._apool = None
+        self._apool_loop = None
+        self._apool_lock: Optional[asyncio.Lock] = None
+        self._ametrics = _PoolMetrics()
 
     @classmethod
     def from_config(cls):
@@ -30,21 +250,42 @@ class DatabaseManager:
         config = get_db_config()
         return cls(**config)
 
+    @property
+    def connection(self) -> Optional[ConnectionPool]:
+        """兼容旧代码的 `if not db.connection` 判断：连接池可用时为真。"""
+        return self._pool if self._pool else None
+
+    def _new_connection(self):
+        return pymysql.connect(
+            host=self.host,
+            user=self.user,
+            password=self.password,
+            database=self.database,
+            port=self.port,
+            charset=self.charset,
+            cursorclass=pymysql.cursors.DictCursor
+        )
+
     def connect(self):
-        """建立数据库连接"""
+        """建立数据库连接池（并借出一个连接验证可用）"""
         try:
-            self.connection = pymysql.connect(
-                host=self.host,
-                user=self.user,
-                password=self.password,
-                database=self.database,
-                port=self.port,
-                charset=self.charset,
-                cursorclass=pymysql.cursors.DictCursor
-            )
-            print(f"成功连接到数据库: {self.database} @ {self.host}:{self.port}")
+            if not self._pool:
+                self._pool = ConnectionPool(
+                    self._new_connection,
+                    max_size=self.pool_size,
+                    min_idle=self.pool_min_idle,
+                    idle_timeout=self.pool_idle_timeout,
+                    ping_interval=self.pool_ping_interval,
+                    checkout_timeout=self.pool_timeout,
+                )
+            conn = self._pool.acquire()
+            self._pool.release(conn)
+            print(f"成功连接到数据库: {self.database} @ {self.host}:{self.port}（连接池上限 {self.pool_size}）")
             return True
         except Exception as e:
+            if self._pool is not None:
+                self._pool.close()
+            self._pool = None
             print(f"[数据库错误] 连接失败: {e}")
             print(f"[数据库错误] 连接参数: host={self.host}, port={self.port}, user={self.user}, database={self.database}")
             print(f"[数据库错误] 请检查:")
@@ -54,47 +295,166 @@ class DatabaseManager:
             return False
 
     def disconnect(self):
-        """关闭数据库连接"""
-        if self.connection:
-            self.connection.close()
-            self.connection = None
+        """关闭数据库连接池"""
+        if self._pool:
+            self._pool.close()
+            self._pool = None
             print("数据库连接已关闭")
+        if self._apool is not None:
+            self._apool.close()
+            self._apool = None
 
     @contextmanager
     def get_cursor(self):
-        """获取数据库游标的上下文管理器"""
-        # 确保连接存在且有效
-        if not self.connection:
+        """获取数据库游标的上下文管理器（从连接池借用连接，退出时提交并归还）"""
+        active = self._active.get()
+        if active is not None and active[2] == _cursor_owner():
+            # 同一线程 / 同一协程内嵌套使用：复用外层的连接，由最外层提交
+            # （在游标块里创建的 task 会继承上下文，但 owner 不同，仍然另借连接）
+            conn = active[0]
+            cursor = conn.cursor()
+            active[1] += 1
+            try:
+                yield cursor
+            except Exception:
+                try:
+                    conn.rollback()
+                except Exception as rollback_err:
+                    print(f"[数据库警告] rollback失败: {rollback_err}")
+                raise
+            finally:
+                active[1] -= 1
+                try:
+                    cursor.close()
+                except Exception as close_err:
+                    print(f"[数据库警告] 关闭游标失败: {close_err}")
+            return
+
+        if not self._pool:
             if not self.connect():
                 raise Exception("数据库连接失败，请检查MySQL服务是否已启动")
 
-        # 测试连接是否有效
-        try:
-            self.connection.ping(reconnect=True)
-        except Exception as e:
-            print(f"[数据库警告] 连接无效，尝试重连: {e}")
-            if not self.connect():
-                raise Exception("数据库重连失败，请检查MySQL服务是否已启动")
-
-        cursor = self.connection.cursor()
+        pool = self._pool
+        conn = pool.acquire()
+        broken = False
+        token = self._active.set([conn, 1, _cursor_owner()])
+        cursor = conn.cursor()
         try:
             yield cursor
-            self.connection.commit()
+            conn.commit()
         except Exception as e:
             # 在rollback时也要捕获异常，防止连接已断开时产生新的错误
             try:
-                self.connection.rollback()
+                conn.rollback()
             except Exception as rollback_err:
                 print(f"[数据库警告] rollback失败: {rollback_err}")
-                # 如果是连接断开导致的错误，清除连接标记
-                if "InterfaceError" in str(type(rollback_err)) or "(0, '')" in str(rollback_err):
-                    self.connection = None
+                # 连接已断开：不再放回连接池
+                broken = True
             raise e
         finally:
             try:
                 cursor.close()
             except Exception as close_err:
                 print(f"[数据库警告] 关闭游标失败: {close_err}")
+            self._active.reset(token)
+            pool.release(conn, broken=broken)
+
+    async def _aiomysql_pool(self):
+        """按事件循环懒加载 aiomysql 连接池。"""
+        loop = asyncio.get_running_loop()
+        if self._apool is not None and self._apool_loop is loop:
+            return self._apool
+        if self._apool_lock is None or self._apool_loop is not loop:
+            self._apool_lock = asyncio.Lock()
+        async with self._apool_lock:
+            if self._apool is None or self._apool_loop is not loop:
+                self._apool = await aiomysql.create_pool(
+                    host=self.host,
+                    user=self.user,
+                    password=self.password,
+                    db=self.database,
+                    port=self.port,
+                    charset=self.charset,
+                    minsize=self.pool_min_idle,
+                    maxsize=self.pool_size,
+                    pool_recycle=int(self.pool_idle_timeout),
+                    cursorclass=aiomysql.DictCursor,
+                    autocommit=False,
+                )
+                self._apool_loop = loop
+                self._ametrics.created += 1
+        return self._apool
+
+    @asynccontextmanager
+    async def aget_cursor(self):
+        """
+        异步游标上下文管理器（aiomysql 风格）：
+            async with db.aget_cursor() as cursor:
+                await cursor.execute(sql, args)
+                rows = await cursor.fetchall()
+        """
+        if aiomysql is not None:
+            pool = await self._aiomysql_pool()
+            started = time.perf_counter()
+            try:
+                conn = await asyncio.wait_for(pool.acquire(), self.pool_timeout)
+            except asyncio.TimeoutError:
+                self._ametrics.timeouts += 1
+                raise Exception(f"获取数据库连接超时（连接池已满: {self.pool_size}）")
+            self._ametrics.record_wait((time.perf_counter() - started) * 1000)
+            try:
+                async with conn.cursor() as cursor:
+                    try:
+                        yield cursor
+                        await conn.commit()
+                    except Exception:
+                        try:
+                            await conn.rollback()
+                        except Exception as rollback_err:
+                            print(f"[数据库警告] rollback失败: {rollback_err}")
+                        raise
+            finally:
+                pool.release(conn)
+            return
+
+        # 没有 aiomysql：借连接/提交/归还都放到线程里，事件循环不做阻塞 I/O
+        if not self._pool:
+            if not await asyncio.to_thread(self.connect):
+                raise Exception("数据库连接失败，请检查MySQL服务是否已启动")
+        pool = self._pool
+        conn = await asyncio.to_thread(pool.acquire)
+        broken = False
+        cursor = conn.cursor()
+        try:
+            yield _ThreadedAsyncCursor(cursor)
+            await asyncio.to_thread(conn.commit)
+        except Exception:
+            try:
+                await asyncio.to_thread(conn.rollback)
+            except Exception as rollback_err:
+                print(f"[数据库警告] rollback失败: {rollback_err}")
+                broken = True
+            raise
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+            pool.release(conn, broken=broken)
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """连接池指标：同步池大小/空闲/借用等待耗时；异步池（aiomysql）借用等待耗时。"""
+        out: Dict[str, Any] = {
+            "sync": self._pool.stats() if self._pool else None,
+            "async_driver": "aiomysql" if aiomysql is not None else "threaded",
+        }
+        if aiomysql is not None:
+            out["async"] = {
+                "size": self._apool.size if self._apool is not None else 0,
+                "free": self._apool.freesize if self._apool is not None else 0,
+                **self._ametrics.as_dict(),
+            }
+        return out
 
     def generate_event_id(self) -> str:
         """生成事件ID"""
@@ -191,10 +551,12 @@ class DatabaseManager:
                 WHERE thread_id = %s
                 ORDER BY turn_id ASC, created_at ASC
             """
+            params: tuple = (thread_id,)
             if limit:
-                query += f" LIMIT {limit}"
+                query += " LIMIT %s"
+                params += (int(limit),)
 
-            cursor.execute(query, (thread_id,))
+            cursor.execute(query, params)
             events = cursor.fetchall()
 
             # 解析tags JSON
@@ -204,6 +566,48 @@ class DatabaseManager:
 
             return events
 
+    def get_thread_events_page(
+        self, thread_id: str, limit: int = 50, before_turn: Optional[int] = None
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        按 (thread_id, turn_id) 游标分页获取事件（走 idx_turn_id 索引，只扫描一页）
+
+        Args:
+            thread_id: 线程ID
+            limit: 每页事件数量
+            before_turn: 只返回 turn_id 小于它的事件；为空时返回最近一页
+
+        Returns:
+            (事件列表（按 turn_id 升序）, 是否还有更早的事件)
+        """
+        if not self.connection:
+            self.connect()
+
+        query = """
+            SELECT event_id, thread_id, speaker, content, turn_id, tags, created_at
+            FROM events
+            WHERE thread_id = %s
+        """
+        params: tuple = (thread_id,)
+        if before_turn is not None:
+            query += " AND turn_id < %s"
+            params += (int(before_turn),)
+        # 多取一条用来判断是否还有更早的一页
+        query += " ORDER BY turn_id DESC LIMIT %s"
+        params += (int(limit) + 1,)
+
+        with self.get_cursor() as cursor:
+            cursor.execute(query, params)
+            events = list(cursor.fetchall())
+
+        has_more = len(events) > limit
+        events = events[:limit]
+        events.reverse()
+        for event in events:
+            if event['tags']:
+                event['tags'] = json.loads(event['tags'])
+        return events, has_more
+
     def get_latest_threads(self, limit: int = 10) -> List[Dict[str, Any]]:
         """
         获取最新的线程列表
@@ -236,13 +640,16 @@ class DatabaseManager:
     def get_threads_by_user(self, user_id: Optional[str], limit: int = 50) -> List[Dict[str, Any]]:
         """
         获取指定用户的对话列表（游客传 None 返回空列表）
+        一次查询带出列表行需要的全部字段，不需要把会话整个加载进内存
 
         Args:
             user_id: 用户ID，None 表示游客
             limit: 限制返回的线程数量
 
         Returns:
-            List[Dict]: 线程列表，包含 thread_id, topic, user_id, updated_at 等
+            List[Dict]: 线程列表，包含 thread_id, topic, user_id, turn_id, created_at, updated_at,
+                        publication_status, rejection_reason，以及最后一条发言
+                        last_event_id / last_speaker / last_content / last_created_at（没有发言时为 None）
         """
         if not self.connection:
             self.connect()
@@ -252,16 +659,26 @@ class DatabaseManager:
             return []
 
         with self.get_cursor() as cursor:
+            # threads.turn_id 随每条发言 +1，就是最后一条发言的 turn_id（走 (thread_id, turn_id) 索引）
             cursor.execute("""
                 SELECT
-                    thread_id,
-                    topic,
-                    user_id,
-                    created_at,
-                    updated_at
-                FROM threads
-                WHERE user_id = %s
-                ORDER BY updated_at DESC
+                    t.thread_id,
+                    t.topic,
+                    t.user_id,
+                    t.turn_id,
+                    t.created_at,
+                    t.updated_at,
+                    COALESCE(`to`.publication_status, 'draft') as publication_status,
+                    COALESCE(`to`.rejection_reason, '') as rejection_reason,
+                    e.event_id as last_event_id,
+                    e.speaker as last_speaker,
+                    e.content as last_content,
+                    e.created_at as last_created_at
+                FROM threads t
+                LEFT JOIN thread_owners `to` ON t.thread_id = `to`.thread_id
+                LEFT JOIN events e ON e.thread_id = t.thread_id AND e.turn_id = t.turn_id
+                WHERE t.user_id = %s
+                ORDER BY t.updated_at DESC
                 LIMIT %s
             """, (user_id, limit))
 
@@ -0,0 +1,330 @@
+"""
+发言写后日志（write-behind journal）
+发言先写本地追加文件 + 内存缓冲并立即返回，后台线程按批写入 MySQL
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
+
+
+class EventJournal:
+    """
+    发言写后日志：
+    - append()：记录追加写入本地 JSONL 文件并放进内存缓冲，立即返回（不等数据库）；
+      缓冲达到上限（数据库长时间不可用）时直接抛异常，不阻塞调用方（append 在事件循环线程上调用）
+    - 后台 flusher 线程把缓冲里的记录按批交给 writer，一批一个事务（group commit）
+    - writer 失败时记录仍留在缓冲和文件里，退避后重试，不会丢发言；同一批连续失败 poison_threshold 次后
+      改为逐条写入，某条单独失败而紧随其后的记录能写入时，判定为坏记录，移到死信文件（path + ".dead"），不再阻塞后续写入
+    - 缓冲清空后截断文件；文件里已写库的记录积累到与未写库的一样多时，才在锁外压缩重写一次（均摊 O(1)）。
+      进程崩溃后，启动时文件里残留的记录会重新入队写库（writer 需要按 event_id 去重，保证重放幂等）
+    - discard() 会等正在写库的那一批完成，避免删除对话的同时它的发言又被写回数据库
+    - pending() 给读路径使用：还没写进数据库的发言也能被 tail/all 读到
+    """
+
+    def __init__(
+        self,
+        path: str,
+        writer: Callable[[List[Dict[str, Any]]], None],
+        flush_interval: float = 0.2,
+        max_batch: int = 200,
+        max_pending: int = 5000,
+        fsync: bool = False,
+        poison_threshold: int = 3,
+    ):
+        """
+        Args:
+            path: 日志文件路径
+            writer: 批量写库函数，参数为一批记录（按追加顺序），失败时抛异常
+            flush_interval: 攒批的等待时间（秒）
+            max_batch: 单批最多记录数
+            max_pending: 缓冲上限，超过时 append 直接失败
+            fsync: 每条记录是否 fsync（更安全，但每次追加多一次磁盘同步）
+            poison_threshold: 同一批连续失败多少次后改为逐条写入、隔离坏记录
+        """
+        self.path = path
+        self.dead_letter_path = path + ".dead"
+        self._writer = writer
+        self.flush_interval = flush_interval
+        self.max_batch = max(1, max_batch)
+        self.max_pending = max(self.max_batch, max_pending)
+        self.fsync = fsync
+        self.poison_threshold = max(1, poison_threshold)
+        self._pending: Deque[Dict[str, Any]] = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self._fh = None
+        self._file_records = 0  # 当前日志文件里的记录数（含已写库、尚未压缩掉的）
+        self._file_epoch = 0  # discard 重写文件时递增，进行中的压缩据此放弃
+        self._compacting: Optional[List[str]] = None  # 压缩期间新追加的行
+        self._writing_threads: Set[str] = set()  # 正在写库的那一批涉及的对话
+        self._stats = {
+            "appended": 0,
+            "flushed": 0,
+            "batches": 0,
+            "failures": 0,
+            "replayed": 0,
+            "rejected": 0,
+            "dead_letters": 0,
+            "compactions": 0,
+            "max_batch_size": 0,
+        }
+        self._last_error: Optional[str] = None
+
+    # ---------- 启动 / 重放 ----------
+    def start(self) -> int:
+        """重放残留记录并启动 flusher 线程，返回重放的记录数。"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        replayed = self._load()
+        self._file_records = replayed
+        self._fh = open(self.path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="event-journal-flusher", daemon=True)
+        self._thread.start()
+        if replayed:
+            print(f"[写后日志] 重放未写库的发言 {replayed} 条: {self.path}")
+        return replayed
+
+    def _load(self) -> int:
+        if not os.path.exists(self.path):
+            return 0
+        count = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    self._pending.append(json.loads(line))
+                    count += 1
+                except Exception:
+                    # 崩溃时写了一半的最后一行，丢弃
+                    print("[写后日志] 跳过损坏的日志行")
+        self._stats["replayed"] = count
+        return count
+
+    # ---------- 追加 ----------
+    def append(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._cond:
+            if self._closed:
+                raise Exception("写后日志已关闭")
+            if len(self._pending) >= self.max_pending:
+                # 不等待：调用方在事件循环线程上，数据库不可用时等待会卡住整个服务
+                self._stats["rejected"] += 1
+                raise Exception(f"写后日志积压已达上限（{self.max_pending} 条），数据库可能不可用")
+            self._fh.write(line)
+            self._fh.flush()
+            if self.fsync:
+                os.fsync(self._fh.fileno())
+            if self._compacting is not None:
+                self._compacting.append(line)
+            self._pending.append(record)
+            self._file_records += 1
+            self._stats["appended"] += 1
+            self._cond.notify_all()
+
+    # ---------- 读 ----------
+    def pending(self, thread_id: str) -> List[Dict[str, Any]]:
+        """某个 thread 尚未写库的记录（按追加顺序）。"""
+        with self._cond:
+            return [r for r in self._pending if r.get("thread_id") == thread_id]
+
+    def max_turn(self, thread_id: str) -> int:
+        with self._cond:
+            return max((int(r.get("turn_id") or 0) for r in self._pending if r.get("thread_id") == thread_id), default=0)
+
+    def discard(self, thread_id: str, timeout: float = 30.0):
+        """
+        删除会话时丢弃其未写库的记录。先等正在写库的那一批完成（其中可能有这个对话的发言），
+        调用方随后删除数据库里的数据，就不会有发言在删除之后才写进去。
+        重写文件时一并去掉已写库的旧记录，崩溃重放也不会把它们写回来。
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while thread_id in self._writing_threads:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    print(f"[写后日志] 等待写库批次完成超时，继续删除: {thread_id}")
+                    break
+                self._cond.wait(remaining)
+            before = len(self._pending)
+            self._pending = deque(r for r in self._pending if r.get("thread_id") != thread_id)
+            if len(self._pending) != before or self._file_records != len(self._pending):
+                self._rewrite_locked()
+
+    # ---------- 后台写库 ----------
+    def _run(self):
+        backoff = self.flush_interval
+        streak = 0  # 队首批次连续失败次数
+        isolate_left = 0  # 逐条写入模式下还剩多少条
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed and not self._pending:
+                    return
+            # 攒一小会儿，让同一时间段的多条发言合成一批（逐条隔离时不等待）
+            if not self._closed and not isolate_left:
+                time.sleep(self.flush_interval)
+            with self._cond:
+                size = 1 if isolate_left else self.max_batch
+                batch = [self._pending[i] for i in range(min(size, len(self._pending)))]
+                probe = self._pending[1] if isolate_left and len(self._pending) > 1 else None
+
+            error = self._write(batch)
+            if error is None:
+                backoff = self.flush_interval
+                streak = 0
+                isolate_left = max(0, isolate_left - 1)
+                self._flushed(batch)
+                self._maybe_compact()
+                continue
+
+            self._stats["failures"] += 1
+            self._last_error = error
+            streak += 1
+            if isolate_left and probe is not None:
+                # 单条失败：紧随其后的记录能写入，说明数据库正常、是这条记录本身有问题
+                if self._write([probe]) is None:
+                    self._quarantine(batch[0], error)
+                    self._flushed([probe])
+                    streak = 0
+                    isolate_left = max(0, isolate_left - 2)
+                    continue
+            elif not isolate_left and streak >= self.poison_threshold and len(batch) > 1:
+                print(f"[写后日志] 同一批连续失败 {streak} 次，改为逐条写入以隔离坏记录")
+                isolate_left = len(batch)
+                continue
+
+            print(f"[写后日志] 批量写库失败（{len(batch)} 条，{backoff:.1f}s 后重试）: {error}")
+            if self._closed:
+                return
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 10.0)
+
+    def _write(self, batch: List[Dict[str, Any]]) -> Optional[str]:
+        """调用 writer，返回错误信息（成功返回 None）；写库期间登记涉及的对话，供 discard 等待。"""
+        with self._cond:
+            self._writing_threads = {r.get("thread_id") for r in batch}
+        try:
+            self._writer(batch)
+            return None
+        except Exception as e:
+            return str(e)
+        finally:
+            with self._cond:
+                self._writing_threads = set()
+                self._cond.notify_all()
+
+    def _flushed(self, batch: List[Dict[str, Any]]):
+        ids = {r.get("event_id") for r in batch}
+        with self._cond:
+            self._pending = deque(r for r in self._pending if r.get("event_id") not in ids)
+            self._stats["flushed"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["max_batch_size"] = max(self._stats["max_batch_size"], len(batch))
+            self._last_error = None
+            if not self._pending:
+                self._fh.truncate(0)
+                self._file_records = 0
+            self._cond.notify_all()
+
+    def _quarantine(self, record: Dict[str, Any], error: str):
+        """坏记录移到死信文件，从缓冲里去掉（文件里的旧行在下次压缩/截断时清除）。"""
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"record": record, "error": error, "at": time.time()}, ensure_ascii=False, default=str) + "\n")
+        with self._cond:
+            self._pending = deque(r for r in self._pending if r.get("event_id") != record.get("event_id"))
+            self._stats["dead_letters"] += 1
+        print(f"[写后日志] 记录 {record.get('event_id')} 多次写库失败，已移到死信文件 {self.dead_letter_path}: {error}")
+
+    def _maybe_compact(self):
+        """
+        已写库的旧记录和未写库的一样多时压缩一次：快照在锁外写临时文件，
+        锁内只补写快照之后追加的行再替换，append 不会等整份文件重写。
+        """
+        with self._cond:
+            stale = self._file_records - len(self._pending)
+            if stale < max(self.max_batch, len(self._pending)):
+                return
+            snapshot = list(self._pending)
+            epoch = self._file_epoch
+            self._compacting = []
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                for r in snapshot:
+                    f.write(json.dumps(r, ensure_ascii=False, default=str) + "\n")
+                f.flush()
+                with self._cond:
+                    if self._file_epoch != epoch:
+                        # 压缩期间 discard 已经重写过文件（可能删除了快照里的对话），放弃这次压缩
+                        return
+                    for line in self._compacting:
+                        f.write(line)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    self._fh.close()
+                    os.replace(tmp, self.path)
+                    self._fh = open(self.path, "a", encoding="utf-8")
+                    self._file_records = len(snapshot) + len(self._compacting)
+                    self._stats["compactions"] += 1
+        finally:
+            with self._cond:
+                self._compacting = None
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _rewrite_locked(self):
+        """用仍未写库的记录重写日志文件（已写库的部分不再保留）。"""
+        tmp = self.path + ".discard.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for r in self._pending:
+                f.write(json.dumps(r, ensure_ascii=False, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._fh.close()
+        os.replace(tmp, self.path)
+        self._fh = open(self.path, "a", encoding="utf-8")
+        self._file_records = len(self._pending)
+        self._file_epoch += 1
+        if self._compacting is not None:
+            # 进行中的压缩会放弃，已补进新文件的行不必再记
+            self._compacting = []
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """等待缓冲清空（关闭服务、删除数据前调用），返回是否全部写入。"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify_all()
+            while self._pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 10.0):
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._fh is not None:
+            self._fh.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                **self._stats,
+                "pending": len(self._pending),
+                "file_records": self._file_records,
+                "avg_batch_size": round(self._stats["flushed"] / self._stats["batches"], 2) if self._stats["batches"] else 0.0,
+                "last_error": self._last_error,
+                "path": self.path,
+            }
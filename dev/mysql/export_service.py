@@ -0,0 +1,194 @@
+"""
+对话批量导出
+按批读取对话和发言，逐条写入 ZIP 条目并立即交给响应流，内存占用与对话数量无关
+"""
+
+import json
+import zipfile
+from datetime import datetime
+from typing import Any, Dict, Iterator, List
+
+from .db_utils import DatabaseManager
+
+
+# 支持的导出格式 → 文件扩展名
+EXPORT_FORMATS = {"txt": "txt", "md": "md", "markdown": "md", "json": "json"}
+
+# 每批读取的对话数
+THREAD_BATCH_SIZE = 100
+# 每批读取的发言数
+EVENT_BATCH_SIZE = 500
+# 缓冲超过这么多字节就交给响应流
+FLUSH_BYTES = 64 * 1024
+
+_UNSAFE_FILENAME_CHARS = '/\\:*?"<>|\r\n\t'
+
+
+class _ChunkSink:
+    """
+    ZipFile 的输出目标：只支持 write，不支持 seek/tell，
+    ZipFile 因此进入流式模式（条目大小写在数据描述符里），写入的字节由 drain() 取走。
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self.size = 0
+
+    def write(self, data) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+            self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        self.size = 0
+        return data
+
+
+def _fmt_time(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return str(value) if value else ''
+
+
+def safe_filename(name: str) -> str:
+    for ch in _UNSAFE_FILENAME_CHARS:
+        name = name.replace(ch, '_')
+    return name.strip() or "对话"
+
+
+class ChatExporter:
+    """
+    流式导出某个用户的全部对话为 ZIP：
+    - 对话按 thread_id 游标分批读取，每个对话的发言按 turn_id 游标分批读取，每批单独借用连接
+    - 每个对话一个 ZIP 条目，发言边读边压缩，累计到 FLUSH_BYTES 就 yield 给 StreamingResponse
+    - 支持 txt / md / json 三种格式
+    """
+
+    def __init__(self, db_manager: DatabaseManager, user_id: str, fmt: str = "txt"):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的导出格式: {fmt}")
+        self.db_manager = db_manager
+        self.user_id = user_id
+        self.fmt = "md" if fmt == "markdown" else fmt
+        self.thread_count = 0
+        self.event_count = 0
+
+    # ---------- 数据读取 ----------
+    def has_threads(self) -> bool:
+        with self.db_manager.get_cursor() as cursor:
+            cursor.execute("SELECT 1 FROM threads WHERE user_id = %s LIMIT 1", (self.user_id,))
+            return cursor.fetchone() is not None
+
+    def _iter_threads(self) -> Iterator[Dict[str, Any]]:
+        last = ""
+        while True:
+            with self.db_manager.get_cursor() as cursor:
+                cursor.execute("""
+                    SELECT thread_id, topic, created_at, updated_at
+                    FROM threads
+                    WHERE user_id = %s AND thread_id > %s
+                    ORDER BY thread_id
+                    LIMIT %s
+                """, (self.user_id, last, THREAD_BATCH_SIZE))
+                rows = cursor.fetchall()
+            yield from rows
+            if len(rows) < THREAD_BATCH_SIZE:
+                return
+            last = rows[-1]["thread_id"]
+
+    def _iter_events(self, thread_id: str) -> Iterator[Dict[str, Any]]:
+        last_turn = -1
+        while True:
+            with self.db_manager.get_cursor() as cursor:
+                cursor.execute("""
+                    SELECT speaker, content, turn_id, created_at
+                    FROM events
+                    WHERE thread_id = %s AND turn_id > %s
+                    ORDER BY turn_id
+                    LIMIT %s
+                """, (thread_id, last_turn, EVENT_BATCH_SIZE))
+                rows = cursor.fetchall()
+            yield from rows
+            if len(rows) < EVENT_BATCH_SIZE:
+                return
+            last_turn = rows[-1]["turn_id"]
+
+    # ---------- 格式化 ----------
+    def _header(self, thread: Dict[str, Any]) -> str:
+        if self.fmt == "json":
+            meta = {
+                "thread_id": thread["thread_id"],
+                "topic": thread["topic"],
+                "created_at": _fmt_time(thread.get("created_at")),
+                "updated_at": _fmt_time(thread.get("updated_at")),
+            }
+            # 去掉结尾的 "}"，后面接 events 数组
+            return json.dumps(meta, ensure_ascii=False, indent=2)[:-2] + ',\n  "events": ['
+        if self.fmt == "md":
+            return (
+                f"# {thread['topic']}\n\n"
+                f"- 创建时间: {_fmt_time(thread.get('created_at'))}\n"
+                f"- 更新时间: {_fmt_time(thread.get('updated_at'))}\n"
+                f"- 对话ID: {thread['thread_id']}\n\n"
+                "---\n\n"
+            )
+        return "\n".join([
+            f"对话主题: {thread['topic']}",
+            f"创建时间: {_fmt_time(thread.get('created_at'))}",
+            f"更新时间: {_fmt_time(thread.get('updated_at'))}",
+            f"对话ID: {thread['thread_id']}",
+            "",
+            "=== 对话记录 ===",
+            "",
+            "",
+        ])
+
+    def _event(self, event: Dict[str, Any], first: bool) -> str:
+        timestamp = _fmt_time(event.get("created_at"))
+        if self.fmt == "json":
+            item = {
+                "turn_id": event["turn_id"],
+                "speaker": event["speaker"],
+                "content": event["content"],
+                "created_at": timestamp,
+            }
+            return ("\n    " if first else ",\n    ") + json.dumps(item, ensure_ascii=False)
+        if self.fmt == "md":
+            return f"**{event['speaker']}** · {timestamp}\n\n{event['content']}\n\n"
+        return f"[{timestamp}] {event['speaker']}:\n{event['content']}\n\n"
+
+    def _footer(self) -> str:
+        return "\n  ]\n}\n" if self.fmt == "json" else ""
+
+    # ---------- ZIP 流 ----------
+    def iter_zip(self) -> Iterator[bytes]:
+        """生成 ZIP 字节流（同步生成器，StreamingResponse 会放到线程池里迭代）"""
+        sink = _ChunkSink()
+        ext = EXPORT_FORMATS[self.fmt]
+        with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zf:
+            for thread in self._iter_threads():
+                name = safe_filename(f"{(thread['topic'] or '对话')[:50]}_{thread['thread_id'][:8]}.{ext}")
+                with zf.open(name, "w") as entry:
+                    entry.write(self._header(thread).encode("utf-8"))
+                    first = True
+                    for event in self._iter_events(thread["thread_id"]):
+                        entry.write(self._event(event, first).encode("utf-8"))
+                        first = False
+                        self.event_count += 1
+                        if sink.size >= FLUSH_BYTES:
+                            yield sink.drain()
+                    entry.write(self._footer().encode("utf-8"))
+                self.thread_count += 1
+                if sink.size >= FLUSH_BYTES:
+                    yield sink.drain()
+        # 关闭 ZipFile 时写入中央目录
+        tail = sink.drain()
+        if tail:
+            yield tail
+        print(f"[导出] 用户 {self.user_id} 导出完成: {self.thread_count} 个对话，{self.event_count} 条发言")
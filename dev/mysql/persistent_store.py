@@ -3,13 +3,36 @@
 替代现有的内存存储，提供数据库持久化功能
 """
 
+import atexit
 import json
+import os
+import threading
+import time
 import uuid
 from typing import Any, Dict, List, Optional, Sequence
 from datetime import datetime
 
 from .db_utils import DatabaseManager, get_db_manager
 from .content_analyzer import get_content_analyzer, ExtractedContent
+from .event_journal import EventJournal
+from .analysis_pipeline import AnalysisPipeline
+
+
+# 写后日志默认位置（可用 EVENT_JOURNAL_PATH 覆盖，置空表示关闭）
+DEFAULT_JOURNAL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'journal', 'events.jsonl')
+# 数据库被标记为不可用后，后台每隔这么多秒探测一次（DB_RECOVERY_INTERVAL 覆盖）
+DEFAULT_RECOVERY_INTERVAL = 5.0
+
+
+class HistoryUnavailableError(RuntimeError):
+    """
+    查不到数据库里的发言历史（连接失败、查询重试后仍出错，或数据库已被标记为不可用）。
+    pending 是写后日志里尚未写库的发言：调用方可以临时用它凑合，但它不是完整历史，不能缓存。
+    """
+
+    def __init__(self, message: str, pending: Optional[List[Dict[str, Any]]] = None):
+        super().__init__(message)
+        self.pending = pending or []
 
 
 class PersistentHistoryStore:
@@ -22,6 +45,14 @@ class PersistentHistoryStore:
         self.db_manager = db_manager or get_db_manager()
         self.content_analyzer = get_content_analyzer()
         self.db_available = False  # 跟踪数据库是否可用
+        self._append_listeners = []  # 发言成功落库后的回调 fn(thread_id, event)
+        # 进程内 turn_id 分配器：每个 thread 只在第一次追加时查一次 MAX(turn_id)
+        # （假设同一 thread 只由一个服务进程写入）
+        self._turn_seq: Dict[str, int] = {}
+        self._seq_lock = threading.Lock()
+        self._stats = {"appends": 0, "seq_seeds": 0, "statements": 0, "read_retries": 0, "recoveries": 0}
+        self.recovery_interval = float(os.getenv('DB_RECOVERY_INTERVAL', DEFAULT_RECOVERY_INTERVAL))
+        self._recovery: Optional[threading.Thread] = None
 
         # 尝试连接数据库
         try:
@@ -34,85 +65,240 @@ class PersistentHistoryStore:
             print(f"[持久化存储] 数据库初始化失败: {e}，将使用降级模式（仅内存）")
             self.db_available = False
 
-    def _ensure_thread_exists(self, thread_id: str, topic: str = "未命名话题"):
-        """确保线程在数据库中存在"""
-        if not self.db_available:
-            return
-
-        if not self.db_manager.connection:
-            if not self.db_manager.connect():
-                self.db_available = False
+        # 写后日志：发言先落本地日志立即返回，后台批量写库（EVENT_JOURNAL_PATH 置空则同步写库）
+        self.journal: Optional[EventJournal] = None
+        journal_path = os.getenv('EVENT_JOURNAL_PATH', DEFAULT_JOURNAL_PATH)
+        if journal_path:
+            try:
+                self.journal = EventJournal(
+                    journal_path,
+                    self._write_batch,
+                    flush_interval=float(os.getenv('EVENT_JOURNAL_FLUSH_INTERVAL', 0.2)),
+                    fsync=os.getenv('EVENT_JOURNAL_FSYNC', 'false').lower() == 'true',
+                )
+                self.journal.start()
+                atexit.register(self.journal.close)
+            except Exception as e:
+                print(f"[持久化存储] 写后日志不可用，改为同步写库: {e}")
+                self.journal = None
+
+        # 内容分析流水线：服务启动时 start_analysis() 后，发言分析改由后台工作进程完成
+        # （ANALYSIS_WORKERS=0 表示始终在请求线程里同步分析）
+        self.analysis: Optional[AnalysisPipeline] = None
+        workers = int(os.getenv('ANALYSIS_WORKERS', 2))
+        if workers > 0:
+            self.analysis = AnalysisPipeline(
+                self._write_analysis,
+                workers=workers,
+                max_queue=int(os.getenv('ANALYSIS_QUEUE_SIZE', 1000)),
+                batch_size=int(os.getenv('ANALYSIS_BATCH_SIZE', 50)),
+                max_retries=int(os.getenv('ANALYSIS_MAX_RETRIES', 5)),
+            )
+
+    def _mark_unavailable(self):
+        """
+        标记数据库不可用（写入失败等），并启动后台探测线程：
+        恢复后重新开放读写，不必等下一次写后日志落库（同步写库模式下根本没有这一步）。
+        """
+        self.db_available = False
+        with self._seq_lock:
+            if self._recovery is not None and self._recovery.is_alive():
                 return
-
+            self._recovery = threading.Thread(target=self._recover, name="db-recovery", daemon=True)
+            self._recovery.start()
+
+    def _recover(self):
+        while not self.db_available:
+            time.sleep(self.recovery_interval)
+            try:
+                if not self.db_manager.connection and not self.db_manager.connect():
+                    continue
+                with self.db_manager.get_cursor() as cursor:
+                    cursor.execute("SELECT 1")
+            except Exception:
+                continue
+            self.db_available = True
+            self._stats["recoveries"] += 1
+            print("[持久化存储] 数据库已恢复")
+
+    def start_analysis(self) -> bool:
+        """启动后台分析流水线（服务启动时调用；启动前的发言仍在请求线程里分析）"""
+        if self.analysis is None or self.analysis.running:
+            return False
         try:
-            with self.db_manager.get_cursor() as cursor:
-                cursor.execute("SELECT thread_id FROM threads WHERE thread_id = %s", (thread_id,))
-                if not cursor.fetchone():
-                    cursor.execute("""
-                        INSERT INTO threads (thread_id, topic, turn_id, created_at, updated_at)
-                        VALUES (%s, %s, %s, %s, %s)
-                    """, (thread_id, topic, 0, datetime.now(), datetime.now()))
-                    print(f"[持久化存储] 新线程已创建: {thread_id}")
+            self.analysis.start()
         except Exception as e:
-            print(f"[持久化存储] 创建线程失败: {e}")
-            self.db_available = False
-
-    def _update_thread_stats(self, thread_id: str, speaker: str, content: str):
-        """更新线程统计信息"""
-        if not self.db_available:
-            return
-
-        if not self.db_manager.connection:
-            if not self.db_manager.connect():
-                self.db_available = False
-                return
-
-        try:
-            with self.db_manager.get_cursor() as cursor:
-                # 更新线程的最后发言者和时间
-                cursor.execute("""
-                    UPDATE threads
-                    SET turn_id = turn_id + 1,
-                        last_speaker = %s,
-                        updated_at = %s
-                    WHERE thread_id = %s
-                """, (speaker, datetime.now(), thread_id))
-
-        except Exception as e:
-            print(f"[持久化存储] 更新统计失败: {e}")
-            self.db_available = False
-
-    def _save_analysis_results(self, thread_id: str, event_id: str, extracted: ExtractedContent):
-        """保存分析结果"""
-        if not self.db_available:
-            return
-
+            print(f"[持久化存储] 分析流水线启动失败，继续同步分析: {e}")
+            self.analysis = None
+            return False
+        atexit.register(self._close_analysis)
+        return True
+
+    def _close_analysis(self):
+        # 先让写后日志落库，剩余的分析结果才能找到对应的发言
+        if self.journal is not None:
+            self.journal.flush()
+        self.analysis.close()
+
+    def analysis_stats(self) -> Optional[Dict[str, Any]]:
+        return self.analysis.stats() if self.analysis is not None else None
+
+    def add_append_listener(self, fn):
+        """注册发言追加回调 fn(thread_id, event)，只在成功落库后触发。"""
+        self._append_listeners.append(fn)
+
+    def _notify_append(self, thread_id: str, ev: Dict[str, Any]):
+        for fn in self._append_listeners:
+            try:
+                fn(thread_id, ev)
+            except Exception as e:
+                print(f"[持久化存储] 追加回调失败: {e}")
+
+    def _allocate_turn(self, thread_id: str, cursor=None) -> int:
+        """
+        分配下一个 turn_id；缓存未命中时查一次 MAX(turn_id) 作为起点
+        （cursor 给定时在该事务里查，否则单独查；写后日志里尚未写库的发言也计入起点）。
+        """
+        with self._seq_lock:
+            seq = self._turn_seq.get(thread_id)
+        if seq is None:
+            base, ok = self._query_max_turn(thread_id, cursor)
+            if self.journal is not None:
+                base = max(base, self.journal.max_turn(thread_id))
+            if not ok:
+                # 数据库暂时不可用：不缓存起点，下次再查
+                return base + 1
+            with self._seq_lock:
+                # 查询期间可能已有其它线程完成了初始化
+                seq = self._turn_seq.setdefault(thread_id, base)
+        with self._seq_lock:
+            seq = self._turn_seq.get(thread_id, seq) + 1
+            self._turn_seq[thread_id] = seq
+        return seq
+
+    def _query_max_turn(self, thread_id: str, cursor=None):
+        sql = "SELECT MAX(turn_id) as max_turn FROM events WHERE thread_id = %s"
         try:
-            with self.db_manager.get_cursor() as cursor:
-                # 保存共识到consensus表
-                for content in extracted.consensus:
-                    cursor.execute("""
-                        INSERT INTO consensus (thread_id, content)
-                        VALUES (%s, %s)
-                    """, (thread_id, content))
-
-                # 保存分歧到disagreements表
-                for content in extracted.disagreements:
-                    cursor.execute("""
-                        INSERT INTO disagreements (thread_id, content)
-                        VALUES (%s, %s)
-                    """, (thread_id, content))
-
-                # 保存问题到open_questions表
-                for content in extracted.open_questions:
-                    cursor.execute("""
-                        INSERT INTO open_questions (thread_id, content)
-                        VALUES (%s, %s)
-                    """, (thread_id, content))
-
+            if cursor is not None:
+                cursor.execute(sql, (thread_id,))
+                result = cursor.fetchone()
+            else:
+                with self.db_manager.get_cursor() as own:
+                    own.execute(sql, (thread_id,))
+                    result = own.fetchone()
         except Exception as e:
-            print(f"[持久化存储] 保存分析结果失败: {e}")
-            self.db_available = False
+            if cursor is not None:
+                raise
+            print(f"[持久化存储] 获取turn_id起点失败: {e}")
+            return 0, False
+        self._stats["seq_seeds"] += 1
+        self._stats["statements"] += 1
+        return ((result['max_turn'] or 0) if result else 0), True
+
+    def _invalidate_turn(self, thread_id: str):
+        """写入失败或数据被外部清除后，下次追加重新从数据库取起点。"""
+        with self._seq_lock:
+            self._turn_seq.pop(thread_id, None)
+
+    def _insert_records(self, cursor, records: List[Dict[str, Any]]) -> int:
+        """
+        在给定事务里写入一批发言记录，返回执行的语句数：
+          - threads：不存在则创建，存在则 turn_id+1 / 更新最后发言者（upsert，替代先查后插 + 单独的 UPDATE）
+          - events：插入发言
+          - consensus / disagreements / open_questions：各一条 executemany
+        """
+        cursor.executemany("""
+            INSERT INTO threads (thread_id, topic, turn_id, last_speaker, created_at, updated_at)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                turn_id = turn_id + 1,
+                last_speaker = VALUES(last_speaker),
+                updated_at = VALUES(updated_at)
+        """, [
+            (r['thread_id'], r['topic'], 1, r['speaker'], r['created_at'], r['created_at'])
+            for r in records
+        ])
+        cursor.executemany("""
+            INSERT INTO events (event_id, thread_id, speaker, content, turn_id, tags, created_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, [
+            (r['event_id'], r['thread_id'], r['speaker'], r['content'], r['turn_id'], r['tags'], r['created_at'])
+            for r in records
+        ])
+        statements = 2
+
+        for table in ("consensus", "disagreements", "open_questions"):
+            rows = [(r['thread_id'], item) for r in records for item in r.get(table) or []]
+            if rows:
+                cursor.executemany(f"INSERT INTO {table} (thread_id, content) VALUES (%s, %s)", rows)
+                statements += 1
+        return statements
+
+    def _write_analysis(self, results: List[Dict[str, Any]]) -> List[str]:
+        """
+        分析流水线的批量写库：一批一个事务，把元数据写回发言的 tags，并写入共识 / 分歧 / 开放问题。
+        返回 events 里还查不到的 event_id（仍在写后日志里，或会话已被删除），由流水线稍后重试。
+        """
+        with self.db_manager.get_cursor() as cursor:
+            placeholders = ", ".join(["%s"] * len(results))
+            cursor.execute(
+                f"SELECT event_id FROM events WHERE event_id IN ({placeholders})",
+                [r['event_id'] for r in results],
+            )
+            present = {row['event_id'] for row in cursor.fetchall()}
+            rows = [r for r in results if r['event_id'] in present]
+            if rows:
+                cursor.executemany("UPDATE events SET tags = %s WHERE event_id = %s", [
+                    (json.dumps({'tags': r.get('tags') or [], 'metadata': r['metadata']}, ensure_ascii=False), r['event_id'])
+                    for r in rows
+                ])
+                for table in ("consensus", "disagreements", "open_questions"):
+                    items = [(r['thread_id'], item) for r in rows for item in r.get(table) or []]
+                    if items:
+                        cursor.executemany(f"INSERT INTO {table} (thread_id, content) VALUES (%s, %s)", items)
+        return [r['event_id'] for r in results if r['event_id'] not in present]
+
+    def _write_event(self, record: Dict[str, Any]) -> int:
+        """同步写入一条发言（未启用写后日志时），在同一事务里分配 turn_id，返回 turn_id。"""
+        with self.db_manager.get_cursor() as cursor:
+            record['turn_id'] = self._allocate_turn(record['thread_id'], cursor)
+            statements = self._insert_records(cursor, [record])
+
+        self._stats["appends"] += 1
+        self._stats["statements"] += statements
+        return record['turn_id']
+
+    def _write_batch(self, records: List[Dict[str, Any]]):
+        """
+        写后日志的批量写库（group commit）：一批记录一个事务。
+        按 event_id 跳过已经写入的记录，崩溃后重放是幂等的。
+        """
+        rows = [dict(r, created_at=datetime.fromisoformat(r['created_at'])) for r in records]
+        with self.db_manager.get_cursor() as cursor:
+            placeholders = ", ".join(["%s"] * len(rows))
+            cursor.execute(
+                f"SELECT event_id FROM events WHERE event_id IN ({placeholders})",
+                [r['event_id'] for r in rows],
+            )
+            done = {row['event_id'] for row in cursor.fetchall()}
+            fresh = [r for r in rows if r['event_id'] not in done]
+            statements = 1 + (self._insert_records(cursor, fresh) if fresh else 0)
+
+        self._stats["appends"] += len(fresh)
+        self._stats["statements"] += statements
+        # 写库恢复正常：重新开放读路径
+        self.db_available = True
+
+    def append_stats(self) -> Dict[str, Any]:
+        """追加路径统计：平均每次追加执行的 SQL 语句数、turn_id 起点查询次数、写后日志状态。"""
+        appends = self._stats["appends"]
+        return {
+            **self._stats,
+            "cached_threads": len(self._turn_seq),
+            "statements_per_append": round(self._stats["statements"] / appends, 2) if appends else 0.0,
+            "journal": self.journal.stats() if self.journal is not None else None,
+            "analysis": self.analysis_stats(),
+        }
 
     def append(
         self,
@@ -120,12 +306,17 @@ class PersistentHistoryStore:
         speaker: str,
         content: str,
         tags: Optional[Sequence[str]] = None,
-        topic: Optional[str] = None
+        topic: Optional[str] = None,
+        event_id: Optional[str] = None
     ) -> Dict[str, Any]:
-        """添加事件到数据库"""
-        if not self.db_available:
+        """
+        添加事件：启用写后日志时先写本地日志立即返回，由后台线程批量写库；
+        否则同步写库。
+        event_id 可由调用方预先分配（例如流式发言开始时已推给前端的 message_id），缺省时新生成。
+        """
+        if self.journal is None and not self.db_available:
             # 数据库不可用，返回虚拟事件（降级模式）
-            event_id = uuid.uuid4().hex
+            event_id = event_id or uuid.uuid4().hex
             return {
                 "event_id": event_id,
                 "speaker": speaker,
@@ -136,197 +327,247 @@ class PersistentHistoryStore:
                 "warning": "数据库不可用，数据未持久化"
             }
 
-        if not self.db_manager.connection:
-            if not self.db_manager.connect():
-                self.db_available = False
-                # 连接失败，返回虚拟事件
-                event_id = uuid.uuid4().hex
+        # 创建事件
+        event_id = event_id or uuid.uuid4().hex
+
+        # 内容分析：交给后台流水线（元数据和共识/分歧/问题稍后批量写回）；
+        # 流水线未启动时在这里分析，随发言一起写入。流水线队列满时不在这里补做
+        # （append 在事件循环上调用），这条发言不做内容分析，计入流水线的 overflow
+        tag_list = list(tags) if tags else []
+        extracted: Optional[ExtractedContent] = None
+        if self.analysis is not None and self.analysis.running:
+            self.analysis.submit({
+                "event_id": event_id,
+                "thread_id": thread_id,
+                "speaker": speaker,
+                "content": content,
+                "tags": tag_list,
+            })
+            tags_dict = {'tags': tag_list}
+        else:
+            extracted, content_metadata = self.content_analyzer.analyze(content, speaker)
+            tags_dict = {'tags': tag_list, 'metadata': content_metadata}
+
+        record = {
+            "event_id": event_id,
+            "thread_id": thread_id,
+            "topic": topic or "未命名话题",
+            "speaker": speaker,
+            "content": content,
+            "turn_id": 0,
+            "tags": json.dumps(tags_dict, ensure_ascii=False),
+            "created_at": datetime.now(),
+            "consensus": list(extracted.consensus) if extracted else [],
+            "disagreements": list(extracted.disagreements) if extracted else [],
+            "open_questions": list(extracted.open_questions) if extracted else [],
+        }
+
+        if self.journal is not None:
+            record['turn_id'] = self._allocate_turn(thread_id)
+            record['created_at'] = record['created_at'].isoformat()
+            try:
+                self.journal.append(record)
+            except Exception as e:
+                print(f"[持久化存储] 写入写后日志失败: {e}")
                 return {
                     "event_id": event_id,
                     "speaker": speaker,
                     "content": content.strip(),
-                    "turn_id": 0,
+                    "turn_id": record['turn_id'],
                     "tags": list(tags) if tags else [],
-                    "created_at": datetime.now().isoformat(),
-                    "warning": "数据库连接失败，数据未持久化"
+                    "created_at": record['created_at'],
+                    "error": str(e)
                 }
-
-        # 确保线程存在
-        self._ensure_thread_exists(thread_id, topic or "未命名话题")
-
-        # 获取下一个turn_id
-        try:
-            with self.db_manager.get_cursor() as cursor:
-                cursor.execute("SELECT MAX(turn_id) as max_turn FROM events WHERE thread_id = %s", (thread_id,))
-                result = cursor.fetchone()
-                turn_id = (result['max_turn'] or 0) + 1
-        except Exception as e:
-            print(f"[持久化存储] 获取turn_id失败: {e}")
-            turn_id = 1
-            self.db_available = False
-
-        # 创建事件
-        event_id = uuid.uuid4().hex
-        tags_json = json.dumps(list(tags) if tags else [], ensure_ascii=False)
-
-        # 添加内容分析元数据
-        content_metadata = self.content_analyzer.get_content_metadata(content, speaker)
-        tags_dict = json.loads(tags_json) if tags_json else []
-        if isinstance(tags_dict, list):
-            # 如果tags是列表，转换为字典格式
-            tags_dict = {'tags': tags_dict, 'metadata': content_metadata}
         else:
-            tags_dict.update({'metadata': content_metadata})
-
-        try:
-            with self.db_manager.get_cursor() as cursor:
-                cursor.execute("""
-                    INSERT INTO events (event_id, thread_id, speaker, content, turn_id, tags, created_at)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """, (event_id, thread_id, speaker, content, turn_id, json.dumps(tags_dict, ensure_ascii=False), datetime.now()))
-
-            # 更新线程统计
-            self._update_thread_stats(thread_id, speaker, content)
-
-            # 分析内容并保存结果
-            extracted = self.content_analyzer.extract_content(content)
-            self._save_analysis_results(thread_id, event_id, extracted)
-
-            ev = {
-                "event_id": event_id,
-                "speaker": speaker,
-                "content": content.strip(),
-                "turn_id": turn_id,
-                "tags": list(tags) if tags else [],
-                "created_at": datetime.now().isoformat(),
-                "analysis": extracted
-            }
-
-            print(f"[持久化存储] 事件已保存: {event_id}, Speaker: {speaker}, Turn: {turn_id}")
-            return ev
-
-        except Exception as e:
-            print(f"[持久化存储] 保存事件失败: {e}")
-            self.db_available = False
-            # 返回一个虚拟事件以保持兼容性
-            return {
-                "event_id": event_id,
-                "speaker": speaker,
-                "content": content.strip(),
-                "turn_id": turn_id,
-                "tags": list(tags) if tags else [],
-                "created_at": datetime.now().isoformat(),
-                "error": str(e)
-            }
+            # 一个事务写完事件、线程统计和分析结果；失败时重置 turn_id 缓存重试一次
+            # （例如线程被其它途径删除、或多进程写入导致 turn_id 冲突）
+            error: Optional[Exception] = None
+            for _ in range(2):
+                try:
+                    self._write_event(record)
+                    error = None
+                    break
+                except Exception as e:
+                    error = e
+                    self._invalidate_turn(thread_id)
+
+            if error is not None:
+                print(f"[持久化存储] 保存事件失败: {error}")
+                self._mark_unavailable()
+                # 返回一个虚拟事件以保持兼容性
+                return {
+                    "event_id": event_id,
+                    "speaker": speaker,
+                    "content": content.strip(),
+                    "turn_id": record['turn_id'],
+                    "tags": list(tags) if tags else [],
+                    "created_at": datetime.now().isoformat(),
+                    "error": str(error)
+                }
 
-    def record_user(self, thread_id: str, content: str, tags: Optional[Sequence[str]] = None, topic: Optional[str] = None):
+        ev = {
+            "event_id": event_id,
+            "speaker": speaker,
+            "content": content.strip(),
+            "turn_id": record['turn_id'],
+            "tags": list(tags) if tags else [],
+            "created_at": datetime.now().isoformat(),
+            "analysis": extracted
+        }
+
+        print(f"[持久化存储] 事件已记录: {event_id}, Speaker: {speaker}, Turn: {record['turn_id']}")
+        self._notify_append(thread_id, ev)
+        return ev
+
+    def has_pending(self, thread_id: str) -> bool:
+        """写后日志里是否还有这个对话未写库的发言（此时 threads 行可能尚未创建）。"""
+        return self.journal is not None and bool(self.journal.pending(thread_id))
+
+    def pending_events(self, thread_id: str) -> List[Dict[str, Any]]:
+        """写后日志里尚未写库的发言，转换成与查询结果一致的格式。"""
+        if self.journal is None:
+            return []
+        out = []
+        for r in self.journal.pending(thread_id):
+            try:
+                tags = json.loads(r.get('tags') or '[]')
+            except Exception:
+                tags = []
+            out.append({
+                "event_id": r['event_id'],
+                "speaker": r['speaker'],
+                "content": r['content'],
+                "turn_id": r['turn_id'],
+                "tags": tags,
+                "created_at": datetime.fromisoformat(r['created_at']),
+            })
+        return out
+
+    @staticmethod
+    def _merge_pending(events: List[Dict[str, Any]], pending: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """合并数据库结果与未写库的发言（按 event_id 去重、按 turn_id 升序）。"""
+        if not pending:
+            return events
+        seen = {ev['event_id'] for ev in events}
+        merged = list(events) + [ev for ev in pending if ev['event_id'] not in seen]
+        return sorted(merged, key=lambda x: x['turn_id'])
+
+    def record_user(self, thread_id: str, content: str, tags: Optional[Sequence[str]] = None, topic: Optional[str] = None,
+                    event_id: Optional[str] = None):
         """记录用户发言"""
-        return self.append(thread_id, "用户", content, tags, topic)
+        return self.append(thread_id, "用户", content, tags, topic, event_id)
 
-    def record_speaker(self, thread_id: str, speaker: str, content: str, tags: Optional[Sequence[str]] = None, topic: Optional[str] = None):
+    def record_speaker(self, thread_id: str, speaker: str, content: str, tags: Optional[Sequence[str]] = None, topic: Optional[str] = None,
+                       event_id: Optional[str] = None):
         """记录智能体发言"""
-        return self.append(thread_id, speaker, content, tags, topic)
-
-    def tail(self, thread_id: str, n: int = 10) -> List[Dict[str, Any]]:
-        """获取最后n个事件"""
+        return self.append(thread_id, speaker, content, tags, topic, event_id)
+
+    def _query_events(self, sql: str, params: tuple, pending: List[Dict[str, Any]], what: str) -> List[Dict[str, Any]]:
+        """
+        查询发言并解析 tags。偶发错误（连接被回收等）重试一次；仍失败时抛出 HistoryUnavailableError，
+        而不是把写后日志里的部分当成完整历史返回（会被会话缓存、违规摘要等缓存下来）。
+        单次读失败不会把数据库标记为不可用。
+        """
         if not self.db_available:
-            return []
+            raise HistoryUnavailableError("数据库不可用", pending)
+
+        error: Optional[Exception] = None
+        for attempt in range(2):
+            if attempt:
+                self._stats["read_retries"] += 1
+            try:
+                if not self.db_manager.connection and not self.db_manager.connect():
+                    raise ConnectionError("数据库连接失败")
+                with self.db_manager.get_cursor() as cursor:
+                    cursor.execute(sql, params)
+                    events = cursor.fetchall()
+                break
+            except Exception as e:
+                error = e
+        else:
+            print(f"[持久化存储] {what}失败: {error}")
+            raise HistoryUnavailableError(f"{what}失败: {error}", pending)
 
-        if not self.db_manager.connection:
-            if not self.db_manager.connect():
-                self.db_available = False
-                return []
+        for ev in events:
+            if ev['tags']:
+                try:
+                    ev['tags'] = json.loads(ev['tags'])
+                except:
+                    ev['tags'] = []
+        return events
 
-        try:
-            with self.db_manager.get_cursor() as cursor:
-                cursor.execute("""
-                    SELECT event_id, speaker, content, turn_id, tags, created_at
-                    FROM events
-                    WHERE thread_id = %s
-                    ORDER BY turn_id DESC
-                    LIMIT %s
-                """, (thread_id, n))
-
-                events = cursor.fetchall()
-                # 解析tags并按turn_id排序
-                for ev in events:
-                    if ev['tags']:
-                        try:
-                            ev['tags'] = json.loads(ev['tags'])
-                        except:
-                            ev['tags'] = []
-
-                # 按turn_id重新排序（升序）
-                events = sorted(events, key=lambda x: x['turn_id'])
-                return events
-
-        except Exception as e:
-            print(f"[持久化存储] 获取历史记录失败: {e}")
-            self.db_available = False
+    def tail(self, thread_id: str, n: int = 10) -> List[Dict[str, Any]]:
+        """获取最后n个事件（包含写后日志里尚未写库的发言；查不到库时抛 HistoryUnavailableError）"""
+        if n <= 0:
             return []
+        # 先取未写库的部分再查库：期间刚写入的记录会在合并时按 event_id 去重
+        pending = self.pending_events(thread_id)
+        events = self._query_events("""
+            SELECT event_id, speaker, content, turn_id, tags, created_at
+            FROM events
+            WHERE thread_id = %s
+            ORDER BY turn_id DESC
+            LIMIT %s
+        """, (thread_id, n), pending[-n:], "获取历史记录")
+
+        # 按turn_id重新排序（升序）
+        events = sorted(events, key=lambda x: x['turn_id'])
+        return self._merge_pending(events, pending)[-n:]
+
+    def since(self, thread_id: str, after_turn: int) -> List[Dict[str, Any]]:
+        """获取 turn_id 大于 after_turn 的事件（升序，走 idx_turn_id 索引；包含未写库的发言）"""
+        pending = [ev for ev in self.pending_events(thread_id) if ev['turn_id'] > after_turn]
+        events = self._query_events("""
+            SELECT event_id, speaker, content, turn_id, tags, created_at
+            FROM events
+            WHERE thread_id = %s AND turn_id > %s
+            ORDER BY turn_id ASC
+        """, (thread_id, after_turn), pending, "获取增量事件")
+        return self._merge_pending(events, pending)
 
     def all(self, thread_id: str) -> List[Dict[str, Any]]:
-        """获取所有事件"""
-        if not self.db_available:
-            return []
-
-        if not self.db_manager.connection:
-            if not self.db_manager.connect():
-                self.db_available = False
-                return []
-
-        try:
-            with self.db_manager.get_cursor() as cursor:
-                cursor.execute("""
-                    SELECT event_id, speaker, content, turn_id, tags, created_at
-                    FROM events
-                    WHERE thread_id = %s
-                    ORDER BY turn_id ASC
-                """, (thread_id,))
-
-                events = cursor.fetchall()
-                for ev in events:
-                    if ev['tags']:
-                        try:
-                            ev['tags'] = json.loads(ev['tags'])
-                        except:
-                            ev['tags'] = []
-
-                return events
-
-        except Exception as e:
-            print(f"[持久化存储] 获取所有事件失败: {e}")
-            self.db_available = False
-            return []
+        """获取所有事件（包含写后日志里尚未写库的发言；查不到库时抛 HistoryUnavailableError）"""
+        pending = self.pending_events(thread_id)
+        events = self._query_events("""
+            SELECT event_id, speaker, content, turn_id, tags, created_at
+            FROM events
+            WHERE thread_id = %s
+            ORDER BY turn_id ASC
+        """, (thread_id,), pending, "获取所有事件")
+        return self._merge_pending(events, pending)
 
     def size(self, thread_id: str) -> int:
-        """获取事件数量"""
+        """获取事件数量（包含未写库的发言；批量写库的瞬间可能多算几条）"""
+        pending = len(self.pending_events(thread_id))
         if not self.db_available:
-            return 0
+            return pending
 
         if not self.db_manager.connection:
             if not self.db_manager.connect():
-                self.db_available = False
-                return 0
+                self._mark_unavailable()
+                return pending
 
         try:
             with self.db_manager.get_cursor() as cursor:
                 cursor.execute("SELECT COUNT(*) as count FROM events WHERE thread_id = %s", (thread_id,))
                 result = cursor.fetchone()
-                return result['count'] if result else 0
+                return (result['count'] if result else 0) + pending
         except Exception as e:
             print(f"[持久化存储] 获取事件数量失败: {e}")
-            self.db_available = False
-            return 0
+            self._mark_unavailable()
+            return pending
 
     def clear(self, thread_id: str):
         """清除线程数据"""
+        self._invalidate_turn(thread_id)
+        if self.journal is not None:
+            self.journal.discard(thread_id)
         if not self.db_available:
             return
 
         if not self.db_manager.connection:
             if not self.db_manager.connect():
-                self.db_available = False
+                self._mark_unavailable()
                 return
 
         try:
@@ -337,12 +578,14 @@ class PersistentHistoryStore:
                 cursor.execute("DELETE FROM disagreements WHERE thread_id = %s", (thread_id,))
                 cursor.execute("DELETE FROM open_questions WHERE thread_id = %s", (thread_id,))
                 cursor.execute("DELETE FROM style_health WHERE thread_id = %s", (thread_id,))
+                cursor.execute("DELETE FROM thread_summaries WHERE thread_id = %s", (thread_id,))
                 cursor.execute("DELETE FROM events WHERE thread_id = %s", (thread_id,))
                 cursor.execute("DELETE FROM threads WHERE thread_id = %s", (thread_id,))
+            self._invalidate_turn(thread_id)
             print(f"[持久化存储] 线程数据已清除: {thread_id}")
         except Exception as e:
             print(f"[持久化存储] 清除线程数据失败: {e}")
-            self.db_available = False
+            self._mark_unavailable()
 
     def get_thread_analysis(self, thread_id: str) -> Dict[str, Any]:
         """获取线程分析摘要"""
@@ -351,7 +594,7 @@ class PersistentHistoryStore:
 
         if not self.db_manager.connection:
             if not self.db_manager.connect():
-                self.db_available = False
+                self._mark_unavailable()
                 return {'thread_id': thread_id, 'error': '数据库连接失败'}
 
         try:
@@ -402,7 +645,7 @@ class PersistentHistoryStore:
 
         except Exception as e:
             print(f"[持久化存储] 获取线程分析失败: {e}")
-            self.db_available = False
+            self._mark_unavailable()
             return {'thread_id': thread_id, 'error': str(e)}
 
 
@@ -412,6 +655,7 @@ class PersistentStateStore:
     def __init__(self, db_manager: Optional[DatabaseManager] = None):
         self.db_manager = db_manager or get_db_manager()
         self.db_available = False  # 跟踪数据库是否可用
+        self._save_stats = {"saves": 0, "skipped": 0, "statements": 0, "orphaned": 0}
 
         # 尝试连接数据库
         try:
@@ -425,91 +669,156 @@ class PersistentStateStore:
             self.db_available = False
 
     def save_state(self, state: 'DiscussionState'):
-        """保存讨论状态到数据库"""
+        """
+        保存讨论状态到数据库（增量）：
+        只写与上次落库相比有变化的部分——议程按 item_id upsert、列表字段只插入新增条目、
+        风格健康度只写变化的指标，并把 threads.state_version 更新为新的版本号。
+        没有变化时不访问数据库。
+        """
         if not self.db_available:
             return
 
+        from dev.memory.state_store import state_changes, mark_persisted
+
+        changes = state_changes(state)
+        if not changes:
+            self._save_stats["skipped"] += 1
+            return
+
         if not self.db_manager.connection:
             if not self.db_manager.connect():
                 self.db_available = False
                 return
 
+        thread_id = state.thread_id
+        version = int(getattr(state, 'version', 0) or 0) + 1
         try:
             with self.db_manager.get_cursor() as cursor:
-                # 更新线程基本信息
-                cursor.execute("""
-                    UPDATE threads SET
-                        phase = %s,
-                        turn_id = %s,
-                        last_speaker = %s,
-                        last_user_interjection = %s,
-                        updated_at = %s
-                    WHERE thread_id = %s
-                """, (
-                    getattr(state, 'phase', 'opening'),
-                    getattr(state, 'turn_id', 0),
-                    getattr(state, 'last_speaker', None),
-                    getattr(state, 'last_user_interjection', None),
-                    datetime.now(),
-                    state.thread_id
-                ))
-
-                # 保存议程
-                cursor.execute("DELETE FROM agenda_items WHERE thread_id = %s", (state.thread_id,))
-                for item in getattr(state, 'agenda', []):
+                # 线程基本信息 + 版本号。锁住 threads 行：已存在就只更新；不存在时只有发言还在写后日志里
+                # （threads 行尚未创建）才插入，否则说明对话已被删除，不能把它重新建出来
+                now = datetime.now()
+                cursor.execute("SELECT thread_id FROM threads WHERE thread_id = %s FOR UPDATE", (thread_id,))
+                exists = cursor.fetchone() is not None
+                if not exists and not persistent_history_store.has_pending(thread_id):
+                    self._save_stats["orphaned"] += 1
+                    print(f"[持久化存储] 对话已删除，跳过状态保存: {thread_id}")
+                    return
+                if exists:
                     cursor.execute("""
-                        INSERT INTO agenda_items (item_id, thread_id, question, priority, status, created_by)
-                        VALUES (%s, %s, %s, %s, %s, %s)
+                        UPDATE threads
+                        SET phase = %s, turn_id = %s, last_speaker = %s, last_user_interjection = %s,
+                            state_version = %s, updated_at = %s
+                        WHERE thread_id = %s
                     """, (
-                        item.get('item_id', uuid.uuid4().hex[:10]),
-                        state.thread_id,
-                        item.get('question', ''),
-                        item.get('priority', 50),
-                        item.get('status', 'open'),
-                        item.get('created_by', 'unknown')
+                        getattr(state, 'phase', 'opening'),
+                        getattr(state, 'turn_id', 0),
+                        getattr(state, 'last_speaker', None),
+                        getattr(state, 'last_user_interjection', None),
+                        version,
+                        now,
+                        thread_id,
                     ))
+                else:
+                    # 写后日志写库时也会创建 threads 行，用 upsert 避免与它冲突
+                    cursor.execute("""
+                        INSERT INTO threads (thread_id, topic, phase, turn_id, last_speaker,
+                                             last_user_interjection, state_version, created_at, updated_at)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                        ON DUPLICATE KEY UPDATE
+                            phase = VALUES(phase),
+                            turn_id = VALUES(turn_id),
+                            last_speaker = VALUES(last_speaker),
+                            last_user_interjection = VALUES(last_user_interjection),
+                            state_version = VALUES(state_version),
+                            updated_at = VALUES(updated_at)
+                    """, (
+                        thread_id,
+                        getattr(state, 'topic', None) or '未命名话题',
+                        getattr(state, 'phase', 'opening'),
+                        getattr(state, 'turn_id', 0),
+                        getattr(state, 'last_speaker', None),
+                        getattr(state, 'last_user_interjection', None),
+                        version,
+                        now,
+                        now,
+                    ))
+                statements = 2
 
-                # 保存共识、分歧、问题到单独的表
-                self._save_list_field(cursor, state.thread_id, 'consensus', getattr(state, 'consensus', []))
-                self._save_list_field(cursor, state.thread_id, 'disagreements', getattr(state, 'disagreements', []))
-                self._save_list_field(cursor, state.thread_id, 'open_questions', getattr(state, 'open_questions', []))
-
-                # 保存风格健康度
-                style_health = getattr(state, 'style_health', {})
-                for metric_name, count in style_health.items():
-                    if metric_name in ['list_like', 'generic', 'repetitive']:
-                        cursor.execute("""
-                            INSERT INTO style_health (thread_id, metric_name, count)
-                            VALUES (%s, %s, %s)
-                            ON DUPLICATE KEY UPDATE count = %s
-                        """, (state.thread_id, metric_name, count, count))
-
-            print(f"[持久化存储] 状态已保存: {state.thread_id}")
+                # 议程：新增或修改的项 upsert，移除的项删除
+                if changes.get('agenda_upsert'):
+                    cursor.executemany("""
+                        INSERT INTO agenda_items (item_id, thread_id, question, priority, status, created_by)
+                        VALUES (%s, %s, %s, %s, %s, %s)
+                        ON DUPLICATE KEY UPDATE
+                            question = VALUES(question),
+                            priority = VALUES(priority),
+                            status = VALUES(status)
+                    """, [
+                        (
+                            item['item_id'],
+                            thread_id,
+                            item.get('question', ''),
+                            item.get('priority', 50),
+                            item.get('status', 'open'),
+                            item.get('created_by', 'unknown'),
+                        )
+                        for item in changes['agenda_upsert']
+                    ])
+                    statements += 1
+                if changes.get('agenda_delete'):
+                    placeholders = ", ".join(["%s"] * len(changes['agenda_delete']))
+                    cursor.execute(
+                        f"DELETE FROM agenda_items WHERE thread_id = %s AND item_id IN ({placeholders})",
+                        [thread_id] + list(changes['agenda_delete']),
+                    )
+                    statements += 1
+
+                # 共识、分歧、问题：只插入新增条目
+                for field_type in ('consensus', 'disagreements', 'open_questions'):
+                    if changes.get(field_type):
+                        self._save_list_field(cursor, thread_id, field_type, changes[field_type])
+                        statements += 1
+
+                # 风格健康度：只写变化的指标
+                health = [
+                    (thread_id, name, count)
+                    for name, count in (changes.get('style_health') or {}).items()
+                    if name in ['list_like', 'generic', 'repetitive']
+                ]
+                if health:
+                    cursor.executemany("""
+                        INSERT INTO style_health (thread_id, metric_name, count)
+                        VALUES (%s, %s, %s)
+                        ON DUPLICATE KEY UPDATE count = VALUES(count)
+                    """, health)
+                    statements += 1
+
+            state.version = version
+            mark_persisted(state)
+            self._save_stats["saves"] += 1
+            self._save_stats["statements"] += statements
+            print(f"[持久化存储] 状态已保存: {thread_id}, 版本 {version}, 变更 {', '.join(changes)}")
 
         except Exception as e:
             print(f"[持久化存储] 保存状态失败: {e}")
             self.db_available = False
 
     def _save_list_field(self, cursor, thread_id: str, field_type: str, items: List[str]):
-        """保存列表字段到相应的表"""
-        if field_type == 'consensus':
-            for item in items:
-                cursor.execute("""
-                    INSERT INTO consensus (thread_id, content)
-                    VALUES (%s, %s)
-                """, (thread_id, item))
-        elif field_type == 'disagreements':
-            for item in items:
-                cursor.execute("""
-                    INSERT INTO disagreements (thread_id, content)
-                    VALUES (%s, %s)
-                """, (thread_id, item))
-        elif field_type == 'open_questions':
-            for item in items:
-                cursor.execute("""
-                    INSERT INTO open_questions (thread_id, content)
-                    VALUES (%s, %s)
-                """, (thread_id, item))
+        """保存列表字段的新增条目到相应的表"""
+        if field_type not in ('consensus', 'disagreements', 'open_questions'):
+            return
+        cursor.executemany(
+            f"INSERT INTO {field_type} (thread_id, content) VALUES (%s, %s)",
+            [(thread_id, item) for item in items],
+        )
+
+    def save_stats(self) -> Dict[str, Any]:
+        """状态保存统计：实际写库次数、因无变化跳过的次数、平均每次保存的 SQL 语句数。"""
+        saves = self._save_stats["saves"]
+        return {
+            **self._save_stats,
+            "statements_per_save": round(self._save_stats["statements"] / saves, 2) if saves else 0.0,
+        }
 
     def load_state(self, thread_id: str) -> Optional[Dict[str, Any]]:
         """从数据库加载状态"""
@@ -552,6 +861,13 @@ class PersistentStateStore:
                 cursor.execute("SELECT metric_name, count FROM style_health WHERE thread_id = %s", (thread_id,))
                 style_health = {row['metric_name']: row['count'] for row in cursor.fetchall()}
 
+                # 获取分层摘要
+                cursor.execute("""
+                    SELECT level, from_turn, to_turn, content FROM thread_summaries
+                    WHERE thread_id = %s ORDER BY from_turn ASC
+                """, (thread_id,))
+                summaries = list(cursor.fetchall())
+
                 return {
                     'thread_id': thread_id,
                     'topic': thread['topic'],
@@ -563,7 +879,9 @@ class PersistentStateStore:
                     'consensus': consensus,
                     'disagreements': disagreements,
                     'open_questions': open_questions,
-                    'style_health': style_health
+                    'style_health': style_health,
+                    'summaries': summaries,
+                    'state_version': thread.get('state_version') or 0
                 }
 
         except Exception as e:
@@ -571,6 +889,42 @@ class PersistentStateStore:
             self.db_available = False
             return None
 
+    def save_summaries(self, thread_id: str, summaries: List[Dict[str, Any]]):
+        """保存分层摘要（整组替换，段数很少）"""
+        if not self.db_available:
+            return
+
+        try:
+            with self.db_manager.get_cursor() as cursor:
+                cursor.execute("DELETE FROM thread_summaries WHERE thread_id = %s", (thread_id,))
+                if summaries:
+                    cursor.executemany("""
+                        INSERT INTO thread_summaries (thread_id, level, from_turn, to_turn, content)
+                        VALUES (%s, %s, %s, %s, %s)
+                    """, [
+                        (thread_id, int(s.get('level', 0)), int(s.get('from_turn', 0)),
+                         int(s.get('to_turn', 0)), s.get('content', ''))
+                        for s in summaries
+                    ])
+        except Exception as e:
+            print(f"[持久化存储] 保存摘要失败: {e}")
+
+    def load_summaries(self, thread_id: str) -> List[Dict[str, Any]]:
+        """加载分层摘要（按 from_turn 升序）"""
+        if not self.db_available:
+            return []
+
+        try:
+            with self.db_manager.get_cursor() as cursor:
+                cursor.execute("""
+                    SELECT level, from_turn, to_turn, content FROM thread_summaries
+                    WHERE thread_id = %s ORDER BY from_turn ASC
+                """, (thread_id,))
+                return list(cursor.fetchall())
+        except Exception as e:
+            print(f"[持久化存储] 加载摘要失败: {e}")
+            return []
+
 
 # 全局持久化存储实例
 persistent_history_store = PersistentHistoryStore()
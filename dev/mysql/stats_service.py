@@ -0,0 +1,148 @@
+"""
+管理后台数据看板统计
+计数在写路径上增量维护、常驻内存；后台定期从数据库对账纠正偏差
+"""
+
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Optional, Set
+
+from .db_utils import DatabaseManager, get_db_manager
+
+
+# 看板上的计数项
+COUNTERS = ("user_count", "admin_count", "thread_count", "published_count", "violation_count", "comment_count")
+
+# 发布状态 → 对应的计数项
+_STATUS_COUNTERS = {
+    "published": "published_count",
+    "rejected": "violation_count",
+}
+
+
+class DashboardStats:
+    """
+    数据看板统计服务：
+    - 注册/创建对话/审核/评论/登录等写路径调用 incr()、publication_changed()、mark_active() 增量更新
+    - 今日活跃用户用按天的 user_id 集合记录（只保留最近两天）
+    - 数据看板直接读内存快照，不再每次执行全表 COUNT(*)
+    - reconcile() 从数据库重新计算并覆盖内存计数（启动后首次读取、invalidate() 之后、以及后台定期执行），
+      写路径失败回滚、级联删除等没有逐一维护的变化由它纠正
+    """
+
+    def __init__(self, db_manager: Optional[DatabaseManager] = None, reconcile_interval: float = 300.0):
+        self.db_manager = db_manager or get_db_manager()
+        self.reconcile_interval = reconcile_interval
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {name: 0 for name in COUNTERS}
+        self._active: Dict[date, Set[str]] = {}
+        self._loaded = False
+        self._dirty = False
+        self._last_reconcile: Optional[float] = None
+        self._stats = {"reconciles": 0, "reconcile_failures": 0, "drift": 0, "served_from_memory": 0}
+
+    # ---------- 写路径 ----------
+    def incr(self, name: str, delta: int = 1):
+        if name not in self._counters or not delta:
+            return
+        with self._lock:
+            self._counters[name] = max(0, self._counters[name] + delta)
+
+    def user_added(self, role: Optional[str]):
+        self.incr("admin_count" if role in ("admin", "super_admin") else "user_count")
+
+    def publication_changed(self, old_status: Optional[str], new_status: Optional[str]):
+        """对话发布状态变化（提交审核、审核通过、驳回）"""
+        if old_status == new_status:
+            return
+        self.incr(_STATUS_COUNTERS.get(old_status or ""), -1)
+        self.incr(_STATUS_COUNTERS.get(new_status or ""), 1)
+
+    def mark_active(self, user_id: Optional[str]):
+        """记录今日活跃用户（评论、创建对话或登录）"""
+        if not user_id:
+            return
+        today = date.today()
+        with self._lock:
+            self._active.setdefault(today, set()).add(user_id)
+            if len(self._active) > 2:
+                for day in [d for d in self._active if d < today - timedelta(days=1)]:
+                    del self._active[day]
+
+    def invalidate(self):
+        """写路径不便精确维护时（删除用户、修改角色、批量删除对话），下次读取前重新对账"""
+        self._dirty = True
+
+    # ---------- 读 ----------
+    def snapshot(self) -> Dict[str, Any]:
+        """看板数据；尚未加载或已失效时先同步对账一次。"""
+        if not self._loaded or self._dirty:
+            self.reconcile()
+        else:
+            self._stats["served_from_memory"] += 1
+        with self._lock:
+            counters = dict(self._counters)
+            active_today = len(self._active.get(date.today(), ()))
+        return {
+            **counters,
+            "active_users_today": active_today,
+            "public_chat_count": counters["published_count"],
+        }
+
+    # ---------- 对账 ----------
+    def reconcile(self) -> bool:
+        """从数据库重新计算计数并覆盖内存值，返回是否成功。"""
+        today = date.today()
+        start = datetime.combine(today, datetime.min.time())
+        end = start + timedelta(days=1)
+        try:
+            with self.db_manager.get_cursor() as cursor:
+                cursor.execute("""
+                    SELECT
+                        (SELECT COUNT(*) FROM users WHERE role = 'user') as user_count,
+                        (SELECT COUNT(*) FROM users WHERE role IN ('admin', 'super_admin')) as admin_count,
+                        (SELECT COUNT(*) FROM threads) as thread_count,
+                        (SELECT COUNT(*) FROM thread_owners WHERE publication_status = 'published') as published_count,
+                        (SELECT COUNT(*) FROM thread_owners WHERE publication_status = 'rejected') as violation_count,
+                        (SELECT COUNT(*) FROM comments) as comment_count
+                """)
+                row = cursor.fetchone() or {}
+
+                # 今日活跃用户：用 created_at 范围条件，能走 created_at 索引（DATE(created_at) 不能）
+                cursor.execute("""
+                    SELECT user_id FROM threads WHERE created_at >= %s AND created_at < %s
+                    UNION
+                    SELECT user_id FROM comments WHERE created_at >= %s AND created_at < %s
+                    UNION
+                    SELECT user_id FROM user_sessions WHERE created_at >= %s AND created_at < %s
+                """, (start, end, start, end, start, end))
+                active = {r['user_id'] for r in cursor.fetchall() if r.get('user_id')}
+        except Exception as e:
+            self._stats["reconcile_failures"] += 1
+            print(f"[数据看板] 统计对账失败: {e}")
+            return False
+
+        with self._lock:
+            fresh = {name: int(row.get(name) or 0) for name in COUNTERS}
+            if self._loaded:
+                self._stats["drift"] += sum(abs(fresh[n] - self._counters[n]) for n in COUNTERS)
+            self._counters = fresh
+            # 对账查询期间新登记的活跃用户保留
+            self._active[today] = active | self._active.get(today, set())
+            self._loaded = True
+            self._dirty = False
+            self._last_reconcile = time.time()
+        self._stats["reconciles"] += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "loaded": self._loaded,
+            "last_reconcile": datetime.fromtimestamp(self._last_reconcile).isoformat() if self._last_reconcile else None,
+        }
+
+
+# 全局看板统计实例
+dashboard_stats = DashboardStats()
@@ -0,0 +1,14 @@
+"""
+NLP模块（jieba 分词器加载、内容分析）
+"""
+
+from .segmenter import Segmenter, segmenter
+from .content_analyzer import ContentAnalyzer, ExtractedContent, get_content_analyzer
+
+__all__ = [
+    'Segmenter',
+    'segmenter',
+    'ContentAnalyzer',
+    'ExtractedContent',
+    'get_content_analyzer',
+]
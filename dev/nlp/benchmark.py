@@ -0,0 +1,124 @@
+"""
+内容分析基准：旧的逐模式 re.findall + 元数据 / 结构化内容两次分析 vs. 预编译单遍 analyze()
+
+用法：
+    python -m dev.nlp.benchmark
+    python -m dev.nlp.benchmark --events 500 --repeat 5
+"""
+
+import argparse
+import random
+import re
+import time
+
+from .content_analyzer import ContentAnalyzer, _TOPIC_PATTERNS
+from .segmenter import segmenter
+
+
+_FLAGS = re.DOTALL | re.IGNORECASE | re.MULTILINE
+
+
+def legacy_extract(analyzer: ContentAnalyzer, content: str):
+    """原 extract_content 的做法：每个模式单独 findall（每次都查正则缓存）、情感词逐个 count、关键词重新分词"""
+    content = content.strip()
+    result = {}
+    for name, patterns in (
+        ('consensus', analyzer.consensus_patterns),
+        ('disagreements', analyzer.disagreement_patterns),
+        ('open_questions', analyzer.question_patterns),
+        ('key_points', analyzer.key_point_patterns),
+        ('action_items', analyzer.action_patterns),
+    ):
+        items = []
+        for pattern in patterns:
+            for match in re.findall(pattern, content, _FLAGS):
+                # 带两个捕获组的模式 findall 返回元组，原实现会在这里出错，对照时取最后一个非空组
+                if isinstance(match, tuple):
+                    match = next((m for m in reversed(match) if m), "")
+                cleaned = analyzer._clean_text(match)
+                if cleaned and len(cleaned) > 5 and cleaned not in items:
+                    items.append(cleaned)
+        result[name] = items
+
+    emotions = {}
+    for emotion, words in analyzer.emotion_words.items():
+        emotions[emotion] = sum(content.count(word) for word in words)
+    result['emotions'] = emotions
+
+    topics = set()
+    for pattern in _TOPIC_PATTERNS:
+        for match in re.findall(pattern, content):
+            if 2 <= len(match) <= 8:
+                topics.add(match.strip())
+    result['topics'] = topics
+
+    jieba = segmenter.get()
+    if jieba is not None:
+        result['keywords'] = jieba.analyse.extract_tags(content, topK=10, withWeight=True)
+    else:
+        result['keywords'] = re.findall(r'[一-龥]+', content)
+    return result
+
+
+def legacy_append(analyzer: ContentAnalyzer, content: str):
+    """原 persistent_store.append：get_content_metadata 和 extract_content 各分析一遍（前者内部还会再分析一遍）"""
+    legacy_extract(analyzer, content)
+    legacy_extract(analyzer, content)
+    return legacy_extract(analyzer, content)
+
+
+_SENTENCES = [
+    "我们达成共识：需要先明确评价标准。",
+    "我认为这个方案的成本太高，不太赞同。",
+    "但是我觉得可以先做一个小规模的试点。",
+    "关于数据来源的问题还需要进一步讨论？",
+    "首先要收集用户反馈，其次要整理需求列表。",
+    "核心观点是教育公平比效率更重要。",
+    "建议下周之前完成调研报告。",
+    "这个想法很好，我非常同意你的看法！",
+    "然而现有的研究结论并不一致，存在很大争议。",
+    "如何平衡隐私保护和个性化推荐？",
+]
+
+
+def make_events(count: int, rng: random.Random):
+    return ["".join(rng.choice(_SENTENCES) for _ in range(rng.randint(3, 12))) for _ in range(count)]
+
+
+def timed(fn, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run(events: int, repeat: int = 3, seed: int = 42):
+    rng = random.Random(seed)
+    texts = make_events(events, rng)
+    analyzer = ContentAnalyzer()
+    # 预热：jieba 词典加载不计入
+    analyzer.warm_up()
+    legacy_append(analyzer, texts[0])
+
+    t_legacy = timed(lambda: [legacy_append(analyzer, t) for t in texts], repeat)
+    t_new = timed(lambda: [analyzer.analyze(t, "user") for t in texts], repeat)
+    print(f"{'发言数':>6} {'旧实现':>10} {'analyze':>10} {'旧/条':>10} {'新/条':>10} {'加速比':>8}")
+    print(
+        f"{events:>6} {t_legacy * 1000:>8.1f}ms {t_new * 1000:>8.1f}ms "
+        f"{t_legacy / events * 1000:>8.3f}ms {t_new / events * 1000:>8.3f}ms "
+        f"{t_legacy / t_new if t_new else 0:>7.1f}x"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="内容分析基准")
+    parser.add_argument("--events", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.events, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
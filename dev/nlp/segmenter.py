@@ -0,0 +1,139 @@
+# nlp/segmenter.py
+"""
+jieba 分词器的统一加载入口
+内容分析和全文检索共用同一份词典：服务启动时显式预热，词典缓存可以放在持久目录里，领域词典启动时一并加载
+
+预先生成词典缓存（例如在镜像构建阶段）：
+    JIEBA_CACHE_DIR=/app/.cache/jieba python -c "from dev.nlp.segmenter import segmenter; segmenter.load()"
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+
+# 随代码提供的领域词典（jieba userdict 格式，每行：词 [词频] [词性]，不支持注释行）
+DEFAULT_USER_DICT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'user_dict.txt')
+
+
+class Segmenter:
+    """
+    jieba 加载器：
+    - get() 返回已初始化的 jieba 模块（未安装时返回 None，调用方走各自的降级逻辑），第一次调用时加载
+    - load() 在锁内完成全部加载：主词典（优先读磁盘缓存）、jieba.analyse 的 IDF 表、领域词典；
+      服务启动时调用一次，之后请求里的分词不再承担词典加载
+    - JIEBA_CACHE_DIR：主词典序列化缓存的目录。jieba 默认写到系统临时目录，容器重启后就没了；
+      指定持久目录（或在镜像里预先生成）后，启动时直接读缓存，不再解析 dict.txt
+    - JIEBA_USER_DICT：额外的领域词典路径（多个用逗号分隔），在 user_dict.txt 之后加载
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jieba = None
+        self._loaded = False
+        self.cache_dir: Optional[str] = os.getenv('JIEBA_CACHE_DIR') or None
+        self.user_dicts: List[str] = [DEFAULT_USER_DICT] + [
+            p.strip() for p in os.getenv('JIEBA_USER_DICT', '').split(',') if p.strip()
+        ]
+        self._stats = {"available": None, "load_ms": 0.0, "user_dicts_loaded": 0, "user_words": 0}
+        self._last_error: Optional[str] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def get(self):
+        """已加载的 jieba 模块；jieba 未安装时返回 None"""
+        if not self._loaded:
+            self.load()
+        return self._jieba
+
+    def load(self) -> bool:
+        """加载词典（只执行一次），返回 jieba 是否可用"""
+        with self._lock:
+            if self._loaded:
+                return self._jieba is not None
+            started = time.perf_counter()
+            try:
+                import jieba
+                jieba.setLogLevel(60)  # 关闭加载词典时的日志
+                if self.cache_dir:
+                    os.makedirs(self.cache_dir, exist_ok=True)
+                    jieba.dt.tmp_dir = self.cache_dir
+                jieba.initialize()
+                # 导入时会读入 IDF 表，关键词提取要用
+                import jieba.analyse
+            except ImportError:
+                print("[分词] 未安装 jieba，关键词提取和检索分词使用简化算法")
+                self._stats["available"] = False
+                self._loaded = True
+                return False
+
+            self._jieba = jieba
+            for path in self.user_dicts:
+                self._load_user_dict_locked(path)
+            self._stats["available"] = True
+            self._stats["load_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            self._loaded = True
+        print(f"[分词] jieba 词典加载完成，耗时 {self._stats['load_ms']}ms")
+        return True
+
+    # ---------- 领域词典 ----------
+    def load_user_dict(self, path: str) -> bool:
+        """加载一个领域词典文件（jieba 的 userdict 格式），词典未加载时先记下，加载时一起处理"""
+        with self._lock:
+            if path not in self.user_dicts:
+                self.user_dicts.append(path)
+            if self._jieba is None:
+                return False
+            return self._load_user_dict_locked(path)
+
+    def _load_user_dict_locked(self, path: str) -> bool:
+        if not os.path.exists(path):
+            if path != DEFAULT_USER_DICT:
+                print(f"[分词] 领域词典不存在: {path}")
+            return False
+        try:
+            self._jieba.load_userdict(path)
+        except Exception as e:
+            self._last_error = f"{path}: {e}"
+            print(f"[分词] 加载领域词典失败 {path}: {e}")
+            return False
+        with open(path, encoding='utf-8') as f:
+            self._stats["user_words"] += sum(1 for line in f if line.strip())
+        self._stats["user_dicts_loaded"] += 1
+        return True
+
+    def add_words(self, words: Iterable[str]) -> int:
+        """运行时追加领域词（例如话题名），返回加入的词数"""
+        jieba = self.get()
+        if jieba is None:
+            return 0
+        count = 0
+        with self._lock:
+            for word in words:
+                word = (word or '').strip()
+                if word:
+                    jieba.add_word(word)
+                    count += 1
+            self._stats["user_words"] += count
+        return count
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "loaded": self._loaded,
+            "cache_dir": self.cache_dir,
+            # 使用默认主词典时 jieba 的缓存文件名固定为 jieba.cache
+            "cache_file": os.path.join(self.cache_dir, 'jieba.cache') if self.cache_dir else None,
+            "user_dicts": list(self.user_dicts),
+            "last_error": self._last_error,
+        }
+
+
+# 全局分词器
+segmenter = Segmenter()
+
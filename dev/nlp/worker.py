@@ -0,0 +1,36 @@
+# nlp/worker.py
+"""
+内容分析工作进程的入口
+分析流水线的进程池用 forkserver/spawn 启动工作进程，子进程按模块名反序列化任务函数；
+任务函数放在这里，子进程只导入 dev.nlp（分词和内容分析），不会导入 dev.mysql 再创建一遍数据库连接和写后日志
+"""
+
+import os
+from typing import Any, Dict, List, Tuple
+
+from .content_analyzer import get_content_analyzer
+from .segmenter import segmenter
+
+
+def init_worker():
+    """工作进程初始化：加载 jieba 词典（设置了 JIEBA_CACHE_DIR 时直接读缓存）"""
+    segmenter.load()
+
+
+def ping() -> int:
+    return os.getpid()
+
+
+def analyze_batch(items: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    """分析一批 (content, speaker)，按顺序返回元数据和共识/分歧/问题"""
+    analyzer = get_content_analyzer()
+    results = []
+    for content, speaker in items:
+        extracted, metadata = analyzer.analyze(content, speaker)
+        results.append({
+            "metadata": metadata,
+            "consensus": list(extracted.consensus),
+            "disagreements": list(extracted.disagreements),
+            "open_questions": list(extracted.open_questions),
+        })
+    return results
@@ -0,0 +1,15 @@
+"""
+Search模块（发言、评论、话题的本地全文检索）
+"""
+
+from .tokenizer import tokenize
+from .inverted_index import InvertedIndex, highlight
+from .search_service import SearchService, search_service
+
+__all__ = [
+    'tokenize',
+    'InvertedIndex',
+    'highlight',
+    'SearchService',
+    'search_service',
+]
@@ -0,0 +1,220 @@
+# search/inverted_index.py
+from __future__ import annotations
+
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from .tokenizer import tokenize
+
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+# 摘要窗口长度（字）
+SNIPPET_CHARS = 80
+
+
+@dataclass
+class Document:
+    """索引中的一条文档（发言 / 评论 / 话题）。"""
+    doc_id: str
+    kind: str
+    text: str
+    length: int
+    terms: Set[str] = field(default_factory=set)
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+
+class InvertedIndex:
+    """
+    内存倒排索引：
+    - add() / remove() 增量维护，同一个 doc_id 重复 add 会替换旧内容（幂等，便于全量加载与实时追加并行）
+    - search() 按 BM25 打分，支持按 kind 与自定义条件过滤、分页，返回带高亮的摘要
+    - match() 返回全部命中文档（不分页、不生成摘要），给关键词过滤使用
+    线程安全：所有读写都在同一把锁里。
+    """
+
+    def __init__(self, tokenizer: Callable[[str], List[str]] = tokenize):
+        self._tokenize = tokenizer
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._docs: Dict[str, Document] = {}
+        self._total_length = 0
+
+    # ---------- 写 ----------
+    def add(self, doc_id: str, kind: str, text: str, **attrs: Any):
+        tokens = self._tokenize(text or "")
+        tf = Counter(tokens)
+        with self._lock:
+            self._remove_locked(doc_id)
+            doc = Document(doc_id=doc_id, kind=kind, text=text or "", length=len(tokens), terms=set(tf), attrs=attrs)
+            self._docs[doc_id] = doc
+            self._total_length += doc.length
+            for term, count in tf.items():
+                self._postings.setdefault(term, {})[doc_id] = count
+
+    def update_attrs(self, doc_id: str, **attrs: Any) -> bool:
+        with self._lock:
+            doc = self._docs.get(doc_id)
+            if doc is None:
+                return False
+            doc.attrs.update(attrs)
+            return True
+
+    def remove(self, doc_id: str) -> bool:
+        with self._lock:
+            return self._remove_locked(doc_id)
+
+    def remove_where(self, predicate: Callable[[Document], bool]) -> int:
+        with self._lock:
+            doomed = [doc_id for doc_id, doc in self._docs.items() if predicate(doc)]
+            for doc_id in doomed:
+                self._remove_locked(doc_id)
+            return len(doomed)
+
+    def _remove_locked(self, doc_id: str) -> bool:
+        doc = self._docs.pop(doc_id, None)
+        if doc is None:
+            return False
+        self._total_length -= doc.length
+        for term in doc.terms:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[term]
+        return True
+
+    # ---------- 读 ----------
+    def get(self, doc_id: str) -> Optional[Document]:
+        with self._lock:
+            return self._docs.get(doc_id)
+
+    def search(
+        self,
+        query: str,
+        kinds: Optional[Iterable[str]] = None,
+        where: Optional[Callable[[Document], bool]] = None,
+        offset: int = 0,
+        limit: int = 20,
+        require_all: bool = False,
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        BM25 检索。
+
+        Args:
+            query: 查询文本（与索引使用同一分词）
+            kinds: 只检索这些类型
+            where: 额外过滤条件 where(doc) -> bool
+            offset / limit: 分页
+            require_all: 为 True 时只返回包含全部查询词的文档（默认任一词命中即可）
+
+        Returns:
+            (命中总数, 当前页结果)；结果字段 doc_id/kind/score/snippet 以及文档属性
+        """
+        terms = list(dict.fromkeys(self._tokenize(query or "")))
+        if not terms:
+            return 0, []
+
+        with self._lock:
+            scores = self._score_locked(terms, kinds, where, require_all)
+            total = len(scores)
+            top = heapq.nlargest(offset + limit, scores.items(), key=lambda kv: kv[1])[offset:]
+            hits = []
+            for doc_id, score in top:
+                doc = self._docs[doc_id]
+                hits.append({
+                    **doc.attrs,
+                    "doc_id": doc_id,
+                    "kind": doc.kind,
+                    "score": round(score, 4),
+                    "snippet": highlight(doc.text, terms),
+                })
+        return total, hits
+
+    def has_terms(self, query: str) -> bool:
+        """query 分词后是否还有可检索的词（只含停用词、标点时为 False）"""
+        return bool(self._tokenize(query or ""))
+
+    def match(
+        self,
+        query: str,
+        kinds: Optional[Iterable[str]] = None,
+        where: Optional[Callable[[Document], bool]] = None,
+        require_all: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """全部命中文档的属性（含 doc_id/kind/score），按相关度降序，不截断。"""
+        terms = list(dict.fromkeys(self._tokenize(query or "")))
+        if not terms:
+            return []
+        with self._lock:
+            scores = self._score_locked(terms, kinds, where, require_all)
+            ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+            return [
+                {**self._docs[doc_id].attrs, "doc_id": doc_id, "kind": self._docs[doc_id].kind, "score": round(score, 4)}
+                for doc_id, score in ranked
+            ]
+
+    def _score_locked(
+        self,
+        terms: List[str],
+        kinds: Optional[Iterable[str]],
+        where: Optional[Callable[[Document], bool]],
+        require_all: bool,
+    ) -> Dict[str, float]:
+        kinds = set(kinds) if kinds else None
+        n_docs = len(self._docs) or 1
+        avgdl = (self._total_length / n_docs) or 1.0
+        scores: Dict[str, float] = {}
+        hits: Counter = Counter()
+        for term in terms:
+            posting = self._postings.get(term)
+            if not posting:
+                if require_all:
+                    return {}
+                continue
+            idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, tf in posting.items():
+                doc = self._docs[doc_id]
+                if kinds is not None and doc.kind not in kinds:
+                    continue
+                norm = tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * doc.length / avgdl))
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * norm
+                hits[doc_id] += 1
+
+        if require_all:
+            scores = {doc_id: s for doc_id, s in scores.items() if hits[doc_id] == len(terms)}
+        if where is not None:
+            scores = {doc_id: s for doc_id, s in scores.items() if where(self._docs[doc_id])}
+        return scores
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            kinds = Counter(doc.kind for doc in self._docs.values())
+            return {
+                "documents": len(self._docs),
+                "terms": len(self._postings),
+                "postings": sum(len(p) for p in self._postings.values()),
+                "by_kind": dict(kinds),
+            }
+
+
+def highlight(text: str, terms: Iterable[str], window: int = SNIPPET_CHARS, tag: str = "em") -> str:
+    """截取第一个命中附近的片段，命中词用 <em> 包裹（不区分大小写）。"""
+    terms = sorted({t for t in terms if t}, key=len, reverse=True)
+    if not text or not terms:
+        return (text or "")[:window]
+    pattern = re.compile("|".join(re.escape(t) for t in terms), re.IGNORECASE)
+    first = pattern.search(text)
+    start = 0
+    if first and first.start() > window // 3:
+        start = first.start() - window // 3
+    end = min(len(text), start + window)
+    piece = text[start:end]
+    out = pattern.sub(lambda m: f"<{tag}>{m.group(0)}</{tag}>", piece)
+    return ("…" if start > 0 else "") + out + ("…" if end < len(text) else "")
@@ -0,0 +1,308 @@
+# search/search_service.py
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from .inverted_index import InvertedIndex
+
+
+# 全量建索引时每批读取的行数
+BUILD_BATCH_SIZE = 2000
+# 评论关键词过滤最多取这么多条（按相关度），结果要拼进 SQL 的 IN / FIELD
+MAX_COMMENT_MATCHES = 1000
+
+KIND_EVENT = "event"
+KIND_COMMENT = "comment"
+KIND_TOPIC = "topic"
+
+
+class SearchService:
+    """
+    站内全文检索（本地倒排索引，不依赖外部搜索服务）：
+    - 发言（event）、评论（comment）、话题（topic）三类文档，jieba 分词 + BM25 排序 + 高亮摘要
+    - 启动后 build_from_db() 在后台分批全量建索引，完成前 ready 为 False，调用方退回 LIKE / 子串匹配
+    - 之后由写路径增量维护：发言追加回调、评论增删恢复、创建/重命名/删除对话
+    - 发言追加回调在事件循环上触发，分词放到后台索引线程做：回调只入队；删除对话时同时入队一个删除标记，
+      排在它前面、尚未索引的发言会在标记处一并移除，不会被加回来
+    - 关键词过滤（对话列表、评论管理）要求命中全部查询词；对话列表取全部命中，评论管理按相关度取前
+      MAX_COMMENT_MATCHES 条。关键词分词后为空（只有停用词、标点）时返回 None，调用方退回子串 / LIKE 匹配
+    - 对话归属（thread → user_id）单独维护，按用户过滤时不需要回表
+    """
+
+    def __init__(self):
+        self.index = InvertedIndex()
+        self._lock = threading.Lock()
+        self._owners: Dict[str, Optional[str]] = {}
+        self._building = False
+        self._ready = False
+        # 建索引期间被删除的对话，防止全量读到的旧数据把它们加回来
+        self._removed_during_build: Set[str] = set()
+        self._build_stats: Dict[str, Any] = {}
+        # 后台索引队列：("event", thread_id, event) 或 ("remove", thread_id, None)
+        self._pending: "queue.Queue[tuple]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    # ---------- 增量维护 ----------
+    def index_thread(self, thread_id: str, topic: str, user_id: Optional[str] = None):
+        with self._lock:
+            self._owners[thread_id] = user_id
+            self._removed_during_build.discard(thread_id)
+        self.index.add(f"{KIND_TOPIC}:{thread_id}", KIND_TOPIC, topic or "", thread_id=thread_id)
+
+    def index_event(self, thread_id: str, event: Dict[str, Any]):
+        """发言追加回调，签名与 history_store.add_append_listener 一致；只入队，由后台线程分词建索引"""
+        if not event.get("event_id"):
+            return
+        self._enqueue(("event", thread_id, {
+            "event_id": event.get("event_id"),
+            "content": event.get("content"),
+            "speaker": event.get("speaker"),
+            "turn_id": event.get("turn_id"),
+        }))
+
+    def _add_event(self, thread_id: str, event: Dict[str, Any]):
+        event_id = event.get("event_id")
+        if not event_id:
+            return
+        self.index.add(
+            f"{KIND_EVENT}:{event_id}", KIND_EVENT, event.get("content") or "",
+            thread_id=thread_id,
+            event_id=event_id,
+            speaker=event.get("speaker"),
+            turn_id=event.get("turn_id"),
+        )
+
+    def index_comment(self, comment_id: str, thread_id: str, user_id: Optional[str], content: str,
+                      is_deleted: bool = False, created_at: Any = None):
+        self.index.add(
+            f"{KIND_COMMENT}:{comment_id}", KIND_COMMENT, content or "",
+            thread_id=thread_id,
+            comment_id=comment_id,
+            user_id=user_id,
+            is_deleted=bool(is_deleted),
+            created_at=created_at.isoformat() if hasattr(created_at, "isoformat") else created_at,
+        )
+
+    def set_comment_deleted(self, comment_ids: Iterable[str], deleted: bool):
+        """评论软删除 / 恢复：只改标记，文档保留（管理员仍可检索已删除评论）"""
+        for comment_id in comment_ids:
+            self.index.update_attrs(f"{KIND_COMMENT}:{comment_id}", is_deleted=deleted)
+
+    def remove_thread(self, thread_id: str):
+        """删除对话：话题、发言、评论一起移出索引（队列里尚未索引的发言在删除标记处移除）"""
+        with self._lock:
+            self._owners.pop(thread_id, None)
+            if self._building:
+                self._removed_during_build.add(thread_id)
+        self._remove_thread_docs(thread_id)
+        self._enqueue(("remove", thread_id, None))
+
+    def _remove_thread_docs(self, thread_id: str):
+        self.index.remove_where(lambda doc: doc.attrs.get("thread_id") == thread_id)
+
+    # ---------- 后台索引线程 ----------
+    def _enqueue(self, item: tuple):
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="search-indexer", daemon=True)
+                    self._worker.start()
+        self._pending.put(item)
+
+    def _run(self):
+        while True:
+            op, thread_id, event = self._pending.get()
+            try:
+                if op == "event":
+                    self._add_event(thread_id, event)
+                else:
+                    self._remove_thread_docs(thread_id)
+            except Exception as e:
+                print(f"[全文检索] 后台索引失败: {e}")
+            finally:
+                self._pending.task_done()
+
+    def remove_user(self, user_id: str):
+        """删除用户：其对话（连同发言、评论）和其发表的评论移出索引"""
+        with self._lock:
+            threads = [t for t, owner in self._owners.items() if owner == user_id]
+        for thread_id in threads:
+            self.remove_thread(thread_id)
+        self.index.remove_where(lambda doc: doc.kind == KIND_COMMENT and doc.attrs.get("user_id") == user_id)
+
+    # ---------- 查询 ----------
+    def owner_of(self, thread_id: str) -> Optional[str]:
+        return self._owners.get(thread_id)
+
+    def search(
+        self,
+        query: str,
+        kinds: Optional[Iterable[str]] = None,
+        user_id: Optional[str] = None,
+        thread_id: Optional[str] = None,
+        comment_user_id: Optional[str] = None,
+        include_deleted: bool = False,
+        page: int = 1,
+        page_size: int = 20,
+    ) -> Dict[str, Any]:
+        """
+        Args:
+            query: 查询文本
+            kinds: 文档类型（event/comment/topic），默认全部
+            user_id: 只检索该用户创建的对话
+            thread_id: 只检索某个对话
+            comment_user_id: 只检索该用户发表的评论
+            include_deleted: 是否包含已删除评论
+            page / page_size: 分页（page 从 1 开始）
+        """
+        page = max(1, page)
+        page_size = max(1, min(page_size, 100))
+        where = self._where(user_id, thread_id, comment_user_id, include_deleted)
+        total, hits = self.index.search(query, kinds=kinds, where=where, offset=(page - 1) * page_size, limit=page_size)
+        return {
+            "results": hits,
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "total_pages": (total + page_size - 1) // page_size,
+            "ready": self._ready,
+        }
+
+    def _where(self, user_id: Optional[str] = None, thread_id: Optional[str] = None,
+               comment_user_id: Optional[str] = None, include_deleted: bool = False):
+        owners = self._owners
+
+        def where(doc) -> bool:
+            attrs = doc.attrs
+            if thread_id and attrs.get("thread_id") != thread_id:
+                return False
+            if user_id and owners.get(attrs.get("thread_id")) != user_id:
+                return False
+            if doc.kind == KIND_COMMENT:
+                if not include_deleted and attrs.get("is_deleted"):
+                    return False
+                if comment_user_id and attrs.get("user_id") != comment_user_id:
+                    return False
+            elif comment_user_id:
+                return False
+            return True
+
+        return where
+
+    def matching_threads(self, keyword: str, user_id: Optional[str] = None) -> Optional[Set[str]]:
+        """话题或任一发言包含全部关键词的对话 ID 集合（不截断）；关键词没有可检索的词时返回 None"""
+        if not self.index.has_terms(keyword):
+            return None
+        hits = self.index.match(keyword, kinds=(KIND_TOPIC, KIND_EVENT), where=self._where(user_id=user_id))
+        return {hit["thread_id"] for hit in hits}
+
+    def matching_comment_ids(
+        self,
+        keyword: str,
+        thread_id: Optional[str] = None,
+        user_id: Optional[str] = None,
+        include_deleted: bool = True,
+        limit: int = MAX_COMMENT_MATCHES,
+    ) -> Optional[List[str]]:
+        """
+        包含全部关键词的评论 ID，按相关度取前 limit 条；对话、评论者、是否含已删除在索引里先过滤，
+        上限作用在过滤之后。关键词没有可检索的词时返回 None。
+        """
+        if not self.index.has_terms(keyword):
+            return None
+        where = self._where(thread_id=thread_id, comment_user_id=user_id, include_deleted=include_deleted)
+        _, hits = self.index.search(keyword, kinds=(KIND_COMMENT,), where=where, limit=limit, require_all=True)
+        return [hit["comment_id"] for hit in hits]
+
+    def is_indexed(self, thread_id: str) -> bool:
+        return thread_id in self._owners
+
+    # ---------- 全量建索引 ----------
+    def build_from_db(self, db_manager) -> bool:
+        """从数据库分批加载全部话题、发言和评论；已经由写路径加入的文档不覆盖。"""
+        with self._lock:
+            if self._building:
+                return False
+            self._building = True
+            self._removed_during_build.clear()
+        started = time.time()
+        counts = {KIND_TOPIC: 0, KIND_EVENT: 0, KIND_COMMENT: 0}
+        try:
+            for row in self._scan(db_manager, "threads", "thread_id", "thread_id, topic, user_id"):
+                if self._skip(row["thread_id"]):
+                    continue
+                with self._lock:
+                    self._owners.setdefault(row["thread_id"], row["user_id"])
+                if self.index.get(f"{KIND_TOPIC}:{row['thread_id']}") is None:
+                    self.index.add(f"{KIND_TOPIC}:{row['thread_id']}", KIND_TOPIC, row["topic"] or "", thread_id=row["thread_id"])
+                    counts[KIND_TOPIC] += 1
+
+            for row in self._scan(db_manager, "events", "event_id", "event_id, thread_id, speaker, content, turn_id"):
+                if self._skip(row["thread_id"]) or self.index.get(f"{KIND_EVENT}:{row['event_id']}") is not None:
+                    continue
+                self._add_event(row["thread_id"], row)
+                counts[KIND_EVENT] += 1
+
+            for row in self._scan(db_manager, "comments", "comment_id",
+                                  "comment_id, thread_id, user_id, content, is_deleted, created_at"):
+                if self._skip(row["thread_id"]) or self.index.get(f"{KIND_COMMENT}:{row['comment_id']}") is not None:
+                    continue
+                self.index_comment(row["comment_id"], row["thread_id"], row["user_id"], row["content"],
+                                   row["is_deleted"], row["created_at"])
+                counts[KIND_COMMENT] += 1
+        except Exception as e:
+            print(f"[全文检索] 建索引失败: {e}")
+            with self._lock:
+                self._building = False
+            return False
+
+        with self._lock:
+            self._building = False
+            self._removed_during_build.clear()
+            self._ready = True
+        self._build_stats = {**counts, "seconds": round(time.time() - started, 2)}
+        print(f"[全文检索] 索引建立完成: 话题 {counts[KIND_TOPIC]}，发言 {counts[KIND_EVENT]}，"
+              f"评论 {counts[KIND_COMMENT]}，耗时 {self._build_stats['seconds']}s")
+        return True
+
+    def _skip(self, thread_id: str) -> bool:
+        return thread_id in self._removed_during_build
+
+    @staticmethod
+    def _scan(db_manager, table: str, key: str, columns: str):
+        """按主键 keyset 分批读取整张表"""
+        last = ""
+        while True:
+            with db_manager.get_cursor() as cursor:
+                cursor.execute(
+                    f"SELECT {columns} FROM {table} WHERE {key} > %s ORDER BY {key} LIMIT %s",
+                    (last, BUILD_BATCH_SIZE),
+                )
+                rows = cursor.fetchall()
+            if not rows:
+                return
+            yield from rows
+            if len(rows) < BUILD_BATCH_SIZE:
+                return
+            last = rows[-1][key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.index.stats(),
+            "threads": len(self._owners),
+            "ready": self._ready,
+            "building": self._building,
+            "pending": self._pending.qsize(),
+            "last_build": self._build_stats,
+        }
+
+
+# 全局检索服务实例
+search_service = SearchService()
@@ -0,0 +1,51 @@
+# search/tokenizer.py
+from __future__ import annotations
+
+import re
+from typing import List
+
+from dev.nlp.segmenter import segmenter
+
+
+# 中文、字母、数字以外的字符都视为分隔符
+_TOKEN_RE = re.compile(r"[一-鿿]+|[a-z0-9]+")
+_CJK_RE = re.compile(r"[一-鿿]+")
+
+# 常见虚词不进索引
+STOP_WORDS = {
+    "的", "了", "是", "在", "和", "与", "或", "也", "就", "都", "而", "及", "着", "吗", "呢", "吧", "啊",
+    "这", "那", "我", "你", "他", "她", "它", "们", "个", "一个", "这个", "那个", "我们", "你们", "他们",
+    "the", "a", "an", "of", "to", "and", "or", "is", "are", "in", "on",
+}
+
+
+def _fallback_cut(text: str) -> List[str]:
+    """没有 jieba 时：中文按相邻两字切分（bigram），英文数字按单词。"""
+    tokens: List[str] = []
+    for chunk in _TOKEN_RE.findall(text):
+        if _CJK_RE.fullmatch(chunk):
+            if len(chunk) == 1:
+                tokens.append(chunk)
+            else:
+                tokens.extend(chunk[i:i + 2] for i in range(len(chunk) - 1))
+        else:
+            tokens.append(chunk)
+    return tokens
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    把文本切成索引词（小写、去停用词、去标点）。
+    有 jieba 时用搜索引擎模式（长词同时产出其中的短词，提高召回），否则退化为 bigram。
+    分词器与内容分析共用（含领域词典）。索引和查询必须使用同一个函数。
+    """
+    if not text:
+        return []
+    text = text.lower()
+    jieba = segmenter.get()
+    if jieba is not None:
+        raw = jieba.lcut_for_search(text)
+        tokens = [t for piece in raw for t in _TOKEN_RE.findall(piece)]
+    else:
+        tokens = _fallback_cut(text)
+    return [t for t in tokens if t not in STOP_WORDS]
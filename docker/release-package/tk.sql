@@ -275,12 +275,15 @@ CREATE TABLE `thread_owners`  (
   `reviewed_by` varchar(32) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL DEFAULT NULL COMMENT '审核管理员ID',
   `rejection_reason` text CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL COMMENT '驳回原因',
   `is_locked` tinyint(1) NULL DEFAULT 0 COMMENT '是否锁定（公开后不可继续对话）',
+  `like_count` int(11) NOT NULL DEFAULT 0 COMMENT '点赞数（随点赞/取消点赞在同一事务内维护）',
+  `comment_count` int(11) NOT NULL DEFAULT 0 COMMENT '未删除评论数（随评论增删/恢复在同一事务内维护）',
   PRIMARY KEY (`id`) USING BTREE,
   INDEX `idx_user_id`(`user_id` ASC) USING BTREE,
   INDEX `idx_thread_id`(`thread_id` ASC) USING BTREE,
   INDEX `idx_is_public`(`is_public` ASC) USING BTREE,
   INDEX `idx_publication_status`(`publication_status` ASC) USING BTREE,
   INDEX `idx_reviewed_by`(`reviewed_by` ASC) USING BTREE,
+  INDEX `idx_hall_rank`(`publication_status` ASC, `like_count` DESC, `created_at` DESC, `id` DESC) USING BTREE COMMENT '公开对话大厅排序',
   CONSTRAINT `fk_reviewed_by` FOREIGN KEY (`reviewed_by`) REFERENCES `users` (`user_id`) ON DELETE SET NULL ON UPDATE RESTRICT,
   CONSTRAINT `thread_owners_ibfk_1` FOREIGN KEY (`thread_id`) REFERENCES `threads` (`thread_id`) ON DELETE CASCADE ON UPDATE RESTRICT,
   CONSTRAINT `thread_owners_ibfk_2` FOREIGN KEY (`user_id`) REFERENCES `users` (`user_id`) ON DELETE SET NULL ON UPDATE RESTRICT
@@ -290,6 +293,23 @@ CREATE TABLE `thread_owners`  (
 -- Records of thread_owners
 -- ----------------------------
 
+-- ----------------------------
+-- Table structure for thread_summaries
+-- ----------------------------
+DROP TABLE IF EXISTS `thread_summaries`;
+CREATE TABLE `thread_summaries`  (
+  `id` int(11) NOT NULL AUTO_INCREMENT COMMENT '主键ID',
+  `thread_id` varchar(32) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '关联线程ID',
+  `level` tinyint(4) NOT NULL DEFAULT 0 COMMENT '摘要层级（0为发言直接压缩，越高越概括）',
+  `from_turn` int(11) NOT NULL COMMENT '覆盖的起始轮次',
+  `to_turn` int(11) NOT NULL COMMENT '覆盖的结束轮次',
+  `content` text CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '摘要内容',
+  `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+  PRIMARY KEY (`id`) USING BTREE,
+  INDEX `idx_thread_turn`(`thread_id` ASC, `from_turn` ASC) USING BTREE,
+  CONSTRAINT `thread_summaries_ibfk_1` FOREIGN KEY (`thread_id`) REFERENCES `threads` (`thread_id`) ON DELETE CASCADE ON UPDATE RESTRICT
+) ENGINE = InnoDB AUTO_INCREMENT = 1 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_unicode_ci COMMENT = '对话分层滚动摘要表' ROW_FORMAT = DYNAMIC;
+
 -- ----------------------------
 -- Table structure for threads
 -- ----------------------------
@@ -304,6 +324,7 @@ CREATE TABLE `threads`  (
   `last_user_interjection` text CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL COMMENT '最后用户插话',
   `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
   `updated_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  `state_version` int(11) NOT NULL DEFAULT 0 COMMENT '讨论状态版本（每次增量保存 +1）',
   PRIMARY KEY (`thread_id`) USING BTREE,
   INDEX `idx_user_id`(`user_id` ASC) USING BTREE
 ) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_unicode_ci COMMENT = '讨论线程表' ROW_FORMAT = DYNAMIC;
@@ -793,12 +793,15 @@ CREATE TABLE `thread_owners`  (
   `reviewed_by` varchar(32) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL DEFAULT NULL COMMENT '审核管理员ID',
   `rejection_reason` text CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL COMMENT '驳回原因',
   `is_locked` tinyint(1) NULL DEFAULT 0 COMMENT '是否锁定（公开后不可继续对话）',
+  `like_count` int(11) NOT NULL DEFAULT 0 COMMENT '点赞数（随点赞/取消点赞在同一事务内维护）',
+  `comment_count` int(11) NOT NULL DEFAULT 0 COMMENT '未删除评论数（随评论增删/恢复在同一事务内维护）',
   PRIMARY KEY (`id`) USING BTREE,
   INDEX `idx_user_id`(`user_id` ASC) USING BTREE,
   INDEX `idx_thread_id`(`thread_id` ASC) USING BTREE,
   INDEX `idx_is_public`(`is_public` ASC) USING BTREE,
   INDEX `idx_publication_status`(`publication_status` ASC) USING BTREE,
   INDEX `idx_reviewed_by`(`reviewed_by` ASC) USING BTREE,
+  INDEX `idx_hall_rank`(`publication_status` ASC, `like_count` DESC, `created_at` DESC, `id` DESC) USING BTREE COMMENT '公开对话大厅排序',
   CONSTRAINT `fk_reviewed_by` FOREIGN KEY (`reviewed_by`) REFERENCES `users` (`user_id`) ON DELETE SET NULL ON UPDATE RESTRICT,
   CONSTRAINT `thread_owners_ibfk_1` FOREIGN KEY (`thread_id`) REFERENCES `threads` (`thread_id`) ON DELETE CASCADE ON UPDATE RESTRICT,
   CONSTRAINT `thread_owners_ibfk_2` FOREIGN KEY (`user_id`) REFERENCES `users` (`user_id`) ON DELETE SET NULL ON UPDATE RESTRICT
@@ -807,16 +810,33 @@ CREATE TABLE `thread_owners`  (
 -- ----------------------------
 -- Records of thread_owners
 -- ----------------------------
-INSERT INTO `thread_owners` VALUES (55, '89e58e4dda32', 'f6c8940950a94e728494e8ca6bba95a4', 0, '2026-01-06 18:52:08', 'draft', NULL, NULL, NULL, NULL, 0);
-INSERT INTO `thread_owners` VALUES (58, '6f4fc7a74681', 'd7f087722cd843ed9ba293ace51b992e', 0, '2026-01-06 18:58:58', 'rejected', '2026-01-06 19:02:26', '2026-01-06 19:17:22', 'f6c8940950a94e728494e8ca6bba95a4', '驳回', 0);
-INSERT INTO `thread_owners` VALUES (59, 'aaaab083a270', 'd7f087722cd843ed9ba293ace51b992e', 0, '2026-01-06 19:02:59', 'draft', NULL, NULL, NULL, NULL, 0);
-INSERT INTO `thread_owners` VALUES (60, '1ee5ab69fdbe', '0805e50215854996bcc807da8c7337c4', 1, '2026-01-06 19:07:26', 'published', '2026-01-06 19:08:26', '2026-01-06 19:17:12', 'f6c8940950a94e728494e8ca6bba95a4', NULL, 1);
-INSERT INTO `thread_owners` VALUES (61, '3dd0bafbe06d', '0805e50215854996bcc807da8c7337c4', 0, '2026-01-06 19:08:35', 'draft', NULL, NULL, NULL, NULL, 0);
-INSERT INTO `thread_owners` VALUES (62, 'e4a856e10426', 'de2bbb7bb9f445548d0decd520aa368a', 1, '2026-01-06 19:11:02', 'published', '2026-01-06 19:15:04', '2026-01-06 19:17:03', 'f6c8940950a94e728494e8ca6bba95a4', NULL, 1);
-INSERT INTO `thread_owners` VALUES (63, 'b3eb3e52a644', 'de2bbb7bb9f445548d0decd520aa368a', 0, '2026-01-06 19:15:21', 'draft', NULL, NULL, NULL, NULL, 0);
-INSERT INTO `thread_owners` VALUES (64, '7020f7b9c31d', '1653bccff45a4d42a12dc00e9d879c7a', 0, '2026-01-06 19:18:46', 'pending', '2026-01-06 19:19:08', NULL, NULL, NULL, 1);
-INSERT INTO `thread_owners` VALUES (65, '4bcbd88a0d4f', '1653bccff45a4d42a12dc00e9d879c7a', 1, '2026-01-06 19:20:12', 'published', '2026-01-06 19:21:05', '2026-01-06 19:21:33', 'f6c8940950a94e728494e8ca6bba95a4', NULL, 1);
-INSERT INTO `thread_owners` VALUES (66, 'fdc498c468e6', 'f6c8940950a94e728494e8ca6bba95a4', 0, '2026-01-06 19:49:33', 'draft', NULL, NULL, NULL, NULL, 0);
+INSERT INTO `thread_owners` VALUES (55, '89e58e4dda32', 'f6c8940950a94e728494e8ca6bba95a4', 0, '2026-01-06 18:52:08', 'draft', NULL, NULL, NULL, NULL, 0, 0, 0);
+INSERT INTO `thread_owners` VALUES (58, '6f4fc7a74681', 'd7f087722cd843ed9ba293ace51b992e', 0, '2026-01-06 18:58:58', 'rejected', '2026-01-06 19:02:26', '2026-01-06 19:17:22', 'f6c8940950a94e728494e8ca6bba95a4', '驳回', 0, 0, 0);
+INSERT INTO `thread_owners` VALUES (59, 'aaaab083a270', 'd7f087722cd843ed9ba293ace51b992e', 0, '2026-01-06 19:02:59', 'draft', NULL, NULL, NULL, NULL, 0, 0, 0);
+INSERT INTO `thread_owners` VALUES (60, '1ee5ab69fdbe', '0805e50215854996bcc807da8c7337c4', 1, '2026-01-06 19:07:26', 'published', '2026-01-06 19:08:26', '2026-01-06 19:17:12', 'f6c8940950a94e728494e8ca6bba95a4', NULL, 1, 2, 1);
+INSERT INTO `thread_owners` VALUES (61, '3dd0bafbe06d', '0805e50215854996bcc807da8c7337c4', 0, '2026-01-06 19:08:35', 'draft', NULL, NULL, NULL, NULL, 0, 0, 0);
+INSERT INTO `thread_owners` VALUES (62, 'e4a856e10426', 'de2bbb7bb9f445548d0decd520aa368a', 1, '2026-01-06 19:11:02', 'published', '2026-01-06 19:15:04', '2026-01-06 19:17:03', 'f6c8940950a94e728494e8ca6bba95a4', NULL, 1, 4, 2);
+INSERT INTO `thread_owners` VALUES (63, 'b3eb3e52a644', 'de2bbb7bb9f445548d0decd520aa368a', 0, '2026-01-06 19:15:21', 'draft', NULL, NULL, NULL, NULL, 0, 0, 0);
+INSERT INTO `thread_owners` VALUES (64, '7020f7b9c31d', '1653bccff45a4d42a12dc00e9d879c7a', 0, '2026-01-06 19:18:46', 'pending', '2026-01-06 19:19:08', NULL, NULL, NULL, 1, 0, 0);
+INSERT INTO `thread_owners` VALUES (65, '4bcbd88a0d4f', '1653bccff45a4d42a12dc00e9d879c7a', 1, '2026-01-06 19:20:12', 'published', '2026-01-06 19:21:05', '2026-01-06 19:21:33', 'f6c8940950a94e728494e8ca6bba95a4', NULL, 1, 3, 1);
+INSERT INTO `thread_owners` VALUES (66, 'fdc498c468e6', 'f6c8940950a94e728494e8ca6bba95a4', 0, '2026-01-06 19:49:33', 'draft', NULL, NULL, NULL, NULL, 0, 0, 0);
+
+-- ----------------------------
+-- Table structure for thread_summaries
+-- ----------------------------
+DROP TABLE IF EXISTS `thread_summaries`;
+CREATE TABLE `thread_summaries`  (
+  `id` int(11) NOT NULL AUTO_INCREMENT COMMENT '主键ID',
+  `thread_id` varchar(32) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '关联线程ID',
+  `level` tinyint(4) NOT NULL DEFAULT 0 COMMENT '摘要层级（0为发言直接压缩，越高越概括）',
+  `from_turn` int(11) NOT NULL COMMENT '覆盖的起始轮次',
+  `to_turn` int(11) NOT NULL COMMENT '覆盖的结束轮次',
+  `content` text CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NOT NULL COMMENT '摘要内容',
+  `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
+  PRIMARY KEY (`id`) USING BTREE,
+  INDEX `idx_thread_turn`(`thread_id` ASC, `from_turn` ASC) USING BTREE,
+  CONSTRAINT `thread_summaries_ibfk_1` FOREIGN KEY (`thread_id`) REFERENCES `threads` (`thread_id`) ON DELETE CASCADE ON UPDATE RESTRICT
+) ENGINE = InnoDB AUTO_INCREMENT = 1 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_unicode_ci COMMENT = '对话分层滚动摘要表' ROW_FORMAT = DYNAMIC;
 
 -- ----------------------------
 -- Table structure for threads
@@ -832,6 +852,7 @@ CREATE TABLE `threads`  (
   `last_user_interjection` text CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci NULL COMMENT '最后用户插话',
   `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
   `updated_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  `state_version` int(11) NOT NULL DEFAULT 0 COMMENT '讨论状态版本（每次增量保存 +1）',
   PRIMARY KEY (`thread_id`) USING BTREE,
   INDEX `idx_user_id`(`user_id` ASC) USING BTREE
 ) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_unicode_ci COMMENT = '讨论线程表' ROW_FORMAT = DYNAMIC;
@@ -839,16 +860,16 @@ CREATE TABLE `threads`  (
 -- ----------------------------
 -- Records of threads
 -- ----------------------------
-INSERT INTO `threads` VALUES ('1ee5ab69fdbe', '“流量至上”的逻辑是否已侵蚀社会基本价值？', '0805e50215854996bcc807da8c7337c4', 'discussion', 7, '组织者', NULL, '2026-01-06 19:07:18', '2026-01-06 19:08:19');
-INSERT INTO `threads` VALUES ('3dd0bafbe06d', '个人“体验自由”的边界在哪里？', '0805e50215854996bcc807da8c7337c4', 'discussion', 9, '组织者', '那么怎么看待“体验式索求”', '2026-01-06 19:08:30', '2026-01-06 19:10:35');
-INSERT INTO `threads` VALUES ('4bcbd88a0d4f', '文化猎奇与个人尊严的边界在哪里？', '1653bccff45a4d42a12dc00e9d879c7a', 'discussion', 4, '理论家', NULL, '2026-01-06 19:20:03', '2026-01-06 19:20:30');
-INSERT INTO `threads` VALUES ('6f4fc7a74681', '我想了解一下人工智能', 'd7f087722cd843ed9ba293ace51b992e', 'discussion', 9, '组织者', '有没有人工智能具体落地到工业场景中的例子', '2026-01-06 18:58:53', '2026-01-06 19:00:33');
-INSERT INTO `threads` VALUES ('7020f7b9c31d', '“情绪茧房”正在加剧社会对立吗？', '1653bccff45a4d42a12dc00e9d879c7a', 'discussion', 4, '理论家', NULL, '2026-01-06 19:18:41', '2026-01-06 19:19:09');
-INSERT INTO `threads` VALUES ('89e58e4dda32', '如何看待近期的金价疯涨', 'f6c8940950a94e728494e8ca6bba95a4', 'opening', 9, '理论家', NULL, '2026-01-06 18:52:02', '2026-01-06 19:29:35');
-INSERT INTO `threads` VALUES ('aaaab083a270', '如何看待大学生深度依赖AI', 'd7f087722cd843ed9ba293ace51b992e', 'discussion', 6, '理论家', NULL, '2026-01-06 19:02:55', '2026-01-06 19:03:47');
-INSERT INTO `threads` VALUES ('b3eb3e52a644', '社交媒体时代的军事行动：“胜利宣告”还是国际秩序失范？', 'de2bbb7bb9f445548d0decd520aa368a', 'discussion', 6, '组织者', NULL, '2026-01-06 19:15:16', '2026-01-06 19:16:38');
-INSERT INTO `threads` VALUES ('e4a856e10426', '人工智能的快速发展，会打开“潘多拉魔盒”吗？', 'de2bbb7bb9f445548d0decd520aa368a', 'discussion', 6, '理论家', NULL, '2026-01-06 19:10:57', '2026-01-06 19:13:43');
-INSERT INTO `threads` VALUES ('fdc498c468e6', '我想学习一下python', 'f6c8940950a94e728494e8ca6bba95a4', 'opening', 6, '理论家', NULL, '2026-01-06 19:49:26', '2026-01-06 19:57:43');
+INSERT INTO `threads` VALUES ('1ee5ab69fdbe', '“流量至上”的逻辑是否已侵蚀社会基本价值？', '0805e50215854996bcc807da8c7337c4', 'discussion', 7, '组织者', NULL, '2026-01-06 19:07:18', '2026-01-06 19:08:19', 0);
+INSERT INTO `threads` VALUES ('3dd0bafbe06d', '个人“体验自由”的边界在哪里？', '0805e50215854996bcc807da8c7337c4', 'discussion', 9, '组织者', '那么怎么看待“体验式索求”', '2026-01-06 19:08:30', '2026-01-06 19:10:35', 0);
+INSERT INTO `threads` VALUES ('4bcbd88a0d4f', '文化猎奇与个人尊严的边界在哪里？', '1653bccff45a4d42a12dc00e9d879c7a', 'discussion', 4, '理论家', NULL, '2026-01-06 19:20:03', '2026-01-06 19:20:30', 0);
+INSERT INTO `threads` VALUES ('6f4fc7a74681', '我想了解一下人工智能', 'd7f087722cd843ed9ba293ace51b992e', 'discussion', 9, '组织者', '有没有人工智能具体落地到工业场景中的例子', '2026-01-06 18:58:53', '2026-01-06 19:00:33', 0);
+INSERT INTO `threads` VALUES ('7020f7b9c31d', '“情绪茧房”正在加剧社会对立吗？', '1653bccff45a4d42a12dc00e9d879c7a', 'discussion', 4, '理论家', NULL, '2026-01-06 19:18:41', '2026-01-06 19:19:09', 0);
+INSERT INTO `threads` VALUES ('89e58e4dda32', '如何看待近期的金价疯涨', 'f6c8940950a94e728494e8ca6bba95a4', 'opening', 9, '理论家', NULL, '2026-01-06 18:52:02', '2026-01-06 19:29:35', 0);
+INSERT INTO `threads` VALUES ('aaaab083a270', '如何看待大学生深度依赖AI', 'd7f087722cd843ed9ba293ace51b992e', 'discussion', 6, '理论家', NULL, '2026-01-06 19:02:55', '2026-01-06 19:03:47', 0);
+INSERT INTO `threads` VALUES ('b3eb3e52a644', '社交媒体时代的军事行动：“胜利宣告”还是国际秩序失范？', 'de2bbb7bb9f445548d0decd520aa368a', 'discussion', 6, '组织者', NULL, '2026-01-06 19:15:16', '2026-01-06 19:16:38', 0);
+INSERT INTO `threads` VALUES ('e4a856e10426', '人工智能的快速发展，会打开“潘多拉魔盒”吗？', 'de2bbb7bb9f445548d0decd520aa368a', 'discussion', 6, '理论家', NULL, '2026-01-06 19:10:57', '2026-01-06 19:13:43', 0);
+INSERT INTO `threads` VALUES ('fdc498c468e6', '我想学习一下python', 'f6c8940950a94e728494e8ca6bba95a4', 'opening', 6, '理论家', NULL, '2026-01-06 19:49:26', '2026-01-06 19:57:43', 0);
 
 -- ----------------------------
 -- Table structure for user_sessions